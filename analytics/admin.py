@@ -0,0 +1,33 @@
+from django.contrib import admin
+from .models import DailyAppointmentStats, DailyRevenueStats, DailyStats
+
+
+@admin.register(DailyStats)
+class DailyStatsAdmin(admin.ModelAdmin):
+    """Daily KPI rollup admin interface (maintained by rollup_stats, read-only)"""
+
+    list_display = ('date', 'new_patients', 'appointments', 'paid_invoices', 'paid_revenue', 'is_complete', 'computed_at')
+    list_filter = ('is_complete',)
+    date_hierarchy = 'date'
+    readonly_fields = ('date', 'new_patients', 'appointments', 'paid_invoices', 'paid_revenue', 'is_complete', 'computed_at')
+
+
+@admin.register(DailyAppointmentStats)
+class DailyAppointmentStatsAdmin(admin.ModelAdmin):
+    """Appointment rollup admin interface (read-only)"""
+
+    list_display = ('date', 'doctor', 'status', 'appointment_type', 'count')
+    list_filter = ('status', 'appointment_type')
+    date_hierarchy = 'date'
+    list_select_related = ('doctor__user',)
+    readonly_fields = ('date', 'doctor', 'status', 'appointment_type', 'count')
+
+
+@admin.register(DailyRevenueStats)
+class DailyRevenueStatsAdmin(admin.ModelAdmin):
+    """Revenue rollup admin interface (read-only)"""
+
+    list_display = ('date', 'payment_method', 'invoices', 'revenue')
+    list_filter = ('payment_method',)
+    date_hierarchy = 'date'
+    readonly_fields = ('date', 'payment_method', 'invoices', 'revenue')
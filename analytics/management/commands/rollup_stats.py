@@ -0,0 +1,50 @@
+"""
+Management command that brings the daily KPI rollups up to date.
+
+Run it from cron, or as the ``rollups`` process of the procfile with
+``--every`` so it repeats until stopped.
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.rollups import get_lookback_days, run_rollups
+from core.periodic import check_every, run_every
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily KPI rollups for recent, edited and stale days'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lookback', type=int, default=get_lookback_days(),
+            help='Recent days always recomputed (default: ROLLUP_LOOKBACK_DAYS)'
+        )
+        parser.add_argument('--since', help='Also recompute every day from this date (YYYY-MM-DD)')
+        parser.add_argument('--full', action='store_true', help='Rebuild every day from the first recorded activity')
+        parser.add_argument(
+            '--every', type=float,
+            help='Keep running, bringing the rollups up to date every this many seconds'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+        if options['lookback'] < 0:
+            raise CommandError('--lookback cannot be negative')
+        check_every(options['every'])
+
+        self.roll_up(lookback=options['lookback'], since=since, full=options['full'])
+        if options['every'] is not None:
+            # --since and --full only apply to the first run
+            run_every(options['every'], lambda: self.roll_up(lookback=options['lookback']))
+
+    def roll_up(self, **kwargs):
+        days = run_rollups(**kwargs)
+        if days:
+            self.stdout.write(f"Recomputed {days[0]} .. {days[-1]}")
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {len(days)} day(s)"))
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.5 on 2026-10-17 08:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('doctors', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('new_patients', models.PositiveIntegerField(default=0)),
+                ('appointments', models.PositiveIntegerField(default=0)),
+                ('paid_invoices', models.PositiveIntegerField(default=0)),
+                ('paid_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('is_complete', models.BooleanField(default=False)),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Daily Stats',
+                'verbose_name_plural': 'Daily Stats',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StaleRollupDate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+            ],
+            options={
+                'verbose_name': 'Stale Rollup Date',
+                'verbose_name_plural': 'Stale Rollup Dates',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRevenueStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('payment_method', models.CharField(blank=True, max_length=20)),
+                ('invoices', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Daily Revenue Stats',
+                'verbose_name_plural': 'Daily Revenue Stats',
+                'constraints': [models.UniqueConstraint(fields=('date', 'payment_method'), name='daily_revenue_stats_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyAppointmentStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('appointment_type', models.CharField(max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='doctors.doctor')),
+            ],
+            options={
+                'verbose_name': 'Daily Appointment Stats',
+                'verbose_name_plural': 'Daily Appointment Stats',
+                'constraints': [models.UniqueConstraint(fields=('date', 'doctor', 'status', 'appointment_type'), name='daily_appointment_stats_unique')],
+            },
+        ),
+    ]
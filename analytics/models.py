@@ -0,0 +1,82 @@
+from django.db import models
+
+
+class DailyStats(models.Model):
+    """Per-day KPI totals, maintained by ``manage.py rollup_stats``"""
+
+    date = models.DateField(unique=True)
+
+    new_patients = models.PositiveIntegerField(default=0)
+    appointments = models.PositiveIntegerField(default=0)
+    paid_invoices = models.PositiveIntegerField(default=0)
+    paid_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    # Rows computed before the day was over are partial and get recomputed;
+    # dashboards only trust complete rows and compute the rest live
+    is_complete = models.BooleanField(default=False)
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.date}: {self.new_patients} patients, {self.appointments} appointments"
+
+    class Meta:
+        ordering = ['date']
+        verbose_name = 'Daily Stats'
+        verbose_name_plural = 'Daily Stats'
+
+
+class DailyAppointmentStats(models.Model):
+    """Appointments per day by doctor, status and type"""
+
+    date = models.DateField()
+    doctor = models.ForeignKey('doctors.Doctor', on_delete=models.CASCADE, related_name='daily_stats')
+    status = models.CharField(max_length=20)
+    appointment_type = models.CharField(max_length=20)
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date} {self.doctor_id} {self.status}/{self.appointment_type}: {self.count}"
+
+    class Meta:
+        verbose_name = 'Daily Appointment Stats'
+        verbose_name_plural = 'Daily Appointment Stats'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'doctor', 'status', 'appointment_type'], name='daily_appointment_stats_unique'
+            ),
+        ]
+
+
+class DailyRevenueStats(models.Model):
+    """Paid invoices per day (of issue) by payment method"""
+
+    date = models.DateField()
+    payment_method = models.CharField(max_length=20, blank=True)
+    invoices = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.date} {self.payment_method or '-'}: {self.revenue}"
+
+    class Meta:
+        verbose_name = 'Daily Revenue Stats'
+        verbose_name_plural = 'Daily Revenue Stats'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'payment_method'], name='daily_revenue_stats_unique'),
+        ]
+
+
+class StaleRollupDate(models.Model):
+    """
+    A day whose rollups must be recomputed because rows moved out of it or
+    were deleted, which ``updated_at`` cannot reveal.
+    """
+
+    date = models.DateField(unique=True)
+
+    def __str__(self):
+        return str(self.date)
+
+    class Meta:
+        verbose_name = 'Stale Rollup Date'
+        verbose_name_plural = 'Stale Rollup Dates'
@@ -0,0 +1,270 @@
+"""
+Daily rollups of the dashboard KPIs.
+
+``manage.py rollup_stats`` folds the raw patient, appointment and invoice
+tables into one row per day (``DailyStats``) plus per-day breakdowns of
+appointments by doctor, status and type (``DailyAppointmentStats``) and of
+paid revenue by payment method (``DailyRevenueStats``). Trend and KPI
+widgets read those instead of aggregating the raw tables, so a two-year
+range touches a few hundred rows.
+
+Each run recomputes, from the raw tables:
+
+* the last ``ROLLUP_LOOKBACK_DAYS`` days, and every day since the last
+  complete one if runs were missed;
+* days of appointments and invoices edited since the previous run
+  (``updated_at`` after its start), however old;
+* days marked stale by ``analytics.signals`` because a row was deleted
+  from them or moved to another date.
+
+A day is recomputed as a whole (delete and re-insert its rows in one
+transaction), so runs are idempotent. Readers (``daily_stats`` and
+``appointment_stats``) use stored rows only for days that were complete
+when computed and aggregate every other day live, so results are right
+before the first run and across days a run skipped.
+
+Attribution follows the dashboards: patients by local registration date,
+appointments by ``appointment_date``, revenue by the paid invoices'
+``issue_date``.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyAppointmentStats, DailyRevenueStats, DailyStats, StaleRollupDate
+
+# Longest run of days aggregated by one set of queries
+REFRESH_CHUNK_DAYS = 92
+
+
+def get_lookback_days():
+    return getattr(settings, 'ROLLUP_LOOKBACK_DAYS', 3)
+
+
+def date_range(start, end):
+    """Every day from ``start`` to ``end`` inclusive"""
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def contiguous_runs(days, max_length=REFRESH_CHUNK_DAYS):
+    """Split sorted ``days`` into runs of consecutive days, at most ``max_length`` long"""
+    runs = []
+    for day in days:
+        if runs and day == runs[-1][-1] + timedelta(days=1) and len(runs[-1]) < max_length:
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return runs
+
+
+def compute_rollups(start, end=None):
+    """
+    Rollup rows for ``start`` to ``end`` (open-ended when None), computed
+    from the raw tables with three grouped queries.
+
+    Returns ``(stats, appointment_rows, revenue_rows)``: unsaved
+    DailyStats keyed by day (only days with data) and lists of unsaved
+    DailyAppointmentStats and DailyRevenueStats.
+    """
+    from appointments.models import Appointment
+    from billing.models import Invoice
+    from patients.models import Patient
+    from patients.services import start_of_day
+
+    def in_range(queryset, field, datetime_field=False):
+        bounds = {f'{field}__gte': start_of_day(start) if datetime_field else start}
+        if end is not None:
+            after = end + timedelta(days=1)
+            bounds[f'{field}__lt'] = start_of_day(after) if datetime_field else after
+        return queryset.filter(**bounds)
+
+    stats = {}
+
+    def day_stats(day):
+        if day not in stats:
+            stats[day] = DailyStats(date=day, paid_revenue=Decimal('0.00'))
+        return stats[day]
+
+    patients = in_range(Patient.objects, 'created_at', datetime_field=True).annotate(
+        day=TruncDate('created_at')
+    ).values('day').annotate(count=Count('id')).order_by()
+    for row in patients:
+        day_stats(row['day']).new_patients = row['count']
+
+    appointment_rows = []
+    appointments = in_range(Appointment.objects, 'appointment_date').values(
+        'appointment_date', 'doctor_id', 'status', 'appointment_type'
+    ).annotate(count=Count('id')).order_by()
+    for row in appointments:
+        appointment_rows.append(DailyAppointmentStats(
+            date=row['appointment_date'], doctor_id=row['doctor_id'], status=row['status'],
+            appointment_type=row['appointment_type'], count=row['count'],
+        ))
+        day_stats(row['appointment_date']).appointments += row['count']
+
+    revenue_rows = []
+    invoices = in_range(Invoice.objects.filter(status='paid'), 'issue_date').values(
+        'issue_date', 'payment_method'
+    ).annotate(invoices=Count('id'), revenue=Sum('total_amount')).order_by()
+    for row in invoices:
+        revenue = row['revenue'] or Decimal('0.00')
+        revenue_rows.append(DailyRevenueStats(
+            date=row['issue_date'], payment_method=row['payment_method'],
+            invoices=row['invoices'], revenue=revenue,
+        ))
+        totals = day_stats(row['issue_date'])
+        totals.paid_invoices += row['invoices']
+        totals.paid_revenue += revenue
+
+    return stats, appointment_rows, revenue_rows
+
+
+def refresh_rollups(days, now=None):
+    """Recompute and store the rollups of ``days``; returns the number of days written"""
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    days = sorted(set(days))
+    for run in contiguous_runs(days):
+        start, end = run[0], run[-1]
+        stats, appointment_rows, revenue_rows = compute_rollups(start, end)
+        rows = []
+        for day in run:
+            row = stats.get(day) or DailyStats(date=day, paid_revenue=Decimal('0.00'))
+            row.is_complete = day < today
+            row.computed_at = now
+            rows.append(row)
+        with transaction.atomic():
+            for model in (DailyStats, DailyAppointmentStats, DailyRevenueStats):
+                model.objects.filter(date__gte=start, date__lte=end).delete()
+            DailyStats.objects.bulk_create(rows)
+            DailyAppointmentStats.objects.bulk_create(appointment_rows)
+            DailyRevenueStats.objects.bulk_create(revenue_rows)
+    return len(days)
+
+
+def earliest_data_date():
+    """First day any patient, appointment or paid invoice falls on, or None"""
+    from appointments.models import Appointment
+    from billing.models import Invoice
+    from patients.models import Patient
+
+    candidates = [
+        Patient.objects.aggregate(first=Min('created_at'))['first'],
+        Appointment.objects.aggregate(first=Min('appointment_date'))['first'],
+        Invoice.objects.filter(status='paid').aggregate(first=Min('issue_date'))['first'],
+    ]
+    days = [timezone.localdate(value) if isinstance(value, datetime) else value for value in candidates if value]
+    return min(days) if days else None
+
+
+def days_to_refresh(lookback=None, since=None, full=False, now=None):
+    """
+    Days the next run has to recompute (see the module docstring), and
+    the ids of the StaleRollupDate rows they cover.
+    """
+    from appointments.models import Appointment
+    from billing.models import Invoice
+
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    lookback = get_lookback_days() if lookback is None else lookback
+    state = DailyStats.objects.aggregate(
+        last_run=Max('computed_at'), last_complete=Max('date', filter=Q(is_complete=True))
+    )
+
+    if full or state['last_run'] is None:
+        start = earliest_data_date() or today
+    elif since is not None:
+        start = since
+    else:
+        start = today - timedelta(days=lookback)
+        if state['last_complete'] is not None:
+            # Catch up on days missed while the command was not running
+            start = min(start, state['last_complete'] + timedelta(days=1))
+    days = set(date_range(min(start, today), today))
+
+    stale = list(StaleRollupDate.objects.values_list('pk', 'date'))
+    if not full and state['last_run'] is not None:
+        # Late edits: rows changed since the previous run started
+        days.update(Appointment.objects.filter(
+            updated_at__gte=state['last_run'], appointment_date__lte=today,
+        ).values_list('appointment_date', flat=True).distinct().order_by())
+        days.update(Invoice.objects.filter(
+            updated_at__gte=state['last_run'], issue_date__lte=today,
+        ).values_list('issue_date', flat=True).distinct().order_by())
+        days.update(day for _, day in stale if day <= today)
+    return days, [pk for pk, _ in stale]
+
+
+def run_rollups(lookback=None, since=None, full=False, now=None):
+    """Work out which days are out of date and recompute them; returns the days refreshed"""
+    now = now or timezone.now()
+    days, stale_ids = days_to_refresh(lookback=lookback, since=since, full=full, now=now)
+    refresh_rollups(days, now=now)
+    StaleRollupDate.objects.filter(pk__in=stale_ids).delete()
+    return sorted(days)
+
+
+def _live_ranges(start, end, stored_days):
+    """
+    ``(start, end)`` ranges covering the days from ``start`` to ``end`` that
+    have no stored complete rollup: gaps (days never rolled up, or only
+    while still in progress) and the days after the last stored one, which
+    stay open-ended when ``end`` is None.
+    """
+    if not stored_days:
+        return [(start, end)]
+    last = max(stored_days)
+    missing = [day for day in date_range(start, last) if day not in stored_days]
+    # Each run is one range query however long, so runs are not chunked
+    ranges = [(run[0], run[-1]) for run in contiguous_runs(missing, max_length=len(missing))]
+    if end is None or last < end:
+        ranges.append((last + timedelta(days=1), end))
+    return ranges
+
+
+def _complete_rows(start, end=None):
+    rows = DailyStats.objects.filter(is_complete=True, date__gte=start)
+    if end is not None:
+        rows = rows.filter(date__lte=end)
+    return rows
+
+
+def daily_stats(start, end=None):
+    """
+    DailyStats per day from ``start`` to ``end`` (open-ended when None):
+    stored rows for complete days, computed live for every other day.
+    Days without any activity may be missing.
+    """
+    stats = {row.date: row for row in _complete_rows(start, end)}
+    for live_start, live_end in _live_ranges(start, end, set(stats)):
+        stats.update(compute_rollups(live_start, live_end)[0])
+    return stats
+
+
+def appointment_stats(start, end=None):
+    """DailyAppointmentStats rows from ``start`` to ``end``, stored or computed live like ``daily_stats``"""
+    stored_days = set(_complete_rows(start, end).values_list('date', flat=True))
+    rows = []
+    if stored_days:
+        stored = DailyAppointmentStats.objects.filter(date__gte=start, date__lte=max(stored_days))
+        rows = [row for row in stored if row.date in stored_days]
+    for live_start, live_end in _live_ranges(start, end, stored_days):
+        rows += compute_rollups(live_start, live_end)[1]
+    return rows
+
+
+def sum_by_period(stats, field, periods):
+    """``{name: total of field}`` over DailyStats values for ``(name, start, end)`` periods (end exclusive, None: open)"""
+    totals = defaultdict(int)
+    for day, row in stats.items():
+        for name, start, end in periods:
+            if day >= start and (end is None or day < end):
+                totals[name] += getattr(row, field)
+    return {name: totals[name] for name, _, _ in periods}
@@ -0,0 +1,49 @@
+"""
+Mark rollup days stale when rows leave them.
+
+``rollup_stats`` finds edited rows through ``updated_at``, which points at
+the row's current day only. A deleted row, or an appointment or invoice
+moved to another date, also changes the day it left; those days are
+queued in ``StaleRollupDate`` for the next run. Future days are never
+rolled up, so only past and current days are queued.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+
+def mark_stale(day):
+    from .models import StaleRollupDate
+
+    if day is not None and day <= timezone.localdate():
+        StaleRollupDate.objects.bulk_create([StaleRollupDate(date=day)], ignore_conflicts=True)
+
+
+def appointment_saved(sender, instance, created, **kwargs):
+    if not created and instance.has_changed('appointment_date'):
+        mark_stale(instance.previous('appointment_date'))
+
+
+def appointment_deleted(sender, instance, **kwargs):
+    mark_stale(instance.appointment_date)
+
+
+def invoice_saved(sender, instance, created, **kwargs):
+    if not created and instance.has_changed('issue_date'):
+        mark_stale(instance.previous('issue_date'))
+
+
+def invoice_deleted(sender, instance, **kwargs):
+    mark_stale(instance.issue_date)
+
+
+def patient_deleted(sender, instance, **kwargs):
+    if instance.created_at:
+        mark_stale(timezone.localdate(instance.created_at))
+
+
+def connect_rollup_signals():
+    post_save.connect(appointment_saved, sender='appointments.Appointment', dispatch_uid='rollup_appointment_saved')
+    post_delete.connect(appointment_deleted, sender='appointments.Appointment', dispatch_uid='rollup_appointment_deleted')
+    post_save.connect(invoice_saved, sender='billing.Invoice', dispatch_uid='rollup_invoice_saved')
+    post_delete.connect(invoice_deleted, sender='billing.Invoice', dispatch_uid='rollup_invoice_deleted')
+    post_delete.connect(patient_deleted, sender='patients.Patient', dispatch_uid='rollup_patient_deleted')
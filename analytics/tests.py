@@ -0,0 +1,178 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from appointments.models import Appointment
+from billing.models import Invoice
+from patients.models import Patient
+from patients.services import DashboardStatsService, start_of_day
+from patients.tests import create_doctor, create_patient
+from .models import DailyAppointmentStats, DailyRevenueStats, DailyStats, StaleRollupDate
+from .rollups import appointment_stats, daily_stats, run_rollups
+from .timeseries import time_series
+
+
+class RollupTests(TestCase):
+    """Test cases for the incrementally maintained daily rollups"""
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.old_day = self.today - timedelta(days=40)
+        self.patient = create_patient()
+        Patient.objects.filter(pk=self.patient.pk).update(created_at=start_of_day(self.old_day) + timedelta(hours=10))
+        self.doctor = create_doctor()
+        self.appointment = self.book(self.old_day, status='completed')
+        self.book(self.today)
+        self.invoice = self.bill(self.old_day, status='paid', payment_method='cash')
+        self.bill(self.today, status='paid', payment_method='mobile_money')
+
+    def book(self, day, time='09:00', **kwargs):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_date=day,
+            appointment_time=time, chief_complaint='Checkup', **kwargs
+        )
+
+    def bill(self, day, **kwargs):
+        return Invoice.objects.create(
+            patient=self.patient, issue_date=day, due_date=day, subtotal=Decimal('200.00'), **kwargs
+        )
+
+    def test_first_run_builds_every_day(self):
+        days = run_rollups()
+        self.assertEqual(days[0], self.old_day)
+        self.assertEqual(days[-1], self.today)
+
+        old = DailyStats.objects.get(date=self.old_day)
+        self.assertEqual((old.new_patients, old.appointments, old.paid_invoices), (1, 1, 1))
+        self.assertEqual(old.paid_revenue, Decimal('200.00'))
+        self.assertTrue(old.is_complete)
+        self.assertFalse(DailyStats.objects.get(date=self.today).is_complete)
+        self.assertEqual(
+            DailyAppointmentStats.objects.get(date=self.old_day).status, 'completed'
+        )
+        self.assertEqual(
+            list(DailyRevenueStats.objects.order_by('date').values_list('payment_method', flat=True)),
+            ['cash', 'mobile_money'],
+        )
+
+    def test_incremental_run_picks_up_late_edits(self):
+        run_rollups()
+        self.assertEqual(run_rollups(lookback=2), [self.today - timedelta(days=offset) for offset in (2, 1, 0)])
+
+        # An old invoice is paid late; an old appointment is moved to today
+        late = self.bill(self.old_day - timedelta(days=5), payment_method='cash')
+        late.status = 'paid'
+        late.save()
+        self.appointment.appointment_date, self.appointment.appointment_time = self.today, '11:00'
+        self.appointment.save()
+        self.assertTrue(StaleRollupDate.objects.filter(date=self.old_day).exists())
+
+        days = run_rollups(lookback=0)
+        self.assertIn(self.old_day, days)
+        self.assertIn(late.issue_date, days)
+        self.assertEqual(DailyStats.objects.get(date=late.issue_date).paid_revenue, Decimal('200.00'))
+        self.assertEqual(DailyStats.objects.get(date=self.old_day).appointments, 0)
+        self.assertEqual(DailyStats.objects.get(date=self.today).appointments, 2)
+        self.assertFalse(StaleRollupDate.objects.exists())
+
+    def test_readers_combine_stored_and_live_days(self):
+        before = DashboardStatsService().get_stats()
+        call_command('rollup_stats', stdout=StringIO())
+
+        # Rows added after the run only show up through the live part
+        self.book(self.today, time='10:00')
+        # Stored rows, then the days before the first activity and after the last run live
+        with self.assertNumQueries(7):
+            days = daily_stats(self.today - timedelta(days=730))
+        self.assertEqual(days[self.old_day].appointments, 1)
+        self.assertEqual(days[self.today].appointments, 2)
+
+        after = DashboardStatsService().get_stats()
+        self.assertEqual(after.today_appointments, before.today_appointments + 1)
+        self.assertEqual(after.yearly_revenue, before.yearly_revenue)
+        self.assertEqual(after.new_patients_month, before.new_patients_month)
+
+
+    def test_readers_compute_days_without_a_stored_rollup(self):
+        """Days a run never covered are computed, not read as zero"""
+        run_rollups()
+        DailyStats.objects.filter(date=self.old_day).delete()
+        DailyAppointmentStats.objects.filter(date=self.old_day).delete()
+
+        start = self.old_day - timedelta(days=10)
+        days = daily_stats(start)
+        self.assertEqual(days[self.old_day].appointments, 1)
+        self.assertEqual(days[self.old_day].paid_revenue, Decimal('200.00'))
+        self.assertEqual(days[self.today].appointments, 1)
+        self.assertEqual(
+            sorted(row.date for row in appointment_stats(start)), [self.old_day, self.today]
+        )
+        self.assertEqual(dict(time_series('appointments', start, self.today))[self.old_day], 1)
+
+        # Nothing stored before the first run either
+        DailyStats.objects.all().delete()
+        self.assertEqual(daily_stats(start)[self.old_day].new_patients, 1)
+
+    def test_command_rejects_bad_interval(self):
+        from django.core.management.base import CommandError
+
+        with self.assertRaises(CommandError):
+            call_command('rollup_stats', every=0, stdout=StringIO())
+
+
+class TimeSeriesTests(TestCase):
+    """Test cases for the gap-filled time series"""
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.patient = create_patient()
+        self.doctor = create_doctor()
+        for index, offset in enumerate((0, 1, 1, 10, 400)):
+            Appointment.objects.create(
+                patient=self.patient, doctor=self.doctor, appointment_date=self.today - timedelta(days=offset),
+                appointment_time=f'{9 + index}:00', chief_complaint='Checkup',
+            )
+
+    def test_daily_series_is_gap_filled_in_one_query(self):
+        start = self.today - timedelta(days=5 * 365)
+        with self.assertNumQueries(1):
+            series = time_series('appointments', start, self.today)
+        self.assertEqual(len(series), 5 * 365 + 1)
+        self.assertEqual(series[0], (start, 0))
+        values = dict(series)
+        self.assertEqual(values[self.today - timedelta(days=1)], 2)
+        self.assertEqual(values[self.today - timedelta(days=2)], 0)
+        self.assertEqual(sum(values.values()), 5)
+
+    def test_rollups_and_live_days_are_combined(self):
+        """Stored rollups and the live tail give the same buckets as the raw tables"""
+        start = self.today - timedelta(days=500)
+        before = time_series('appointments', start, self.today, 'month')
+        run_rollups()
+        Appointment.objects.filter(appointment_date=self.today - timedelta(days=10)).update(status='cancelled')
+        self.assertEqual(time_series('appointments', start, self.today, 'month'), before)
+        self.assertEqual(sum(value for _, value in before), 5)
+
+        weeks = time_series('registrations', self.today - timedelta(days=20), self.today, 'week')
+        self.assertEqual(weeks[0][0].weekday(), 0)
+        self.assertEqual(weeks[-1], (self.today - timedelta(days=self.today.weekday()), 1))
+
+    def test_api(self):
+        from django.contrib.auth import get_user_model
+        from django.urls import reverse
+
+        get_user_model().objects.create_user(username='analyst', password='testpass123')
+        self.client.login(username='analyst', password='testpass123')
+        url = reverse('analytics:timeseries_api')
+
+        response = self.client.get(url, {
+            'metric': 'appointments', 'granularity': 'day',
+            'start': (self.today - timedelta(days=1)).isoformat(), 'end': self.today.isoformat(),
+        })
+        self.assertEqual([point['value'] for point in response.json()['points']], [2, 1])
+        self.assertEqual(self.client.get(url, {'metric': 'bogus'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'metric': 'revenue', 'start': '2000-01-01'}).status_code, 400)
@@ -0,0 +1,153 @@
+"""
+Time series of the rollup metrics over any range, gap-filled in SQL.
+
+``time_series('appointments', start, end, 'week')`` returns one point
+per week from ``start`` to ``end``, zeros included, with a single query:
+
+* a calendar of bucket start dates is generated in the database
+  (``generate_series`` on PostgreSQL, a recursive CTE on SQLite);
+* the per-day values come from complete ``DailyStats`` rows, UNION ALL
+  the raw table aggregated for every day without one (the same split
+  ``analytics.rollups.daily_stats`` makes);
+* each day is truncated to its bucket and LEFT JOINed to the calendar.
+
+A five-year daily series reads about 1,800 rollup rows.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+from .models import DailyStats
+
+GRANULARITIES = ('day', 'week', 'month')
+MAX_POINTS = 5000
+
+# Bucket start of a day (``{}`` is the day column) and the calendar step
+SQL_BUCKETS = {
+    'postgresql': {
+        'day': ('{}', '1 day'),
+        'week': ("date_trunc('week', {})::date", '1 week'),
+        'month': ("date_trunc('month', {})::date", '1 month'),
+    },
+    'sqlite': {
+        'day': ('{}', '+1 day'),
+        'week': ("date({}, 'weekday 0', '-6 days')", '+7 days'),
+        'month': ("date({}, 'start of month')", '+1 month'),
+    },
+}
+
+
+def _live_registrations(start, end, stored_days):
+    from patients.models import Patient
+    from patients.services import start_of_day
+
+    return Patient.objects.filter(
+        created_at__gte=start_of_day(start), created_at__lt=start_of_day(end + timedelta(days=1)),
+    ).annotate(day=TruncDate('created_at')).exclude(day__in=stored_days).values('day').annotate(value=Count('id'))
+
+
+def _live_appointments(start, end, stored_days):
+    from appointments.models import Appointment
+
+    return Appointment.objects.filter(
+        appointment_date__gte=start, appointment_date__lte=end,
+    ).exclude(appointment_date__in=stored_days).values(day=F('appointment_date')).annotate(value=Count('id'))
+
+
+def _live_revenue(start, end, stored_days):
+    from billing.models import Invoice
+
+    return Invoice.objects.filter(
+        status='paid', issue_date__gte=start, issue_date__lte=end,
+    ).exclude(issue_date__in=stored_days).values(day=F('issue_date')).annotate(value=Sum('total_amount'))
+
+
+@dataclass(frozen=True)
+class Metric:
+    """A DailyStats column and how to compute it live from the raw table"""
+
+    name: str
+    label: str
+    rollup_field: str
+    live_rows: object
+    is_money: bool = False
+
+
+METRICS = {
+    metric.name: metric for metric in [
+        Metric('registrations', 'New patient registrations', 'new_patients', _live_registrations),
+        Metric('appointments', 'Appointments', 'appointments', _live_appointments),
+        Metric('revenue', 'Paid revenue', 'paid_revenue', _live_revenue, is_money=True),
+    ]
+}
+
+
+def bucket_start(day, granularity):
+    """First day of the bucket ``day`` falls in"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def count_points(start, end, granularity):
+    first = bucket_start(start, granularity)
+    if granularity == 'month':
+        return (end.year - first.year) * 12 + end.month - first.month + 1
+    return (end - first).days // (7 if granularity == 'week' else 1) + 1
+
+
+def _daily_values_sql(metric, start, end):
+    """SQL and params of the (day, value) rows the series is summed from"""
+    complete = DailyStats.objects.filter(is_complete=True, date__gte=start, date__lte=end)
+    rollups = complete.order_by().values(day=F('date'), value=F(metric.rollup_field))
+    # Raw rows for every day in range without a complete rollup
+    live = metric.live_rows(start, end, complete.order_by().values('date')).order_by()
+    return rollups.union(live, all=True).query.sql_with_params()
+
+
+def time_series(metric_name, start, end, granularity='day'):
+    """``[(bucket_start, value)]`` for every bucket from ``start`` to ``end``"""
+    metric = METRICS[metric_name]
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Unknown granularity: {granularity}')
+    if connection.vendor not in SQL_BUCKETS:
+        raise NotImplementedError(f'Time series are not supported on {connection.vendor}')
+
+    first = bucket_start(start, granularity)
+    bucket_sql, step = SQL_BUCKETS[connection.vendor][granularity]
+    values_sql, values_params = _daily_values_sql(metric, first, end)
+    bucket = bucket_sql.format('series.day')
+
+    if connection.vendor == 'postgresql':
+        sql = (
+            'SELECT calendar.bucket, COALESCE(SUM(series.value), 0) '
+            'FROM (SELECT generate_series(%s::date, %s::date, %s::interval)::date AS bucket) AS calendar '
+            f'LEFT JOIN ({values_sql}) AS series ON {bucket} = calendar.bucket '
+            'GROUP BY calendar.bucket ORDER BY calendar.bucket'
+        )
+        params = (first, end, step, *values_params)
+    else:
+        sql = (
+            'WITH RECURSIVE calendar(bucket) AS ('
+            'SELECT %s UNION ALL SELECT date(bucket, %s) FROM calendar WHERE date(bucket, %s) <= %s) '
+            'SELECT calendar.bucket, COALESCE(SUM(series.value), 0) '
+            f'FROM calendar LEFT JOIN ({values_sql}) AS series ON {bucket} = calendar.bucket '
+            'GROUP BY calendar.bucket ORDER BY calendar.bucket'
+        )
+        params = (first.isoformat(), step, step, end.isoformat(), *values_params)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    convert = (lambda value: Decimal(str(value)).quantize(Decimal('0.01'))) if metric.is_money else int
+    return [
+        (day if isinstance(day, date) else datetime.strptime(day, '%Y-%m-%d').date(), convert(value))
+        for day, value in rows
+    ]
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.utils import timezone
+
+from .timeseries import GRANULARITIES, MAX_POINTS, METRICS, count_points, time_series
+
+
+@login_required
+def timeseries_api(request):
+    """
+    Time series of one metric: ``?metric=&start=&end=&granularity=``.
+
+    ``start`` and ``end`` are YYYY-MM-DD (default: the year up to today);
+    ``granularity`` is day, week or month. Buckets without activity are
+    returned with a zero value.
+    """
+    metric = request.GET.get('metric', '')
+    granularity = request.GET.get('granularity', 'day')
+    if metric not in METRICS:
+        return JsonResponse({'success': False, 'error': f"metric must be one of: {', '.join(METRICS)}"}, status=400)
+    if granularity not in GRANULARITIES:
+        return JsonResponse({'success': False, 'error': f"granularity must be one of: {', '.join(GRANULARITIES)}"}, status=400)
+    try:
+        end = datetime.strptime(request.GET['end'], '%Y-%m-%d').date() if request.GET.get('end') else timezone.localdate()
+        start = datetime.strptime(request.GET['start'], '%Y-%m-%d').date() if request.GET.get('start') else end - timedelta(days=364)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'start and end must be dates in YYYY-MM-DD format'}, status=400)
+    if start > end:
+        return JsonResponse({'success': False, 'error': 'start must not be after end'}, status=400)
+    if count_points(start, end, granularity) > MAX_POINTS:
+        return JsonResponse({'success': False, 'error': f'At most {MAX_POINTS} points; use a coarser granularity'}, status=400)
+
+    points = time_series(metric, start, end, granularity)
+    is_money = METRICS[metric].is_money
+    return JsonResponse({
+        'success': True,
+        'metric': metric,
+        'label': METRICS[metric].label,
+        'granularity': granularity,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'points': [
+            {'period': period.isoformat(), 'value': float(value) if is_money else value}
+            for period, value in points
+        ],
+    })
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-17 09:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0001_initial'),
+        ('doctors', '0002_extract_watermark_indexes'),
+        ('patients', '0004_extract_watermark_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['updated_at', 'id'], name='appointment_updated_at'),
+        ),
+    ]
@@ -2,8 +2,10 @@ from django.db import models
 from django.utils import timezone
 from patients.models import Patient
 from doctors.models import Doctor
+from core.sequences import next_identifier
+from core.tracking import ChangeTrackingMixin
 
-class Appointment(models.Model):
+class Appointment(ChangeTrackingMixin, models.Model):
     """Appointment model for scheduling patient visits"""
 
     STATUS_CHOICES = [
@@ -33,6 +35,12 @@ class Appointment(models.Model):
         ('urgent', 'Urgent'),
     ]
 
+    # Status transitions trigger notifications (see notifications.signals);
+    # the others feed the appointment's search document (see core.search),
+    # a date change refreshes the old day's rollups (see analytics.signals)
+    # and doctor/type changes follow into the revenue facts (see billing.cube)
+    tracked_fields = ('status', 'patient', 'doctor', 'appointment_date', 'appointment_type')
+
     # Core Fields
     appointment_id = models.CharField(max_length=20, unique=True, editable=False)
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='appointments')
@@ -72,19 +80,8 @@ class Appointment(models.Model):
     def save(self, *args, **kwargs):
         if not self.appointment_id:
             # Generate appointment ID: APT + year + month + sequential number
-            now = timezone.now()
-            year_month = now.strftime('%Y%m')
-            last_appointment = Appointment.objects.filter(
-                appointment_id__startswith=f'APT{year_month}'
-            ).order_by('appointment_id').last()
-
-            if last_appointment:
-                last_number = int(last_appointment.appointment_id[-4:])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-
-            self.appointment_id = f'APT{year_month}{new_number:04d}'
+            year_month = timezone.now().strftime('%Y%m')
+            self.appointment_id = next_identifier(f'APT{year_month}', Appointment, 'appointment_id')
 
         super().save(*args, **kwargs)
 
@@ -127,3 +124,7 @@ class Appointment(models.Model):
         verbose_name = 'Appointment'
         verbose_name_plural = 'Appointments'
         unique_together = ['doctor', 'appointment_date', 'appointment_time']
+        indexes = [
+            # The watermark order of manage.py extract (see core.extract)
+            models.Index(fields=['updated_at', 'id'], name='appointment_updated_at'),
+        ]
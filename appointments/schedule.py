@@ -0,0 +1,124 @@
+"""
+Schedule grids: the appointments of one or many doctors over a week or a month.
+
+``ScheduleGrid`` reads the whole date range with one query and groups the
+rows in Python by day, by doctor and by hour, so templates loop over
+ready-made cells instead of filtering a queryset per day (or per cell).
+A department month view costs one appointment query however many doctors
+and days it shows.
+"""
+import calendar
+from dataclasses import dataclass, field
+from datetime import date, time, timedelta
+
+from django.utils import timezone
+
+from .models import Appointment
+
+SCHEDULE_VIEWS = ('week', 'month')
+# Rows always shown in the weekly hour grid, widened to fit the appointments
+DEFAULT_HOURS = range(8, 18)
+
+
+def schedule_range(view, anchor):
+    """First and last day of the week or month containing ``anchor``"""
+    if view == 'month':
+        first = anchor.replace(day=1)
+        return first, first.replace(day=calendar.monthrange(first.year, first.month)[1])
+    first = anchor - timedelta(days=anchor.weekday())
+    return first, first + timedelta(days=6)
+
+
+def adjacent_anchors(view, start_date, end_date):
+    """Anchor dates of the previous and next week or month"""
+    if view == 'month':
+        return (start_date - timedelta(days=1)).replace(day=1), end_date + timedelta(days=1)
+    return start_date - timedelta(days=7), start_date + timedelta(days=7)
+
+
+@dataclass
+class ScheduleDay:
+    """One day of a grid and its appointments, in time order"""
+
+    date: date
+    appointments: list = field(default_factory=list)
+    by_doctor: dict = field(default_factory=dict)
+
+    @property
+    def name(self):
+        return calendar.day_name[self.date.weekday()]
+
+    @property
+    def is_today(self):
+        return self.date == timezone.localdate()
+
+
+class ScheduleGrid:
+    """Appointments of ``doctors`` from ``start_date`` to ``end_date`` (inclusive)"""
+
+    def __init__(self, doctors, start_date, end_date):
+        self.doctors = list(doctors)
+        self.start_date = start_date
+        self.end_date = end_date
+        self.days = [
+            ScheduleDay(start_date + timedelta(days=offset))
+            for offset in range((end_date - start_date).days + 1)
+        ]
+        self._days_by_date = {day.date: day for day in self.days}
+
+        doctors_by_id = {doctor.pk: doctor for doctor in self.doctors}
+        self.appointments = list(
+            Appointment.objects.filter(
+                doctor__in=list(doctors_by_id),
+                appointment_date__gte=start_date,
+                appointment_date__lte=end_date,
+            ).select_related('patient').order_by('appointment_date', 'appointment_time', 'doctor_id')
+        )
+        for appointment in self.appointments:
+            # The doctors are already loaded; reuse them instead of joining
+            appointment.doctor = doctors_by_id[appointment.doctor_id]
+            day = self._days_by_date[appointment.appointment_date]
+            day.appointments.append(appointment)
+            day.by_doctor.setdefault(appointment.doctor_id, []).append(appointment)
+
+    def day(self, value):
+        """The ScheduleDay for ``value``, or None outside the grid"""
+        return self._days_by_date.get(value)
+
+    def hour_rows(self):
+        """``(hour, [appointments per day])`` rows for a time-by-day table"""
+        hours = set(DEFAULT_HOURS) | {appointment.appointment_time.hour for appointment in self.appointments}
+        rows = {hour: [[] for _ in self.days] for hour in sorted(hours)}
+        for index, day in enumerate(self.days):
+            for appointment in day.appointments:
+                rows[appointment.appointment_time.hour][index].append(appointment)
+        return [(time(hour), cells) for hour, cells in rows.items()]
+
+    def weeks(self):
+        """The days split into Monday-first weeks, padded with None, for a month calendar"""
+        cells = [None] * self.days[0].date.weekday() + self.days
+        cells += [None] * (-len(cells) % 7)
+        return [cells[index:index + 7] for index in range(0, len(cells), 7)]
+
+    def doctor_rows(self):
+        """``(doctor, [appointments per day])`` rows for a doctor-by-day table"""
+        return [
+            (doctor, [day.by_doctor.get(doctor.pk, []) for day in self.days])
+            for doctor in self.doctors
+        ]
+
+    def status_counts(self):
+        counts = dict.fromkeys((value for value, _ in Appointment.STATUS_CHOICES), 0)
+        for appointment in self.appointments:
+            counts[appointment.status] = counts.get(appointment.status, 0) + 1
+        return counts
+
+    def free_slot_count(self, now=None):
+        """Free slots left in the grid's working hours, from now on"""
+        from .slots import SlotEngine, get_slot_minutes
+
+        engine = SlotEngine.from_appointments(self.doctors, self.start_date, self.end_date, self.appointments)
+        return sum(
+            len(engine.free_slots(doctor, count=24 * 60 * len(self.days) // get_slot_minutes(), now=now))
+            for doctor in self.doctors
+        )
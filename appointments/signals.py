@@ -5,11 +5,9 @@
 # Import the actual signals from notifications to ensure they're registered
 from notifications.signals import (
     appointment_notifications,
-    appointment_status_change_notifications
 )
 
 # Re-export the signals for compatibility
 __all__ = [
     'appointment_notifications',
-    'appointment_status_change_notifications'
 ]
@@ -0,0 +1,248 @@
+"""
+Doctor availability as intervals.
+
+A doctor is free at a time if it falls inside their working hours for
+that weekday (``Doctor.monday_start`` ... ``sunday_end``) and does not
+overlap any active appointment, taking each appointment's
+``duration_minutes`` into account. Doctors with no weekly schedule at all
+(none is set when a doctor is added) work ``DOCTOR_DEFAULT_WORKING_HOURS``
+every day, or around the clock when that is None.
+
+``SlotEngine`` loads every appointment of the requested doctors over the
+requested date range with one query, merges them into busy intervals per
+doctor and day, and answers everything else in memory: the next N free
+slots, a whole-day availability bitmap, or whether one proposed time is
+free. Cost depends on the number of appointments, not on how many
+candidate times are probed.
+
+Times are minutes after midnight internally; dates and times are local
+(appointments store a naive date and time).
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Appointment
+
+# Appointments in these states occupy their time; the others (cancelled,
+# completed, no-show, rescheduled) only keep their exact start time taken,
+# because (doctor, date, time) is unique
+BLOCKING_STATUSES = ('scheduled', 'confirmed', 'in_progress')
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+def get_slot_minutes():
+    return getattr(settings, 'APPOINTMENT_SLOT_MINUTES', 30)
+
+
+def to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def from_minutes(minutes):
+    return datetime.min.replace(hour=minutes // 60, minute=minutes % 60).time()
+
+
+def format_minutes(minutes):
+    """HH:MM, including 24:00 for the end of the day"""
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def merge_intervals(intervals):
+    """Sorted, non-overlapping union of ``(start, end)`` intervals"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [tuple(interval) for interval in merged]
+
+
+def default_working_hours():
+    """``(start, end)`` minutes worked by doctors without a weekly schedule"""
+    hours = getattr(settings, 'DOCTOR_DEFAULT_WORKING_HOURS', None)
+    if hours is None:
+        return 0, 24 * 60
+    start, end = (to_minutes(time.fromisoformat(value)) for value in hours)
+    return start, end
+
+
+def has_schedule(doctor):
+    """Whether any weekday of the doctor has working hours set"""
+    return any(
+        getattr(doctor, f'{weekday}_start') is not None or getattr(doctor, f'{weekday}_end') is not None
+        for weekday in WEEKDAYS
+    )
+
+
+def working_hours(doctor, day):
+    """``(start, end)`` minutes the doctor works on ``day``, or None on a day off"""
+    if not has_schedule(doctor):
+        return default_working_hours()
+    weekday = WEEKDAYS[day.weekday()]
+    start, end = getattr(doctor, f'{weekday}_start'), getattr(doctor, f'{weekday}_end')
+    if start is None or end is None or end <= start:
+        return None
+    return to_minutes(start), to_minutes(end)
+
+
+class DaySchedule:
+    """One doctor's working hours and busy intervals on one day"""
+
+    def __init__(self, hours, busy, taken_starts):
+        self.hours = hours
+        self.busy = busy
+        self.taken_starts = taken_starts
+
+    def is_free(self, start, duration):
+        """Whether ``[start, start + duration)`` is inside working hours and overlaps nothing"""
+        if self.hours is None or start in self.taken_starts:
+            return False
+        end = start + duration
+        if start < self.hours[0] or end > self.hours[1]:
+            return False
+        # busy is sorted and merged; stop at the first interval ending after start
+        for busy_start, busy_end in self.busy:
+            if busy_end <= start:
+                continue
+            return busy_start >= end
+        return True
+
+    def free_starts(self, duration, step, earliest=0):
+        """Free start minutes on the ``step`` grid from the start of working hours"""
+        if self.hours is None:
+            return
+        day_start, day_end = self.hours
+        busy = iter(self.busy)
+        current = next(busy, None)
+        start = day_start
+        if earliest > start:
+            start += -(-(earliest - start) // step) * step
+        while start + duration <= day_end:
+            # Skip busy intervals that end before this candidate
+            while current is not None and current[1] <= start:
+                current = next(busy, None)
+            if current is not None and current[0] < start + duration:
+                # Jump to the first grid point after the blocking interval
+                start += -(-(current[1] - start) // step) * step
+                continue
+            if start not in self.taken_starts:
+                yield start
+            start += step
+
+
+class SlotEngine:
+    """
+    Availability of ``doctors`` from ``start_date`` to ``end_date`` (inclusive).
+
+    Appointments are loaded once, on first use. ``exclude_appointment``
+    leaves one appointment out, for rescheduling it.
+    """
+
+    def __init__(self, doctors, start_date, end_date, exclude_appointment=None):
+        self.doctors = list(doctors)
+        self.start_date = start_date
+        self.end_date = end_date
+        self.exclude_appointment = exclude_appointment
+        self._schedules = None
+
+    @classmethod
+    def from_appointments(cls, doctors, start_date, end_date, appointments):
+        """An engine over already loaded ``appointments``, without querying again"""
+        engine = cls(doctors, start_date, end_date)
+        engine._load([
+            (appointment.doctor_id, appointment.appointment_date, appointment.appointment_time,
+             appointment.duration_minutes, appointment.status)
+            for appointment in appointments
+        ])
+        return engine
+
+    def _load(self, rows=None):
+        busy = defaultdict(list)
+        taken = defaultdict(set)
+        if rows is None:
+            appointments = Appointment.objects.filter(
+                doctor__in=[doctor.pk for doctor in self.doctors],
+                appointment_date__gte=self.start_date,
+                appointment_date__lte=self.end_date,
+            )
+            if self.exclude_appointment:
+                appointments = appointments.exclude(pk=self.exclude_appointment)
+            rows = appointments.values_list('doctor_id', 'appointment_date', 'appointment_time', 'duration_minutes', 'status')
+        for doctor_id, day, start_time, duration, status in rows:
+            start = to_minutes(start_time)
+            taken[doctor_id, day].add(start)
+            if status in BLOCKING_STATUSES:
+                busy[doctor_id, day].append((start, start + (duration or get_slot_minutes())))
+
+        self._schedules = {}
+        day = self.start_date
+        while day <= self.end_date:
+            for doctor in self.doctors:
+                key = (doctor.pk, day)
+                self._schedules[key] = DaySchedule(working_hours(doctor, day), merge_intervals(busy[key]), taken[key])
+            day += timedelta(days=1)
+
+    def schedule(self, doctor, day):
+        if self._schedules is None:
+            self._load()
+        return self._schedules[doctor.pk, day]
+
+    def days(self):
+        day = self.start_date
+        while day <= self.end_date:
+            yield day
+            day += timedelta(days=1)
+
+    def is_available(self, doctor, day, start_time, duration=None):
+        """``(available, message)`` for booking ``doctor`` at ``day`` ``start_time``"""
+        duration = duration or get_slot_minutes()
+        schedule = self.schedule(doctor, day)
+        start = to_minutes(start_time)
+        if schedule.hours is None:
+            return False, 'Doctor does not work on this day.'
+        if start < schedule.hours[0] or start + duration > schedule.hours[1]:
+            return False, (
+                f'Outside working hours ({format_minutes(schedule.hours[0])}'
+                f'-{format_minutes(schedule.hours[1])}).'
+            )
+        if not schedule.is_free(start, duration):
+            return False, 'Doctor is not available at this time. Please choose a different time.'
+        return True, 'Doctor is available at this time.'
+
+    def free_slots(self, doctor, count, duration=None, step=None, now=None):
+        """The next ``count`` free start datetimes (naive, local) for ``doctor``"""
+        duration = duration or get_slot_minutes()
+        step = step or get_slot_minutes()
+        now = now or timezone.localtime().replace(tzinfo=None)
+        slots = []
+        for day in self.days():
+            if day < now.date():
+                continue
+            earliest = to_minutes(now) + (1 if now.second or now.microsecond else 0) if day == now.date() else 0
+            for start in self.schedule(doctor, day).free_starts(duration, step, earliest):
+                slots.append(datetime.combine(day, from_minutes(start)))
+                if len(slots) >= count:
+                    return slots
+        return slots
+
+    def day_bitmap(self, doctor, day, slot_minutes=None):
+        """
+        Availability of each ``slot_minutes`` slot of the doctor's working
+        day as a string of '1' (free) and '0' (busy); returns
+        ``(start_time, bitmap)`` or ``(None, '')`` on a day off.
+        """
+        slot_minutes = slot_minutes or get_slot_minutes()
+        schedule = self.schedule(doctor, day)
+        if schedule.hours is None:
+            return None, ''
+        day_start, day_end = schedule.hours
+        bitmap = ''.join(
+            '1' if schedule.is_free(start, slot_minutes) else '0'
+            for start in range(day_start, day_end - slot_minutes + 1, slot_minutes)
+        )
+        return from_minutes(day_start), bitmap
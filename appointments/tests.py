@@ -1,3 +1,121 @@
-from django.test import TestCase
+from datetime import date, datetime, time
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from patients.tests import create_doctor, create_patient
+from .models import Appointment
+from .slots import SlotEngine, merge_intervals
+
+User = get_user_model()
+
+MONDAY = date(2030, 3, 4)
+WORKING_HOURS = {
+    f'{day}_{edge}': value
+    for day in ('monday', 'tuesday', 'wednesday', 'thursday', 'friday')
+    for edge, value in (('start', time(9, 0)), ('end', time(12, 0)))
+}
+
+
+class SlotEngineTests(TestCase):
+    """Test cases for interval-based doctor availability"""
+
+    def setUp(self):
+        self.patient = create_patient()
+        self.doctor = create_doctor(**WORKING_HOURS)
+
+    def book(self, start, duration=30, doctor=None, day=MONDAY, status='scheduled'):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=doctor or self.doctor, appointment_date=day,
+            appointment_time=start, duration_minutes=duration, status=status, chief_complaint='Checkup',
+        )
+
+    def test_merge_intervals(self):
+        self.assertEqual(merge_intervals([(60, 90), (0, 30), (30, 45), (80, 120)]), [(0, 45), (60, 120)])
+
+    def test_free_slots_respect_duration_and_hours(self):
+        """A 60 minute appointment blocks two 30 minute slots; slots stop at the end of the day"""
+        self.book('09:30', duration=60)
+        engine = SlotEngine([self.doctor], MONDAY, MONDAY)
+        slots = engine.free_slots(self.doctor, 10, now=datetime(2030, 1, 1))
+        self.assertEqual([slot.strftime('%H:%M') for slot in slots], ['09:00', '10:30', '11:00', '11:30'])
+        self.assertEqual(engine.day_bitmap(self.doctor, MONDAY), (time(9, 0), '100111'))
+
+        available, _ = engine.is_available(self.doctor, MONDAY, time(10, 0))
+        self.assertFalse(available)
+        available, _ = engine.is_available(self.doctor, MONDAY, time(11, 30), duration=45)
+        self.assertFalse(available)
+
+    def test_cancelled_appointments_only_keep_their_start(self):
+        self.book('09:00', duration=90, status='cancelled')
+        engine = SlotEngine([self.doctor], MONDAY, MONDAY)
+        self.assertEqual(engine.day_bitmap(self.doctor, MONDAY)[1], '011111')
+
+    def test_free_slots_skip_days_off_and_the_past(self):
+        saturday = date(2030, 3, 9)
+        engine = SlotEngine([self.doctor], saturday, date(2030, 3, 11))
+        slots = engine.free_slots(self.doctor, 2, now=datetime(2030, 3, 11, 10, 5))
+        self.assertEqual(slots, [datetime(2030, 3, 11, 10, 30), datetime(2030, 3, 11, 11, 0)])
+        self.assertEqual(engine.day_bitmap(self.doctor, saturday), (None, ''))
+
+    def test_doctor_without_schedule_is_bookable(self):
+        """Doctors added without working hours are not treated as off every day"""
+        doctor = create_doctor(username='dr.almaz')
+        saturday = date(2030, 3, 9)
+        self.book('10:00', doctor=doctor, day=saturday)
+        engine = SlotEngine([doctor], saturday, saturday)
+
+        self.assertEqual(engine.is_available(doctor, saturday, time(9, 0)), (True, 'Doctor is available at this time.'))
+        self.assertFalse(engine.is_available(doctor, saturday, time(9, 45))[0])
+        self.assertEqual(engine.day_bitmap(doctor, saturday)[0], time(0, 0))
+
+        with override_settings(DOCTOR_DEFAULT_WORKING_HOURS=('08:00', '17:00')):
+            engine = SlotEngine([doctor], saturday, saturday)
+            self.assertEqual(engine.day_bitmap(doctor, saturday), (time(8, 0), '1111' + '0' + '1' * 13))
+            available, message = engine.is_available(doctor, saturday, time(17, 0))
+            self.assertFalse(available)
+            self.assertIn('08:00-17:00', message)
+
+    def test_queries_do_not_grow_with_slots_or_doctors(self):
+        other = create_doctor(username='dr.almaz', **WORKING_HOURS)
+        for hour in (9, 10, 11):
+            self.book(f'{hour}:00', doctor=other)
+        with CaptureQueriesContext(connection) as queries:
+            engine = SlotEngine([self.doctor, other], MONDAY, date(2030, 3, 31))
+            for doctor in (self.doctor, other):
+                engine.free_slots(doctor, 100, now=datetime(2030, 1, 1))
+                engine.day_bitmap(doctor, MONDAY)
+        self.assertEqual(len(queries), 1)
+
+    def test_views(self):
+        user = User.objects.create_user(username='reception', password='testpass123', role='receptionist')
+        self.client.force_login(user)
+        self.book('09:00', duration=60)
+
+        response = self.client.get(reverse('appointments:check_availability'), {
+            'doctor_id': self.doctor.pk, 'appointment_date': MONDAY.isoformat(), 'appointment_time': '09:30',
+        })
+        self.assertFalse(response.json()['available'])
+        response = self.client.get(reverse('appointments:check_availability'), {
+            'doctor_id': self.doctor.pk, 'appointment_date': MONDAY.isoformat(), 'appointment_time': '13:00',
+        })
+        self.assertIn('working hours', response.json()['message'])
+        response = self.client.get(reverse('appointments:check_availability'), {
+            'doctor_id': self.doctor.pk, 'appointment_date': MONDAY.isoformat(), 'appointment_time': '11:00',
+            'duration': 90,
+        })
+        self.assertIn('working hours', response.json()['message'])
+
+        response = self.client.get(reverse('appointments:free_slots'), {
+            'doctor': self.doctor.pk, 'date': MONDAY.isoformat(), 'count': 2,
+        })
+        self.assertEqual(response.json()['doctors'][0]['slots'], ['2030-03-04T10:00', '2030-03-04T10:30'])
+        response = self.client.get(reverse('appointments:free_slots'), {
+            'doctor': self.doctor.pk, 'date': MONDAY.isoformat(), 'bitmap': '1',
+        })
+        self.assertEqual(response.json()['doctors'][0], {
+            'doctor_id': self.doctor.pk, 'name': self.doctor.get_full_name(), 'start': '09:00', 'bitmap': '001111',
+        })
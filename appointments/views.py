@@ -1,7 +1,6 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.db.models import Q
 from django.http import JsonResponse
 from django.urls import reverse
@@ -9,16 +8,14 @@ from django.utils import timezone
 from .models import Appointment
 from patients.models import Patient
 from doctors.models import Doctor
+from core.pagination import KeysetPaginator
 from datetime import datetime, timedelta, time
 import json
 
-@login_required
-def appointment_list_view(request):
-    """Appointment list view with filtering and search"""
-    appointments = Appointment.objects.select_related('patient', 'doctor__user').all()
-
+def filter_appointments(appointments, params):
+    """Apply the appointment list search and filters in ``params`` (shared with the export)"""
     # Search functionality
-    search_query = request.GET.get('search', '')
+    search_query = params.get('search', '')
     if search_query:
         appointments = appointments.filter(
             Q(appointment_id__icontains=search_query) |
@@ -29,32 +26,43 @@ def appointment_list_view(request):
         )
 
     # Filter by status
-    status_filter = request.GET.get('status', '')
+    status_filter = params.get('status', '')
     if status_filter:
         appointments = appointments.filter(status=status_filter)
 
     # Filter by doctor
-    doctor_filter = request.GET.get('doctor', '')
+    doctor_filter = params.get('doctor', '')
     if doctor_filter:
         appointments = appointments.filter(doctor_id=doctor_filter)
 
     # Filter by date
-    date_filter = request.GET.get('date', '')
+    date_filter = params.get('date', '')
     if date_filter:
         appointments = appointments.filter(appointment_date=date_filter)
 
-    # Pagination
-    paginator = Paginator(appointments, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    return appointments
+
+@login_required
+def appointment_list_view(request):
+    """Appointment list view with filtering and search"""
+    appointments = filter_appointments(
+        Appointment.objects.select_related('patient', 'doctor__user').all(), request.GET
+    )
+    search_query = request.GET.get('search', '')
+    status_filter = request.GET.get('status', '')
+    doctor_filter = request.GET.get('doctor', '')
+    date_filter = request.GET.get('date', '')
+
+    # Keyset pagination in appointment date/time order
+    page_obj = KeysetPaginator(appointments, 15).get_page(request.GET.get('cursor'))
 
     # Get filter options
     doctors = Doctor.objects.select_related('user').all()
     statuses = Appointment.STATUS_CHOICES
 
-    # Calculate today's appointments for mobile stats
-    today = datetime.now().date()
-    today_appointments = Appointment.objects.filter(appointment_date=today).count()
+    # Today's count comes from the cached dashboard snapshot instead of a COUNT per page
+    from patients.views import get_dashboard_stats
+    today_appointments = get_dashboard_stats().today_appointments
 
     context = {
         'appointments': page_obj,  # Added for mobile template compatibility
@@ -65,7 +73,6 @@ def appointment_list_view(request):
         'date_filter': date_filter,
         'doctors': doctors,
         'statuses': statuses,
-        'total_appointments': appointments.count(),
         'today_appointments': today_appointments,
     }
 
@@ -75,11 +82,32 @@ def appointment_list_view(request):
 
     return render(request, template_name, context)
 
+@login_required
+def appointment_export_view(request):
+    """Stream the (filtered) appointment list as CSV"""
+    from core.export import ExportColumn, choice_label, csv_export_response, date_format, full_name
+
+    columns = [
+        ExportColumn('Appointment ID', 'appointment_id'),
+        ExportColumn('Patient ID', 'patient__patient_id'),
+        ExportColumn('Patient', ('patient__first_name', 'patient__last_name'), full_name),
+        ExportColumn('Doctor', ('doctor__user__first_name', 'doctor__user__last_name'), full_name),
+        ExportColumn('Date', 'appointment_date', date_format()),
+        ExportColumn('Time', 'appointment_time', date_format('%H:%M')),
+        ExportColumn('Type', 'appointment_type', choice_label(Appointment.APPOINTMENT_TYPE_CHOICES)),
+        ExportColumn('Priority', 'priority', choice_label(Appointment.PRIORITY_CHOICES)),
+        ExportColumn('Status', 'status', choice_label(Appointment.STATUS_CHOICES)),
+    ]
+    appointments = filter_appointments(Appointment.objects.all(), request.GET)
+    return csv_export_response(appointments, columns, 'appointments.csv')
+
 @login_required
 def appointment_add_view(request):
     """Add appointment view with form handling"""
     if request.method == 'POST':
         try:
+            from .slots import get_slot_minutes
+
             # Get patient and doctor
             patient = get_object_or_404(Patient, pk=request.POST.get('patient'))
             doctor = get_object_or_404(Doctor, pk=request.POST.get('doctor'))
@@ -90,6 +118,7 @@ def appointment_add_view(request):
                 doctor=doctor,
                 appointment_date=request.POST.get('appointment_date'),
                 appointment_time=request.POST.get('appointment_time'),
+                duration_minutes=int(request.POST.get('duration') or get_slot_minutes()),
                 appointment_type=request.POST.get('appointment_type'),
                 priority=request.POST.get('priority', 'normal'),
                 chief_complaint=request.POST.get('chief_complaint'),
@@ -237,38 +266,24 @@ def check_doctor_availability(request):
             return JsonResponse({'available': False, 'message': 'Missing required parameters'})
 
         try:
-            from datetime import datetime
+            from .slots import SlotEngine
 
-            # Check if the doctor has another appointment at the same time
-            existing_appointments = Appointment.objects.filter(
-                doctor_id=doctor_id,
-                appointment_date=appointment_date,
-                appointment_time=appointment_time,
-                status__in=['scheduled', 'confirmed']
-            )
-
-            # Exclude current appointment if editing
-            if appointment_id:
-                existing_appointments = existing_appointments.exclude(pk=appointment_id)
-
-            if existing_appointments.exists():
-                return JsonResponse({
-                    'available': False,
-                    'message': 'Doctor is not available at this time. Please choose a different time.'
-                })
+            appointment_datetime = datetime.strptime(f"{appointment_date} {appointment_time}"[:16], "%Y-%m-%d %H:%M")
+            duration = int(request.GET.get('duration') or 0) or None
 
             # Check if the time is in the past
-            appointment_datetime = datetime.strptime(f"{appointment_date} {appointment_time}", "%Y-%m-%d %H:%M")
-            if appointment_datetime < datetime.now():
+            if appointment_datetime < timezone.localtime().replace(tzinfo=None):
                 return JsonResponse({
                     'available': False,
                     'message': 'Cannot schedule appointments in the past.'
                 })
 
-            return JsonResponse({
-                'available': True,
-                'message': 'Doctor is available at this time.'
-            })
+            # Working hours and overlap with the doctor's other appointments
+            doctor = get_object_or_404(Doctor, pk=doctor_id)
+            day = appointment_datetime.date()
+            engine = SlotEngine([doctor], day, day, exclude_appointment=appointment_id)
+            available, message = engine.is_available(doctor, day, appointment_datetime.time(), duration)
+            return JsonResponse({'available': available, 'message': message})
 
         except Exception as e:
             return JsonResponse({'available': False, 'message': f'Error checking availability: {str(e)}'})
@@ -276,6 +291,48 @@ def check_doctor_availability(request):
     return JsonResponse({'available': False, 'message': 'Invalid request method'})
 
 
+@login_required
+def free_slots_view(request):
+    """
+    JSON free slots for one or more doctors (``?doctor=1&doctor=2``).
+
+    By default returns the next ``count`` free start times within ``days``
+    days of ``date``; with ``bitmap=1`` returns each doctor's availability
+    on ``date`` as one '1'/'0' character per slot instead.
+    """
+    from .slots import SlotEngine, get_slot_minutes
+
+    try:
+        doctor_ids = [int(value) for value in request.GET.getlist('doctor') + request.GET.getlist('doctor_id')]
+        start_date = datetime.strptime(request.GET['date'], '%Y-%m-%d').date() if request.GET.get('date') else timezone.localdate()
+        days = min(max(int(request.GET.get('days', 7)), 1), 31)
+        count = min(max(int(request.GET.get('count', 5)), 1), 100)
+        duration = int(request.GET.get('duration') or get_slot_minutes())
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'Invalid parameters'}, status=400)
+    if not doctor_ids:
+        return JsonResponse({'error': 'At least one doctor is required'}, status=400)
+    if duration <= 0:
+        return JsonResponse({'error': 'Invalid duration'}, status=400)
+
+    doctors = list(Doctor.objects.select_related('user').filter(pk__in=doctor_ids))
+    bitmap = request.GET.get('bitmap') == '1'
+    end_date = start_date if bitmap else start_date + timedelta(days=days - 1)
+    engine = SlotEngine(doctors, start_date, end_date)
+
+    results = []
+    for doctor in doctors:
+        entry = {'doctor_id': doctor.pk, 'name': doctor.get_full_name()}
+        if bitmap:
+            day_start, slots = engine.day_bitmap(doctor, start_date, duration)
+            entry.update({'start': day_start.strftime('%H:%M') if day_start else None, 'bitmap': slots})
+        else:
+            entry['slots'] = [slot.strftime('%Y-%m-%dT%H:%M') for slot in engine.free_slots(doctor, count, duration)]
+        results.append(entry)
+
+    return JsonResponse({'date': start_date.isoformat(), 'slot_minutes': duration, 'doctors': results})
+
+
 @login_required
 def appointment_start_view(request, pk):
     """Start appointment - change status from scheduled to in_progress"""
@@ -18,7 +18,6 @@ except ImportError:
     try:
         from notifications.signals import (
             appointment_notifications,
-            appointment_status_change_notifications
         )
     except ImportError:
         pass
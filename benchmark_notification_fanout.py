@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+Benchmark: patient registration latency vs. staff head-count
+Ethiopian Hospital ERP System
+
+Registering a patient notifies every doctor, nurse and admin. This script
+measures how long Patient.objects.create() takes (and how many queries it
+issues) as the number of staff grows. With bulk fan-out both numbers
+should stay flat.
+
+Runs against a throw-away test database, never the configured one:
+
+    python benchmark_notification_fanout.py [--staff 10,100,1000,5000] [--registrations 20]
+                                            [--mode immediate|deferred]
+
+--mode immediate (default) fans out inside the saving process so the bulk
+insert itself is measured; --mode deferred only queues a NotificationJob.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hospital_erp.settings')
+django.setup()
+
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+)
+
+from notifications.models import Notification
+from patients.models import Patient
+
+User = get_user_model()
+
+
+def add_staff(count, offset):
+    """Bulk-create ``count`` doctors/nurses/admins"""
+    roles = ['doctor', 'nurse', 'admin']
+    User.objects.bulk_create(
+        [User(username=f'bench.staff.{offset + index}', role=roles[index % 3]) for index in range(count)],
+        batch_size=1000,
+    )
+
+
+def register_patient(index):
+    return Patient.objects.create(
+        first_name='Bench', last_name=f'Patient{index}', date_of_birth=date(1990, 1, 1),
+        gender='F', kebele='01', woreda='Bole', phone='0912345678',
+        emergency_contact_name='Contact', emergency_contact_phone='0911223344',
+        emergency_contact_relationship='Sibling',
+    )
+
+
+def run(staff_levels, registrations):
+    print("📊 Patient registration latency vs. staff count")
+    print("=" * 60)
+    print(f"{'staff':>8} {'mean ms':>10} {'p95 ms':>10} {'queries':>10} {'notifications':>14}")
+
+    staff_total = 0
+    patient_index = 0
+    register_patient(patient_index)  # warm up the ID sequence
+
+    for level in staff_levels:
+        add_staff(level - staff_total, staff_total)
+        staff_total = level
+
+        timings = []
+        query_counts = []
+        for _ in range(registrations):
+            patient_index += 1
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                register_patient(patient_index)
+                timings.append((time.perf_counter() - started) * 1000)
+            query_counts.append(len(context.captured_queries))
+
+        p95 = sorted(timings)[max(0, int(len(timings) * 0.95) - 1)]
+        print(f"{level:>8} {statistics.mean(timings):>10.2f} {p95:>10.2f} "
+              f"{max(query_counts):>10} {Notification.objects.count():>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--staff', default='10,100,1000,5000', help='comma separated staff head-counts')
+    parser.add_argument('--registrations', type=int, default=20, help='registrations timed per level')
+    parser.add_argument('--mode', choices=['immediate', 'deferred'], default='immediate',
+                        help='notification dispatch mode to benchmark')
+    args = parser.parse_args()
+    staff_levels = sorted(int(value) for value in args.staff.split(','))
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        with override_settings(NOTIFICATION_DISPATCH_MODE=args.mode):
+            run(staff_levels, args.registrations)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
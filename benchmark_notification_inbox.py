@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+Benchmark: notification inbox queries on a large table
+Ethiopian Hospital ERP System
+
+Seeds a notification table (one million rows by default) spread across a
+few thousand users, then prints the query plan and timing of each inbox
+access path: the notification list, the unread filter, the dropdown and
+the unread badge count. The list queries should read rows straight from
+notif_recipient_created_idx or the partial notif_unread_recipient_idx in
+created_at order, and the badge count should be answered from the partial
+index alone (an index-only scan on PostgreSQL). A full table scan or a sort step
+means the indexes no longer match the queries.
+
+Runs against a throw-away test database, never the configured one:
+
+    python benchmark_notification_inbox.py [--rows 1000000] [--users 2000] [--unread 0.1]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hospital_erp.settings')
+django.setup()
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from notifications.models import Notification
+
+User = get_user_model()
+
+SEED_BATCH = 10000
+INDEX_NAMES = ('notif_recipient_created_idx', 'notif_unread_recipient_idx')
+
+
+def seed(rows, users, unread_ratio):
+    """Bulk-create ``users`` staff and ``rows`` notifications spread over a year"""
+    User.objects.bulk_create(
+        [User(username=f'bench.inbox.{index}', role='nurse') for index in range(users)],
+        batch_size=1000,
+    )
+    user_ids = list(User.objects.values_list('id', flat=True))
+    rng = random.Random(42)
+    now = timezone.now()
+
+    created = 0
+    while created < rows:
+        batch = [
+            Notification(
+                title='Benchmark', message='Seeded notification', notification_type='system',
+                recipient_id=rng.choice(user_ids), is_read=rng.random() >= unread_ratio,
+            )
+            for _ in range(min(SEED_BATCH, rows - created))
+        ]
+        Notification.objects.bulk_create(batch)
+        created += len(batch)
+        print(f"\r  seeded {created:,}/{rows:,} notifications", end='', flush=True)
+    print()
+
+    # created_at is auto_now_add, so spread the rows over the last year afterwards
+    with connection.cursor() as cursor:
+        for offset in range(0, 365, 30):
+            Notification.objects.filter(id__gt=rows * offset // 365).update(
+                created_at=now - timedelta(days=365 - offset)
+            )
+        cursor.execute('ANALYZE')
+    return user_ids
+
+
+def explain_count(queryset):
+    """EXPLAIN the exact COUNT query ``queryset.count()`` sends"""
+    with CaptureQueriesContext(connection) as context:
+        queryset.count()
+    sql = context.captured_queries[-1]['sql']
+    with connection.cursor() as cursor:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+        return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+
+def time_query(run, repeat=20):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def report(user_id):
+    inbox = Notification.objects.filter(recipient_id=user_id).order_by('-created_at')
+    unread = inbox.filter(is_read=False)
+
+    access_paths = [
+        ('notification list', lambda: inbox[:20].explain(), lambda: list(inbox[:20])),
+        ('unread filter', lambda: unread[:20].explain(), lambda: list(unread[:20])),
+        ('dropdown', lambda: inbox[:10].explain(), lambda: list(inbox[:10])),
+        ('unread badge', lambda: explain_count(unread), lambda: unread.count()),
+    ]
+
+    print(f"\n📊 Inbox queries for user {user_id} ({inbox.count():,} notifications, {unread.count():,} unread)")
+    print("=" * 60)
+    for label, explain, run in access_paths:
+        plan = explain()
+        used = [name for name in INDEX_NAMES if name in plan]
+        status = '✅' if used else '❌'
+        print(f"\n{status} {label}: {time_query(run):.2f} ms median, index: {', '.join(used) or 'none'}")
+        print('   ' + plan.replace('\n', '\n   '))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help='notifications to seed')
+    parser.add_argument('--users', type=int, default=2000, help='recipients to spread them over')
+    parser.add_argument('--unread', type=float, default=0.1, help='share of notifications left unread')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        print(f"🌱 Seeding {args.rows:,} notifications for {args.users:,} users")
+        user_ids = seed(args.rows, args.users, args.unread)
+        report(user_ids[len(user_ids) // 2])
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Benchmark: bulk patient import throughput
+Ethiopian Hospital ERP System
+
+Writes a CSV of synthetic patients (100,000 rows by default, one in fifty
+of them invalid) and imports it with ``manage.py import_patients``. The
+import reports its throughput in rows per second.
+
+Runs against a throw-away test database, never the configured one:
+
+    python benchmark_patient_import.py [--rows 100000] [--chunk-size 5000]
+"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hospital_erp.settings')
+django.setup()
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from patients.importer import IMPORT_FIELDS
+from patients.models import Patient
+
+FIRST_NAMES = ['Abebe', 'Almaz', 'Tigist', 'Dawit', 'Hana', 'Yonas', 'Meron', 'Kebede', 'Selam', 'Bereket']
+LAST_NAMES = ['Tesfaye', 'Girma', 'Alemu', 'Bekele', 'Haile', 'Mekonnen', 'Wolde', 'Tadesse', 'Gebre', 'Assefa']
+
+
+def write_csv(path, rows):
+    rng = random.Random(42)
+    with open(path, 'w', newline='', encoding='utf-8') as stream:
+        writer = csv.DictWriter(stream, fieldnames=IMPORT_FIELDS)
+        writer.writeheader()
+        for index in range(rows):
+            writer.writerow({
+                'first_name': rng.choice(FIRST_NAMES), 'last_name': rng.choice(LAST_NAMES),
+                'date_of_birth': f'{1950 + index % 60}-{1 + index % 12:02d}-{1 + index % 28:02d}',
+                'gender': 'MF'[index % 2], 'kebele': '01', 'woreda': 'Bole',
+                # Every 50th row has a malformed phone number and is rejected
+                'phone': '12345' if index % 50 == 0 else f'+2519{rng.randrange(10 ** 8):08d}',
+                'emergency_contact_name': 'Contact', 'emergency_contact_phone': '+251911223344',
+                'emergency_contact_relationship': 'Sibling',
+            })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000, help='rows in the generated file')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='patients inserted per batch')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, 'patients.csv')
+        print(f"📝 Writing {args.rows:,} rows to {path}")
+        write_csv(path, args.rows)
+
+        print(f"\n📊 import_patients on {connection.vendor}")
+        print("=" * 60)
+        started = time.perf_counter()
+        call_command('import_patients', path, chunk_size=args.chunk_size)
+        elapsed = time.perf_counter() - started
+        created = Patient.objects.count()
+        print(f"{created:,} patients in {elapsed:.2f}s = {created / elapsed:,.0f} rows/s")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Benchmark: patient typeahead latency
+Ethiopian Hospital ERP System
+
+Seeds a patient table (one million rows by default) and times
+PatientSearch.search() for the kind of partial names, phone numbers and
+patient IDs typed at reception. With the trigram index (pg_trgm on
+PostgreSQL, FTS5 on SQLite) the median should stay well under 20 ms.
+The plan of each query is checked for the index before timing it.
+
+Runs against a throw-away test database, never the configured one:
+
+    python benchmark_patient_search.py [--rows 1000000] [--repeat 20]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hospital_erp.settings')
+django.setup()
+
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from patients.models import Patient
+from patients.search import PatientSearch
+
+SEED_BATCH = 10000
+FIRST_NAMES = ['Abebe', 'Almaz', 'Tigist', 'Dawit', 'Hana', 'Yonas', 'Meron', 'Kebede', 'Selam', 'Bereket',
+               'Mulu', 'Eyerusalem', 'Tewodros', 'Rahel', 'Getachew', 'Lidya', 'Haile', 'Saron', 'Fikru', 'Ruth']
+LAST_NAMES = ['Tesfaye', 'Girma', 'Alemu', 'Bekele', 'Haile', 'Mekonnen', 'Wolde', 'Tadesse', 'Gebre', 'Assefa',
+              'Negash', 'Desta', 'Ayele', 'Kassa', 'Mengistu', 'Tekle', 'Abera', 'Demissie', 'Lemma', 'Yilma']
+# What a plan answered from an index (trigram or patient_id) contains
+INDEX_MARKERS = {'postgresql': 'Index Scan', 'sqlite': 'INDEX'}
+QUERIES = ['abe', 'tesfa', 'almaz gir', '0912', '091234', 'PAT2025000', 'PAT20250004321', 'meko', 'ru yil', 'zzzq']
+
+
+def seed(rows):
+    rng = random.Random(42)
+    created = 0
+    while created < rows:
+        batch = []
+        for index in range(created, min(created + SEED_BATCH, rows)):
+            batch.append(Patient(
+                patient_id=f'PAT2025{index:07d}',
+                first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                date_of_birth=date(1950 + index % 60, 1 + index % 12, 1 + index % 28), gender='MF'[index % 2],
+                kebele='01', woreda='Bole', phone=f'09{rng.randrange(10 ** 8):08d}',
+                emergency_contact_name='Contact', emergency_contact_phone='0911223344',
+                emergency_contact_relationship='Sibling',
+            ))
+        Patient.objects.bulk_create(batch)
+        created += len(batch)
+        print(f"\r  seeded {created:,}/{rows:,} patients", end='', flush=True)
+    print()
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def run(repeat):
+    search = PatientSearch()
+    print(f"\n📊 PatientSearch.search() on {connection.vendor} ({search.backend} backend)")
+    print("=" * 60)
+    print(f"{'query':>16} {'median ms':>10} {'p95 ms':>10} {'results':>8} {'index':>6}")
+    marker = INDEX_MARKERS.get(connection.vendor)
+    for query in QUERIES:
+        plan = search.explain(query)
+        uses_index = 'yes' if marker and marker in plan else 'NO'
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            results = search.search(query, limit=10)
+            timings.append((time.perf_counter() - started) * 1000)
+        p95 = sorted(timings)[max(0, int(len(timings) * 0.95) - 1)]
+        print(f"{query:>16} {statistics.median(timings):>10.2f} {p95:>10.2f} {len(results):>8} {uses_index:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help='patients to seed')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per query')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        print(f"🌱 Seeding {args.rows:,} patients")
+        seed(args.rows)
+        run(args.repeat)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Invoice, InvoiceItem
+from .models import Invoice, InvoiceItem, RevenueFact
 
 class InvoiceItemInline(admin.TabularInline):
     """Inline admin for invoice items"""
@@ -51,3 +51,14 @@ class InvoiceItemAdmin(admin.ModelAdmin):
     list_filter = ('item_type', 'created_at')
     search_fields = ('invoice__invoice_number', 'description')
     readonly_fields = ('total_price',)
+
+
+@admin.register(RevenueFact)
+class RevenueFactAdmin(admin.ModelAdmin):
+    """Revenue fact admin interface (maintained from invoices, read-only)"""
+
+    list_display = ('invoice', 'date', 'doctor', 'appointment_type', 'payment_method', 'revenue')
+    list_filter = ('payment_method', 'appointment_type')
+    date_hierarchy = 'date'
+    list_select_related = ('invoice', 'doctor__user')
+    readonly_fields = ('invoice', 'date', 'doctor', 'appointment_type', 'payment_method', 'revenue')
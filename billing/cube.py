@@ -0,0 +1,147 @@
+"""
+Revenue cube: paid revenue sliced by day, doctor, appointment type and
+payment method in any combination.
+
+Every paid invoice has one ``RevenueFact`` row carrying those dimensions
+(the doctor is the invoice's own, else its appointment's; the appointment
+type is empty for invoices without one). Facts are written as invoices
+are saved and paid, as their items change the totals, and as appointments
+change doctor or type, so a slice is one GROUP BY over a narrow, date
+indexed table::
+
+    revenue_slice(start, end, by=('doctor', 'payment_method'), payment_method='cash')
+
+``manage.py rebuild_revenue_facts`` rebuilds the table from the invoices.
+
+Facts are written after the invoice or appointment change has committed,
+so the generic post_save cache invalidation runs too early for widgets
+read from them; every function here that writes facts drops those
+widgets again afterwards.
+"""
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import Invoice, RevenueFact
+
+# Slice dimensions and the fact columns (or expressions) they group by
+DIMENSIONS = {
+    'day': 'date',
+    'month': TruncMonth('date'),
+    'doctor': 'doctor_id',
+    'appointment_type': 'appointment_type',
+    'payment_method': 'payment_method',
+}
+# Dimensions a slice can be filtered on
+FILTERS = ('doctor', 'appointment_type', 'payment_method')
+REBUILD_CHUNK_SIZE = 2000
+
+
+def fact_for(invoice):
+    """The unsaved RevenueFact of a paid ``invoice``"""
+    doctor_id, appointment_type = invoice.doctor_id, ''
+    if invoice.appointment_id:
+        from appointments.models import Appointment
+
+        appointment = Appointment.objects.filter(pk=invoice.appointment_id).values_list(
+            'doctor_id', 'appointment_type'
+        ).first()
+        if appointment:
+            doctor_id = doctor_id or appointment[0]
+            appointment_type = appointment[1]
+    return RevenueFact(
+        invoice_id=invoice.pk, date=invoice.issue_date, doctor_id=doctor_id,
+        appointment_type=appointment_type, payment_method=invoice.payment_method,
+        revenue=invoice.total_amount,
+    )
+
+
+def invalidate_fact_widgets():
+    """Drop the dashboard widgets read from the facts; call after writing them"""
+    from patients.cache import invalidate_for_model
+
+    # The fact widgets are registered under the invoices the facts mirror
+    invalidate_for_model('billing.Invoice')
+
+
+def save_facts(facts):
+    RevenueFact.objects.bulk_create(
+        facts, update_conflicts=True, unique_fields=['invoice'],
+        update_fields=['date', 'doctor', 'appointment_type', 'payment_method', 'revenue'],
+    )
+
+
+def sync_invoice(invoice):
+    """Write or remove the fact of ``invoice`` according to its status"""
+    if invoice.status == 'paid':
+        save_facts([fact_for(invoice)])
+    else:
+        RevenueFact.objects.filter(invoice_id=invoice.pk).delete()
+    invalidate_fact_widgets()
+
+
+def sync_appointment(appointment):
+    """Re-derive the doctor and type of the facts of ``appointment``'s invoices"""
+    facts = RevenueFact.objects.filter(invoice__appointment=appointment)
+    facts.filter(invoice__doctor__isnull=True).update(doctor=appointment.doctor_id)
+    facts.update(appointment_type=appointment.appointment_type)
+    invalidate_fact_widgets()
+
+
+def rebuild_facts(chunk_size=REBUILD_CHUNK_SIZE):
+    """Replace every fact with one computed from the paid invoices; returns the count"""
+    from django.db import transaction
+
+    invoices = Invoice.objects.filter(status='paid').values_list(
+        'pk', 'issue_date', 'doctor_id', 'appointment__doctor_id', 'appointment__appointment_type',
+        'payment_method', 'total_amount',
+    ).order_by('pk')
+    count = 0
+    with transaction.atomic():
+        RevenueFact.objects.all().delete()
+        batch = []
+        for pk, day, doctor_id, appointment_doctor_id, appointment_type, method, total in invoices.iterator(chunk_size):
+            batch.append(RevenueFact(
+                invoice_id=pk, date=day, doctor_id=doctor_id or appointment_doctor_id,
+                appointment_type=appointment_type or '', payment_method=method, revenue=total,
+            ))
+            if len(batch) >= chunk_size:
+                RevenueFact.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        RevenueFact.objects.bulk_create(batch)
+        count += len(batch)
+        invalidate_fact_widgets()
+    return count
+
+
+def revenue_slice(start=None, end=None, by=(), **filters):
+    """
+    Paid invoices and revenue grouped by the ``by`` dimensions (see
+    DIMENSIONS), from ``start`` to ``end`` inclusive, optionally filtered
+    on ``doctor``, ``appointment_type`` or ``payment_method``. Rows are
+    dicts keyed by dimension name plus ``invoices`` and ``revenue``,
+    largest revenue first.
+    """
+    unknown = [name for name in by if name not in DIMENSIONS]
+    unknown += [name for name in filters if name not in FILTERS]
+    if unknown:
+        raise ValueError(f"Unknown revenue dimension(s): {', '.join(unknown)}")
+
+    facts = RevenueFact.objects.all()
+    if start is not None:
+        facts = facts.filter(date__gte=start)
+    if end is not None:
+        facts = facts.filter(date__lte=end)
+    for name, value in filters.items():
+        facts = facts.filter(**{DIMENSIONS[name]: value})
+
+    if not by:
+        return [facts.aggregate(invoices=Count('invoice'), revenue=Sum('revenue'))]
+    groups = {name: DIMENSIONS[name] for name in by}
+    expressions = {name: column for name, column in groups.items() if not isinstance(column, str)}
+    columns = [column for column in groups.values() if isinstance(column, str)]
+    rows = facts.values(*columns, **expressions).annotate(
+        invoices=Count('invoice'), revenue=Sum('revenue'),
+    ).order_by('-revenue')
+    renames = {column: name for name, column in groups.items() if isinstance(column, str)}
+    return [{renames.get(key, key): value for key, value in row.items()} for row in rows]
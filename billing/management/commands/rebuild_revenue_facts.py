@@ -0,0 +1,17 @@
+"""
+Management command that rebuilds the revenue cube from the paid invoices
+"""
+from django.core.management.base import BaseCommand
+
+from billing.cube import REBUILD_CHUNK_SIZE, rebuild_facts
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the revenue facts (one per paid invoice) used by revenue slices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=REBUILD_CHUNK_SIZE, help='Invoices inserted per batch')
+
+    def handle(self, *args, **options):
+        count = rebuild_facts(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} revenue facts'))
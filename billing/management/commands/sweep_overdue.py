@@ -0,0 +1,35 @@
+"""
+Management command that marks unpaid invoices past their due date as overdue.
+
+Run it from cron, or as the ``overdue`` process of the procfile with
+``--every`` so it repeats until stopped.
+"""
+from django.core.management.base import BaseCommand
+
+from billing.overdue import overdue_candidates, sweep_overdue
+from core.periodic import check_every, run_every
+
+
+class Command(BaseCommand):
+    help = 'Flip unpaid invoices past their due date to overdue with one UPDATE (safe to run every few minutes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only count the invoices that would be flipped')
+        parser.add_argument(
+            '--every', type=float,
+            help='Keep running, sweeping every this many seconds'
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(f'{overdue_candidates().count()} invoices would be marked overdue')
+            return
+        check_every(options['every'])
+
+        self.sweep()
+        if options['every'] is not None:
+            run_every(options['every'], self.sweep)
+
+    def sweep(self):
+        invoice_ids = sweep_overdue()
+        self.stdout.write(self.style.SUCCESS(f'Marked {len(invoice_ids)} invoices overdue'))
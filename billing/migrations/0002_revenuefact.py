@@ -0,0 +1,52 @@
+# Generated by Django 5.2.5 on 2026-10-17 08:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_revenue_facts(apps, schema_editor):
+    Invoice = apps.get_model('billing', 'Invoice')
+    RevenueFact = apps.get_model('billing', 'RevenueFact')
+    invoices = Invoice.objects.filter(status='paid').values_list(
+        'pk', 'issue_date', 'doctor_id', 'appointment__doctor_id', 'appointment__appointment_type',
+        'payment_method', 'total_amount',
+    )
+    RevenueFact.objects.bulk_create(
+        (
+            RevenueFact(
+                invoice_id=pk, date=day, doctor_id=doctor_id or appointment_doctor_id,
+                appointment_type=appointment_type or '', payment_method=method, revenue=total,
+            )
+            for pk, day, doctor_id, appointment_doctor_id, appointment_type, method, total in invoices.iterator()
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0001_initial'),
+        ('doctors', '0001_initial'),
+        ('appointments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueFact',
+            fields=[
+                ('invoice', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='revenue_fact', serialize=False, to='billing.invoice')),
+                ('date', models.DateField(help_text='Issue date of the invoice')),
+                ('appointment_type', models.CharField(blank=True, max_length=20)),
+                ('payment_method', models.CharField(blank=True, max_length=20)),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='doctors.doctor')),
+            ],
+            options={
+                'verbose_name': 'Revenue Fact',
+                'verbose_name_plural': 'Revenue Facts',
+                'indexes': [models.Index(fields=['date', 'doctor'], name='revenue_fact_date_doctor'), models.Index(fields=['date', 'payment_method'], name='revenue_fact_date_method'), models.Index(fields=['date', 'appointment_type'], name='revenue_fact_date_type')],
+            },
+        ),
+        migrations.RunPython(backfill_revenue_facts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-17 14:05
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_updated_at(apps, schema_editor):
+    """Existing items were last changed no earlier than they were created"""
+    InvoiceItem = apps.get_model('billing', 'InvoiceItem')
+    InvoiceItem.objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0003_invoice_sweep_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='invoiceitem',
+            index=models.Index(fields=['updated_at', 'id'], name='invoice_item_updated_at'),
+        ),
+    ]
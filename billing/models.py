@@ -1,11 +1,14 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Sum
 from django.utils import timezone
 from decimal import Decimal
 from patients.models import Patient
 from doctors.models import Doctor
 from appointments.models import Appointment
+from core.sequences import next_identifier
+from core.tracking import ChangeTrackingMixin
 
-class Invoice(models.Model):
+class Invoice(ChangeTrackingMixin, models.Model):
     """Invoice model for billing patients"""
 
     STATUS_CHOICES = [
@@ -25,6 +28,11 @@ class Invoice(models.Model):
         ('credit', 'Credit'),
     ]
 
+    # Status transitions trigger notifications (see notifications.signals);
+    # moving an invoice to another issue date refreshes that day's rollups
+    # (see analytics.signals)
+    tracked_fields = ('status', 'issue_date')
+
     # Core Fields
     invoice_number = models.CharField(max_length=20, unique=True, editable=False)
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='invoices')
@@ -59,19 +67,8 @@ class Invoice(models.Model):
     def save(self, *args, **kwargs):
         if not self.invoice_number:
             # Generate invoice number: INV + year + month + sequential number
-            now = timezone.now()
-            year_month = now.strftime('%Y%m')
-            last_invoice = Invoice.objects.filter(
-                invoice_number__startswith=f'INV{year_month}'
-            ).order_by('invoice_number').last()
-
-            if last_invoice:
-                last_number = int(last_invoice.invoice_number[-4:])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-
-            self.invoice_number = f'INV{year_month}{new_number:04d}'
+            year_month = timezone.now().strftime('%Y%m')
+            self.invoice_number = next_identifier(f'INV{year_month}', Invoice, 'invoice_number')
 
         # Calculate total amount
         self.total_amount = self.subtotal + self.tax_amount - self.discount_amount
@@ -81,6 +78,49 @@ class Invoice(models.Model):
     def __str__(self):
         return f"{self.invoice_number} - {self.patient.get_full_name()} - {self.total_amount} ETB"
 
+    def add_items(self, items):
+        """
+        Add line items with one INSERT and recompute the totals once.
+
+        ``items`` are unsaved InvoiceItem instances or dicts of their fields.
+        """
+        items = [item if isinstance(item, InvoiceItem) else InvoiceItem(**item) for item in items]
+        for item in items:
+            item.invoice = self
+            item.total_price = item.quantity * item.unit_price
+        with transaction.atomic():
+            InvoiceItem.objects.bulk_create(items)
+            self.recalculate_totals()
+        return items
+
+    def recalculate_totals(self):
+        """Set subtotal and total from a SQL SUM over the items"""
+        subtotal = self.items.aggregate(total=Sum('total_price'))['total'] or Decimal('0.00')
+        self._update_totals(subtotal=subtotal, total_amount=subtotal + F('tax_amount') - F('discount_amount'))
+        self.subtotal = subtotal
+        self.total_amount = subtotal + self.tax_amount - self.discount_amount
+
+    def adjust_subtotal(self, delta):
+        """Shift subtotal and total by ``delta`` in SQL, without reading the items"""
+        if delta:
+            self._update_totals(subtotal=F('subtotal') + delta, total_amount=F('total_amount') + delta)
+            self.subtotal += delta
+            self.total_amount += delta
+
+    def _update_totals(self, **values):
+        # update() skips the invoice save signals, so refresh the revenue fact
+        # of a paid invoice and drop the dashboard widgets here
+        from patients.cache import invalidate_for_model
+        from .cube import sync_invoice
+
+        Invoice.objects.filter(pk=self.pk).update(updated_at=timezone.now(), **values)
+        if self.status == 'paid':
+            # Runs after the caller has applied the new totals to self, and
+            # drops the widgets once the fact is written
+            transaction.on_commit(lambda: sync_invoice(self))
+        else:
+            invalidate_for_model('billing.Invoice')
+
     def get_balance(self):
         """Get remaining balance"""
         return self.total_amount - self.paid_amount
@@ -95,16 +135,28 @@ class Invoice(models.Model):
         return self.paid_amount >= self.total_amount
 
     def is_overdue(self):
-        """Check if invoice is overdue"""
-        return timezone.now().date() > self.due_date and not self.is_fully_paid()
+        """Check if invoice is overdue (the rule of the overdue sweep, see billing.overdue)"""
+        from .overdue import OVERDUE_ELIGIBLE_STATUSES
+
+        return (
+            self.status in OVERDUE_ELIGIBLE_STATUSES + ('overdue',)
+            and timezone.localdate() > self.due_date
+            and not self.is_fully_paid()
+        )
 
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Invoice'
         verbose_name_plural = 'Invoices'
+        indexes = [
+            # The overdue sweep's WHERE clause (see billing.overdue) and the
+            # watermark order of manage.py extract
+            models.Index(fields=['status', 'due_date'], name='invoice_status_due'),
+            models.Index(fields=['updated_at'], name='invoice_updated_at'),
+        ]
 
 
-class InvoiceItem(models.Model):
+class InvoiceItem(ChangeTrackingMixin, models.Model):
     """Individual items in an invoice"""
 
     ITEM_TYPE_CHOICES = [
@@ -126,14 +178,24 @@ class InvoiceItem(models.Model):
 
     # System Fields
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # The stored total, so a save can apply the difference to the invoice
+    tracked_fields = ('total_price',)
 
     def save(self, *args, **kwargs):
         self.total_price = self.quantity * self.unit_price
-        super().save(*args, **kwargs)
-
-        # Update invoice subtotal
-        self.invoice.subtotal = sum(item.total_price for item in self.invoice.items.all())
-        self.invoice.save()
+        previous_total = self.previous('total_price') if self.pk else None
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Incremental update of the invoice subtotal instead of summing every item
+            self.invoice.adjust_subtotal(self.total_price - (previous_total or Decimal('0.00')))
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            self.invoice.adjust_subtotal(-self.total_price)
+        return result
 
     def __str__(self):
         return f"{self.description} - {self.quantity} x {self.unit_price} ETB"
@@ -141,3 +203,35 @@ class InvoiceItem(models.Model):
     class Meta:
         verbose_name = 'Invoice Item'
         verbose_name_plural = 'Invoice Items'
+        indexes = [
+            # The watermark order of manage.py extract (see core.extract)
+            models.Index(fields=['updated_at', 'id'], name='invoice_item_updated_at'),
+        ]
+
+
+class RevenueFact(models.Model):
+    """
+    Revenue of one paid invoice with its dimensions denormalized, so
+    revenue slices never join invoices, appointments and doctors (see
+    billing.cube). Kept in sync by billing.signals.
+    """
+
+    invoice = models.OneToOneField(Invoice, on_delete=models.CASCADE, primary_key=True, related_name='revenue_fact')
+    date = models.DateField(help_text="Issue date of the invoice")
+    doctor = models.ForeignKey(Doctor, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # Empty for invoices without an appointment (pharmacy and walk-in sales)
+    appointment_type = models.CharField(max_length=20, blank=True)
+    payment_method = models.CharField(max_length=20, blank=True)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.date} {self.invoice_id}: {self.revenue}"
+
+    class Meta:
+        verbose_name = 'Revenue Fact'
+        verbose_name_plural = 'Revenue Facts'
+        indexes = [
+            models.Index(fields=['date', 'doctor'], name='revenue_fact_date_doctor'),
+            models.Index(fields=['date', 'payment_method'], name='revenue_fact_date_method'),
+            models.Index(fields=['date', 'appointment_type'], name='revenue_fact_date_type'),
+        ]
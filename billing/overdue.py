@@ -0,0 +1,75 @@
+"""
+Set-based overdue sweep.
+
+``manage.py sweep_overdue`` flips every unpaid invoice past its due date
+to 'overdue' with one conditional UPDATE instead of loading and saving
+invoices one by one. The WHERE clause is the eligibility rule itself, so
+a run with nothing to do touches no rows, invoices already overdue,
+paid or cancelled are never rewritten and concurrent runs cannot flip
+the same invoice twice: the job is safe to schedule every few minutes.
+
+Invoices are issued as drafts (nothing moves them to 'sent'), so drafts
+are swept too; ``Invoice.is_overdue()`` applies the same rule.
+
+The UPDATE returns the ids it flipped (``UPDATE ... RETURNING id`` on
+PostgreSQL and SQLite), so the ids announced are exactly the rows this
+run changed, without selecting or locking them first. ``update()``
+skips the invoice save signals, so the sweep does their work in bulk:
+it stamps ``updated_at`` (which lets the rollups and extracts pick up
+the change) and queues a single ``invoices_overdue`` notification job
+per ``SWEEP_NOTIFY_CHUNK_SIZE`` invoices (see notifications.jobs).
+
+The procfile runs it every few minutes as the ``overdue`` process.
+"""
+from django.db import connections, transaction
+from django.db.models import F, sql
+from django.utils import timezone
+
+from .models import Invoice
+
+# Statuses an unpaid invoice past its due date is moved out of
+OVERDUE_ELIGIBLE_STATUSES = ('draft', 'sent', 'partially_paid')
+# Invoice ids per queued notification job
+SWEEP_NOTIFY_CHUNK_SIZE = 500
+
+
+def overdue_candidates(today=None):
+    """Invoices the next sweep would flip to 'overdue'"""
+    today = today or timezone.localdate()
+    return Invoice.objects.filter(
+        status__in=OVERDUE_ELIGIBLE_STATUSES, due_date__lt=today, paid_amount__lt=F('total_amount'),
+    )
+
+
+def update_returning_ids(queryset, **values):
+    """``queryset.update(**values)`` as one statement; returns the primary keys of the updated rows"""
+    connection = connections[queryset.db]
+    if not connection.features.can_return_columns_from_insert:
+        # No UPDATE ... RETURNING: lock the rows, then update them under the same guard
+        pks = list(queryset.select_for_update().values_list('pk', flat=True))
+        queryset.filter(pk__in=pks).update(**values)
+        return pks
+
+    query = queryset.query.chain(sql.UpdateQuery)
+    query.add_update_values(values)
+    update_sql, params = query.get_compiler(queryset.db).as_sql()
+    pk_column = connection.ops.quote_name(queryset.model._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(f'{update_sql} RETURNING {pk_column}', params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def sweep_overdue(today=None, now=None):
+    """Mark eligible invoices overdue with one UPDATE and queue their notifications; returns their ids"""
+    from notifications.jobs import enqueue
+    from patients.cache import invalidate_for_model
+
+    now = now or timezone.now()
+    with transaction.atomic():
+        invoice_ids = sorted(update_returning_ids(overdue_candidates(today), status='overdue', updated_at=now))
+        if not invoice_ids:
+            return []
+        for index in range(0, len(invoice_ids), SWEEP_NOTIFY_CHUNK_SIZE):
+            enqueue('invoices_overdue', invoice_ids=invoice_ids[index:index + SWEEP_NOTIFY_CHUNK_SIZE])
+        invalidate_for_model('billing.Invoice')
+    return invoice_ids
@@ -0,0 +1,30 @@
+"""
+Keep the revenue facts (see billing.cube) in step with invoices and appointments.
+
+Facts are written once the saving transaction commits, off the save path
+itself, and the dashboard widgets read from them are dropped right after
+(see billing.cube); a fact lost to a crash in between is restored by
+``manage.py rebuild_revenue_facts``.
+"""
+from django.db import transaction
+from django.db.models.signals import post_save
+
+
+def invoice_saved(sender, instance, created, **kwargs):
+    from .cube import sync_invoice
+
+    # Unpaid invoices that were not paid before have no fact to touch
+    if instance.status == 'paid' or (not created and instance.previous('status') == 'paid'):
+        transaction.on_commit(lambda: sync_invoice(instance))
+
+
+def appointment_saved(sender, instance, created, **kwargs):
+    from .cube import sync_appointment
+
+    if not created and (instance.has_changed('doctor') or instance.has_changed('appointment_type')):
+        transaction.on_commit(lambda: sync_appointment(instance))
+
+
+def connect_revenue_signals():
+    post_save.connect(invoice_saved, sender='billing.Invoice', dispatch_uid='revenue_fact_invoice_saved')
+    post_save.connect(appointment_saved, sender='appointments.Appointment', dispatch_uid='revenue_fact_appointment_saved')
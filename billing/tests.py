@@ -1,3 +1,249 @@
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from patients.tests import create_patient
+from .models import Invoice, InvoiceItem, RevenueFact
+
+
+class InvoiceItemTotalsTests(TestCase):
+    """Test cases for invoice line items and subtotal bookkeeping"""
+
+    def setUp(self):
+        self.patient = create_patient()
+        self.invoice = Invoice.objects.create(
+            patient=self.patient, issue_date=date(2025, 3, 1), due_date=date(2025, 3, 31),
+            tax_amount=Decimal('15.00'), discount_amount=Decimal('5.00'),
+        )
+
+    def assertStoredTotals(self, subtotal, total):
+        self.invoice.refresh_from_db()
+        self.assertEqual((self.invoice.subtotal, self.invoice.total_amount), (Decimal(subtotal), Decimal(total)))
+
+    def test_add_items_uses_constant_queries(self):
+        """Adding many items costs the same few queries as adding one"""
+        items = [
+            {'item_type': 'lab_test', 'description': f'Test {index}', 'quantity': 2, 'unit_price': Decimal('10.00')}
+            for index in range(50)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            self.invoice.add_items(items)
+        self.assertLessEqual(len(queries), 5)
+        self.assertEqual(self.invoice.items.count(), 50)
+        self.assertEqual(self.invoice.subtotal, Decimal('1000.00'))
+        self.assertStoredTotals('1000.00', '1010.00')
+
+    def test_single_item_save_applies_delta(self):
+        """Saving one item does not read the other items"""
+        self.invoice.add_items([InvoiceItem(item_type='consultation', description='Consultation',
+                                            unit_price=Decimal('300.00'))])
+        item = InvoiceItem(invoice=self.invoice, item_type='medication', description='Amoxicillin',
+                           quantity=3, unit_price=Decimal('20.00'))
+        with CaptureQueriesContext(connection) as queries:
+            item.save()
+        self.assertFalse(any('SUM' in query['sql'].upper() for query in queries))
+        self.assertStoredTotals('360.00', '370.00')
+
+        item = InvoiceItem.objects.get(pk=item.pk)
+        item.quantity = 1
+        item.save()
+        self.assertStoredTotals('320.00', '330.00')
+
+        item.delete()
+        self.assertStoredTotals('300.00', '310.00')
+
+    def test_invoice_add_view(self):
+        get_user_model().objects.create_user(username='cashier', password='testpass123', role='admin')
+        self.client.login(username='cashier', password='testpass123')
+
+        def post(count):
+            return self.client.post(reverse('billing:invoice_add'), {
+                'patient': self.patient.pk, 'issue_date': '2025-03-01', 'due_date': '2025-03-31',
+                'payment_method': 'cash', 'tax_rate': '15', 'discount_amount': '0',
+                'item_description[]': [f'Item {index}' for index in range(count)],
+                'item_quantity[]': ['1'] * count,
+                'item_price[]': ['100.00'] * count,
+            })
+
+        with CaptureQueriesContext(connection) as few:
+            post(2)
+        with CaptureQueriesContext(connection) as many:
+            post(20)
+        self.assertEqual(len(few), len(many))
+
+        invoice = Invoice.objects.order_by('-pk').first()
+        self.assertEqual(invoice.items.count(), 20)
+        self.assertEqual(invoice.subtotal, Decimal('2000.00'))
+        self.assertEqual(invoice.total_amount, Decimal('2300.00'))
+
+
+class RevenueCubeTests(TestCase):
+    """Test cases for the revenue facts and slices"""
+
+    def setUp(self):
+        from appointments.models import Appointment
+        from patients.tests import create_doctor
+
+        self.patient = create_patient()
+        self.doctor = create_doctor()
+        self.appointment = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_date=date(2025, 3, 1),
+            appointment_time='09:00', appointment_type='surgery', chief_complaint='Hernia',
+        )
+
+    def invoice(self, amount, day=date(2025, 3, 1), **kwargs):
+        return Invoice.objects.create(
+            patient=self.patient, issue_date=day, due_date=day, subtotal=Decimal(amount), **kwargs
+        )
+
+    def test_facts_follow_invoices(self):
+        invoice = self.invoice('500.00', appointment=self.appointment)
+        self.assertFalse(RevenueFact.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice.status, invoice.payment_method = 'paid', 'cash'
+            invoice.save()
+        fact = RevenueFact.objects.get()
+        self.assertEqual(
+            (fact.doctor_id, fact.appointment_type, fact.payment_method, fact.revenue),
+            (self.doctor.pk, 'surgery', 'cash', Decimal('500.00')),
+        )
+
+        # Item changes bypass Invoice.save but still reach the fact
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice.add_items([{'item_type': 'procedure', 'description': 'Suture', 'unit_price': Decimal('120.00')}])
+        self.assertEqual(RevenueFact.objects.get().revenue, Decimal('120.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.appointment.appointment_type = 'emergency'
+            self.appointment.save()
+        self.assertEqual(RevenueFact.objects.get().appointment_type, 'emergency')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice.status = 'cancelled'
+            invoice.save()
+        self.assertFalse(RevenueFact.objects.exists())
+
+    def test_widgets_are_dropped_after_the_fact_is_written(self):
+        """A widget read between the invoice commit and the fact write is not left cached"""
+        from unittest import mock
+
+        invoice = self.invoice('500.00', appointment=self.appointment)
+        revenue_at_invalidation = []
+
+        def record(names):
+            if 'revenue_breakdown' in names:
+                fact = RevenueFact.objects.filter(invoice=invoice).first()
+                revenue_at_invalidation.append(fact and fact.revenue)
+
+        with mock.patch('patients.cache.invalidate_widgets', side_effect=record):
+            with self.captureOnCommitCallbacks(execute=True):
+                invoice.status, invoice.payment_method = 'paid', 'cash'
+                invoice.save()
+            self.assertEqual(revenue_at_invalidation[-1], Decimal('500.00'))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                invoice.add_items([{'item_type': 'procedure', 'description': 'Suture', 'unit_price': Decimal('120.00')}])
+            self.assertEqual(revenue_at_invalidation[-1], Decimal('120.00'))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                invoice.status = 'cancelled'
+                invoice.save()
+            self.assertIsNone(revenue_at_invalidation[-1])
+
+    def test_slices(self):
+        from .cube import rebuild_facts, revenue_slice
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.invoice('500.00', appointment=self.appointment, status='paid', payment_method='insurance')
+            self.invoice('80.00', status='paid', payment_method='cash')
+            self.invoice('20.00', day=date(2025, 4, 2), status='paid', payment_method='cash')
+            self.invoice('999.00', payment_method='cash')
+
+        with CaptureQueriesContext(connection) as queries:
+            rows = revenue_slice(date(2025, 3, 1), date(2025, 3, 31), by=('doctor', 'payment_method'))
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            [(row['doctor'], row['payment_method'], row['revenue']) for row in rows],
+            [(self.doctor.pk, 'insurance', Decimal('500.00')), (None, 'cash', Decimal('80.00'))],
+        )
+        self.assertEqual(revenue_slice(payment_method='cash')[0]['revenue'], Decimal('100.00'))
+        months = revenue_slice(by=('month',), appointment_type='')
+        self.assertEqual([row['invoices'] for row in months], [1, 1])
+
+        self.assertEqual(rebuild_facts(), 3)
+        self.assertEqual(revenue_slice()[0]['revenue'], Decimal('600.00'))
+
+        User = get_user_model()
+        User.objects.create_user(username='finance', password='testpass123', role='admin')
+        self.client.login(username='finance', password='testpass123')
+        response = self.client.get(reverse('billing:revenue_cube'), {'by': 'appointment_type'})
+        self.assertEqual(response.json()['rows'][0]['appointment_type_label'], 'Surgery')
+        response = self.client.get(reverse('billing:revenue_cube'), {'by': ['doctor', 'day'], 'format': 'csv'})
+        self.assertContains(response, 'Doctor,Day,Invoices,Revenue')
+        self.assertEqual(self.client.get(reverse('billing:revenue_cube'), {'by': 'nope'}).status_code, 400)
+
+
+class OverdueSweepTests(TestCase):
+    """Test cases for the set-based overdue sweep"""
+
+    def setUp(self):
+        self.patient = create_patient()
+        get_user_model().objects.create_user(username='reception', password='testpass123', role='receptionist')
+
+    def invoice(self, status='sent', due_date=date(2025, 3, 1), paid='0.00'):
+        return Invoice.objects.create(
+            patient=self.patient, issue_date=date(2025, 2, 1), due_date=due_date,
+            subtotal=Decimal('100.00'), paid_amount=Decimal(paid), status=status,
+        )
+
+    def test_sweep_flips_eligible_invoices_once(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from django.test import override_settings
+        from notifications.models import Notification
+        from .overdue import sweep_overdue
+
+        due = [self.invoice(), self.invoice('partially_paid', paid='40.00'), self.invoice('draft')]
+        untouched = [
+            self.invoice(due_date=date(2025, 3, 10)),
+            self.invoice(paid='100.00'),
+            self.invoice('cancelled'),
+        ]
+
+        with override_settings(NOTIFICATION_DISPATCH_MODE='immediate'):
+            with CaptureQueriesContext(connection) as queries:
+                with self.captureOnCommitCallbacks(execute=True):
+                    swept = sweep_overdue(today=date(2025, 3, 5))
+            updates = [query for query in queries if query['sql'].startswith('UPDATE "billing_invoice"')]
+            self.assertEqual(len(updates), 1)
+            self.assertIn('RETURNING', updates[0]['sql'])
+            self.assertEqual(swept, [invoice.pk for invoice in due])
+            self.assertEqual(
+                [Invoice.objects.get(pk=invoice.pk).status for invoice in due + untouched],
+                ['overdue', 'overdue', 'overdue', 'sent', 'sent', 'cancelled'],
+            )
+            notifications = Notification.objects.filter(notification_type='billing', title='Invoice Overdue')
+            self.assertEqual(notifications.count(), 3)
+            self.assertIn('60.00 ETB remaining', notifications.get(action_url=f'/billing/{due[1].pk}/').message)
+
+            # A second run finds nothing left to do
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(sweep_overdue(today=date(2025, 3, 5)), [])
+            self.assertEqual(notifications.count(), 3)
+            self.assertEqual(
+                [invoice.is_overdue() for invoice in Invoice.objects.filter(pk__in=[i.pk for i in due + untouched])
+                 .order_by('pk')],
+                [True, True, True, True, False, False],
+            )
 
-# Create your tests here.
+        call_command('sweep_overdue', stdout=StringIO())
+        self.assertEqual(Invoice.objects.filter(status='overdue').count(), 4)
+        with self.assertRaises(CommandError):
+            call_command('sweep_overdue', every=0, stdout=StringIO())
@@ -6,6 +6,8 @@ app_name = 'billing'
 urlpatterns = [
     path('', views.invoice_list_view, name='invoice_list'),
     path('add/', views.invoice_add_view, name='invoice_add'),
+    path('export/', views.invoice_export_view, name='invoice_export'),
+    path('revenue/', views.revenue_cube_view, name='revenue_cube'),
     path('<int:pk>/', views.invoice_detail_view, name='invoice_detail'),
     path('<int:pk>/edit/', views.invoice_edit_view, name='invoice_edit'),
     path('<int:pk>/pay/', views.invoice_pay_view, name='invoice_pay'),
@@ -1,22 +1,20 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Q, Sum
+from django.db import transaction
+from django.db.models import Q
 from django.http import JsonResponse, HttpResponse
 from django.urls import reverse
 from .models import Invoice, InvoiceItem
 from patients.models import Patient
+from core.pagination import KeysetPaginator
 from datetime import datetime, timedelta
 from decimal import Decimal
 
-@login_required
-def invoice_list_view(request):
-    """Invoice list view with search and filtering"""
-    invoices = Invoice.objects.select_related('patient').all()
-
+def filter_invoices(invoices, params):
+    """Apply the invoice list search and filters in ``params`` (shared with the export)"""
     # Search functionality
-    search_query = request.GET.get('search', '')
+    search_query = params.get('search', '')
     if search_query:
         invoices = invoices.filter(
             Q(invoice_number__icontains=search_query) |
@@ -26,37 +24,37 @@ def invoice_list_view(request):
         )
 
     # Filter by status
-    status_filter = request.GET.get('status', '')
+    status_filter = params.get('status', '')
     if status_filter:
         invoices = invoices.filter(status=status_filter)
 
     # Filter by payment method
-    payment_method_filter = request.GET.get('payment_method', '')
+    payment_method_filter = params.get('payment_method', '')
     if payment_method_filter:
         invoices = invoices.filter(payment_method=payment_method_filter)
 
     # Filter by date range
-    date_from = request.GET.get('date_from', '')
-    date_to = request.GET.get('date_to', '')
+    date_from = params.get('date_from', '')
+    date_to = params.get('date_to', '')
     if date_from:
         invoices = invoices.filter(issue_date__gte=date_from)
     if date_to:
         invoices = invoices.filter(issue_date__lte=date_to)
 
-    # Pagination
-    paginator = Paginator(invoices, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    return invoices
 
-    # Calculate totals
-    total_amount = invoices.aggregate(total=Sum('total_amount'))['total'] or 0
-    paid_amount = invoices.filter(status='paid').aggregate(total=Sum('total_amount'))['total'] or 0
-    pending_amount = invoices.filter(status='pending').aggregate(total=Sum('total_amount'))['total'] or 0
+@login_required
+def invoice_list_view(request):
+    """Invoice list view with search and filtering"""
+    invoices = filter_invoices(Invoice.objects.select_related('patient').all(), request.GET)
+    search_query = request.GET.get('search', '')
+    status_filter = request.GET.get('status', '')
+    payment_method_filter = request.GET.get('payment_method', '')
+    date_from = request.GET.get('date_from', '')
+    date_to = request.GET.get('date_to', '')
 
-    # Calculate new invoices this month for mobile stats
-    from datetime import datetime, timedelta
-    current_month = datetime.now().replace(day=1)
-    new_invoices_count = Invoice.objects.filter(issue_date__gte=current_month).count()
+    # Keyset pagination, newest invoices first
+    page_obj = KeysetPaginator(invoices, 15).get_page(request.GET.get('cursor'))
 
     context = {
         'page_obj': page_obj,
@@ -67,11 +65,6 @@ def invoice_list_view(request):
         'date_to': date_to,
         'statuses': Invoice.STATUS_CHOICES,
         'payment_methods': Invoice.PAYMENT_METHOD_CHOICES,
-        'total_invoices': invoices.count(),
-        'total_amount': total_amount,
-        'paid_amount': paid_amount,
-        'pending_amount': pending_amount,
-        'new_invoices_count': new_invoices_count,
     }
 
     # Check if mobile version is requested
@@ -80,6 +73,25 @@ def invoice_list_view(request):
 
     return render(request, template_name, context)
 
+@login_required
+def invoice_export_view(request):
+    """Stream the (filtered) invoice list as CSV"""
+    from core.export import ExportColumn, choice_label, csv_export_response, date_format, full_name
+
+    columns = [
+        ExportColumn('Invoice Number', 'invoice_number'),
+        ExportColumn('Patient ID', 'patient__patient_id'),
+        ExportColumn('Patient', ('patient__first_name', 'patient__last_name'), full_name),
+        ExportColumn('Issue Date', 'issue_date', date_format()),
+        ExportColumn('Due Date', 'due_date', date_format()),
+        ExportColumn('Status', 'status', choice_label(Invoice.STATUS_CHOICES)),
+        ExportColumn('Total Amount', 'total_amount'),
+        ExportColumn('Paid Amount', 'paid_amount'),
+        ExportColumn('Payment Method', 'payment_method', choice_label(Invoice.PAYMENT_METHOD_CHOICES)),
+    ]
+    invoices = filter_invoices(Invoice.objects.all(), request.GET)
+    return csv_export_response(invoices, columns, 'invoices.csv')
+
 @login_required
 def invoice_add_view(request):
     """Add invoice view with form handling"""
@@ -88,46 +100,39 @@ def invoice_add_view(request):
             # Get patient
             patient = get_object_or_404(Patient, pk=request.POST.get('patient'))
 
-            # Create invoice
-            invoice = Invoice.objects.create(
-                patient=patient,
-                issue_date=request.POST.get('issue_date', datetime.now().date()),
-                due_date=request.POST.get('due_date'),
-                payment_method=request.POST.get('payment_method', 'cash'),
-                notes=request.POST.get('notes', ''),
-                created_by=request.user,
-            )
-
-            # Add invoice items
+            # Collect invoice items
             item_descriptions = request.POST.getlist('item_description[]')
             item_quantities = request.POST.getlist('item_quantity[]')
             item_prices = request.POST.getlist('item_price[]')
 
-            subtotal = Decimal('0')
+            items = []
             for i, description in enumerate(item_descriptions):
                 if description.strip():
-                    quantity = int(item_quantities[i]) if i < len(item_quantities) else 1
-                    price = Decimal(item_prices[i]) if i < len(item_prices) else Decimal('0')
-                    total = quantity * price
-
-                    InvoiceItem.objects.create(
-                        invoice=invoice,
+                    items.append(InvoiceItem(
                         description=description,
-                        quantity=quantity,
-                        unit_price=price,
-                        total_price=total
-                    )
-                    subtotal += total
+                        quantity=int(item_quantities[i]) if i < len(item_quantities) else 1,
+                        unit_price=Decimal(item_prices[i]) if i < len(item_prices) else Decimal('0'),
+                    ))
 
             # Calculate totals
+            subtotal = sum((item.quantity * item.unit_price for item in items), Decimal('0'))
             tax_rate = Decimal(request.POST.get('tax_rate', '15')) / 100  # 15% VAT
             discount_amount = Decimal(request.POST.get('discount_amount', '0'))
 
-            invoice.subtotal = subtotal
-            invoice.tax_amount = subtotal * tax_rate
-            invoice.discount_amount = discount_amount
-            invoice.total_amount = subtotal + invoice.tax_amount - discount_amount
-            invoice.save()
+            with transaction.atomic():
+                # Create invoice, then all of its items with one INSERT
+                invoice = Invoice.objects.create(
+                    patient=patient,
+                    issue_date=request.POST.get('issue_date', datetime.now().date()),
+                    due_date=request.POST.get('due_date'),
+                    payment_method=request.POST.get('payment_method', 'cash'),
+                    notes=request.POST.get('notes', ''),
+                    created_by=request.user,
+                    subtotal=subtotal,
+                    tax_amount=subtotal * tax_rate,
+                    discount_amount=discount_amount,
+                )
+                invoice.add_items(items)
 
             messages.success(request, f'Invoice {invoice.invoice_number} created successfully!')
             # Redirect with mobile parameter if it was a mobile request
@@ -264,3 +269,63 @@ def invoice_pdf_view(request, pk):
         'items': items,
     }
     return render(request, 'billing/pdf.html', context)
+
+@login_required
+def revenue_cube_view(request):
+    """
+    Paid revenue sliced along any of day, month, doctor, appointment_type
+    and payment_method (``?by=doctor&by=payment_method``), for
+    ``start``..``end`` and optional ``doctor``, ``appointment_type`` and
+    ``payment_method`` filters. JSON by default, ``?format=csv`` for a
+    spreadsheet.
+    """
+    import csv
+    from .cube import FILTERS, revenue_slice
+    from appointments.models import Appointment
+    from doctors.models import Doctor
+
+    by = request.GET.getlist('by')
+    try:
+        start = datetime.strptime(request.GET['start'], '%Y-%m-%d').date() if request.GET.get('start') else None
+        end = datetime.strptime(request.GET['end'], '%Y-%m-%d').date() if request.GET.get('end') else None
+        filters = {name: request.GET[name] for name in FILTERS if request.GET.get(name, '') != ''}
+        if 'doctor' in filters:
+            filters['doctor'] = int(filters['doctor'])
+        rows = revenue_slice(start, end, by=by, **filters)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    # Readable labels for the coded dimensions
+    doctor_names = {}
+    if 'doctor' in by:
+        doctor_names = {
+            doctor.pk: doctor.get_full_name()
+            for doctor in Doctor.objects.select_related('user').filter(pk__in=[row['doctor'] for row in rows])
+        }
+    labels = {
+        'doctor': lambda value: doctor_names.get(value, 'Unassigned'),
+        'appointment_type': lambda value: dict(Appointment.APPOINTMENT_TYPE_CHOICES).get(value, 'Pharmacy / Walk-in'),
+        'payment_method': lambda value: dict(Invoice.PAYMENT_METHOD_CHOICES).get(value, 'Unspecified'),
+        'day': lambda value: value.isoformat(),
+        'month': lambda value: value.strftime('%Y-%m'),
+    }
+
+    if request.GET.get('format') == 'csv':
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="revenue.csv"'
+        writer = csv.writer(response)
+        writer.writerow([name.replace('_', ' ').title() for name in by] + ['Invoices', 'Revenue'])
+        for row in rows:
+            writer.writerow([labels[name](row[name]) for name in by] + [row['invoices'], row['revenue'] or 0])
+        return response
+
+    def as_json(row):
+        data = {'invoices': row['invoices'], 'revenue': float(row['revenue'] or 0)}
+        for name in by:
+            if name in FILTERS:
+                data[name], data[f'{name}_label'] = row[name], labels[name](row[name])
+            else:
+                data[name] = labels[name](row[name])
+        return data
+
+    return JsonResponse({'success': True, 'dimensions': by, 'rows': [as_json(row) for row in rows]})
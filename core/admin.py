@@ -0,0 +1,29 @@
+from django.contrib import admin
+from .models import ExtractWatermark, SearchDocument, Sequence
+
+@admin.register(Sequence)
+class SequenceAdmin(admin.ModelAdmin):
+    """Sequence admin interface (read-only counters)"""
+
+    list_display = ('name', 'last_value', 'updated_at')
+    search_fields = ('name',)
+    readonly_fields = ('name', 'last_value', 'updated_at')
+    ordering = ('name',)
+
+
+@admin.register(SearchDocument)
+class SearchDocumentAdmin(admin.ModelAdmin):
+    """Search index admin interface (maintained by signals, read-only)"""
+
+    list_display = ('title', 'doc_type', 'object_id', 'subtitle', 'updated_at')
+    list_filter = ('doc_type',)
+    search_fields = ('title', 'search_text')
+    readonly_fields = ('doc_type', 'object_id', 'title', 'subtitle', 'url', 'search_text', 'updated_at')
+
+
+@admin.register(ExtractWatermark)
+class ExtractWatermarkAdmin(admin.ModelAdmin):
+    """Extract watermark admin interface (delete a row to force a full extract)"""
+
+    list_display = ('table', 'last_value', 'last_pk', 'rows_extracted', 'last_file', 'last_run_at')
+    readonly_fields = ('table', 'last_value', 'last_pk', 'rows_extracted', 'last_file', 'last_run_at')
@@ -0,0 +1,25 @@
+"""
+Management command that backfills the global search index
+"""
+from django.core.management.base import BaseCommand
+
+from core.search import SEARCH_TYPES, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild SearchDocument rows for patients, appointments, doctors and medicines'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type', action='append', dest='types',
+            choices=[search_type.doc_type for search_type in SEARCH_TYPES],
+            help='Only rebuild this document type (repeatable)'
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Objects indexed per transaction')
+
+    def handle(self, *args, **options):
+        doc_types = options['types'] or [search_type.doc_type for search_type in SEARCH_TYPES]
+        for doc_type in doc_types:
+            indexed, removed = rebuild(doc_type, chunk_size=options['chunk_size'])
+            self.stdout.write(f'{doc_type}: indexed {indexed}, removed {removed} stale')
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
@@ -0,0 +1,158 @@
+# Generated by Django 5.2.5 on 2026-10-17 08:03
+
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Frozen copy of what core.search.SEARCH_INDEX installs today; later
+# changes to core.text_index must not change what this migration did.
+FTS = 'core_searchdocument_fts'
+INSERT_NEW = f'INSERT INTO {FTS}(rowid, doc_type, search_text) VALUES (new.id, new.doc_type, new.search_text);'
+DELETE_OLD = (
+    f"INSERT INTO {FTS}({FTS}, rowid, doc_type, search_text) VALUES ('delete', old.id, old.doc_type, old.search_text);"
+)
+
+SQLITE_INSTALL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS} USING fts5("
+    f"doc_type, search_text, content='core_searchdocument', content_rowid='id', tokenize='trigram')",
+    f'CREATE TRIGGER IF NOT EXISTS {FTS}_insert AFTER INSERT ON core_searchdocument BEGIN {INSERT_NEW} END',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS}_delete AFTER DELETE ON core_searchdocument BEGIN {DELETE_OLD} END',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS}_update AFTER UPDATE ON core_searchdocument BEGIN {DELETE_OLD} {INSERT_NEW} END',
+    f"INSERT INTO {FTS}({FTS}) VALUES ('rebuild')",
+]
+SQLITE_UNINSTALL = [f'DROP TRIGGER IF EXISTS {FTS}_{action}' for action in ('insert', 'delete', 'update')] + [
+    f'DROP TABLE IF EXISTS {FTS}',
+]
+POSTGRES_INSTALL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS search_document_search_text_trgm_idx '
+    'ON core_searchdocument USING gin (search_text gin_trgm_ops)',
+]
+POSTGRES_UNINSTALL = ['DROP INDEX IF EXISTS search_document_search_text_trgm_idx']
+
+BACKFILL_CHUNK_SIZE = 1000
+
+
+def run(statements_by_vendor):
+    def operation(apps, schema_editor):
+        statements = statements_by_vendor.get(schema_editor.connection.vendor, [])
+        with schema_editor.connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    return operation
+
+
+def normalize(*parts):
+    text = ' '.join(str(part) for part in parts if part)
+    return ' '.join(unicodedata.normalize('NFKC', text).casefold().split())
+
+
+def user_name(first_name, last_name):
+    return f'{first_name} {last_name}'.strip()
+
+
+def patient_documents(apps):
+    rows = apps.get_model('patients', 'Patient').objects.values_list(
+        'pk', 'first_name', 'last_name', 'patient_id', 'phone', 'email'
+    )
+    for pk, first_name, last_name, patient_id, phone, email in rows.order_by('pk').iterator(BACKFILL_CHUNK_SIZE):
+        yield 'patient', pk, {
+            'title': f'{first_name} {last_name}',
+            'subtitle': f'ID: {patient_id}',
+            'url': f'/dashboard/patients/{pk}/',
+            'search_text': normalize(first_name, last_name, patient_id, phone, email),
+        }
+
+
+def appointment_documents(apps):
+    rows = apps.get_model('appointments', 'Appointment').objects.values_list(
+        'pk', 'appointment_id', 'appointment_date', 'patient__first_name', 'patient__last_name',
+        'doctor__user__first_name', 'doctor__user__last_name',
+    )
+    for pk, appointment_id, day, first_name, last_name, doctor_first, doctor_last in rows.order_by('pk').iterator(
+        BACKFILL_CHUNK_SIZE
+    ):
+        yield 'appointment', pk, {
+            'title': f'{first_name} {last_name} - {user_name(doctor_first, doctor_last)}',
+            'subtitle': f'ID: {appointment_id} | {day}',
+            'url': f'/appointments/{pk}/',
+            'search_text': normalize(appointment_id, first_name, last_name, doctor_first, doctor_last),
+        }
+
+
+def doctor_documents(apps):
+    rows = apps.get_model('doctors', 'Doctor').objects.values_list(
+        'pk', 'user__first_name', 'user__last_name', 'license_number', 'specialty'
+    )
+    for pk, first_name, last_name, license_number, specialty in rows.order_by('pk').iterator(BACKFILL_CHUNK_SIZE):
+        yield 'doctor', pk, {
+            'title': user_name(first_name, last_name),
+            'subtitle': f'Specialty: {specialty}',
+            'url': f'/doctors/{pk}/',
+            'search_text': normalize(first_name, last_name, license_number, specialty),
+        }
+
+
+def medicine_documents(apps):
+    rows = apps.get_model('pharmacy', 'Medicine').objects.values_list('pk', 'name', 'generic_name', 'brand_name')
+    for pk, name, generic_name, brand_name in rows.order_by('pk').iterator(BACKFILL_CHUNK_SIZE):
+        yield 'medicine', pk, {
+            'title': name,
+            'subtitle': f'Generic: {generic_name}',
+            'url': f'/pharmacy/medicines/{pk}/',
+            'search_text': normalize(name, generic_name, brand_name),
+        }
+
+
+def backfill_documents(apps, schema_editor):
+    """Index the rows that existed before the search documents did"""
+    SearchDocument = apps.get_model('core', 'SearchDocument')
+    for documents in (patient_documents, appointment_documents, doctor_documents, medicine_documents):
+        batch = []
+        for doc_type, object_id, fields in documents(apps):
+            batch.append(SearchDocument(doc_type=doc_type, object_id=object_id, **fields))
+            if len(batch) >= BACKFILL_CHUNK_SIZE:
+                SearchDocument.objects.bulk_create(batch)
+                batch = []
+        SearchDocument.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0001_initial'),
+        ('core', '0001_initial'),
+        ('doctors', '0001_initial'),
+        ('patients', '0001_initial'),
+        ('pharmacy', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(choices=[('patient', 'Patient'), ('appointment', 'Appointment'), ('doctor', 'Doctor'), ('medicine', 'Medicine')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('subtitle', models.CharField(blank=True, max_length=255)),
+                ('url', models.CharField(max_length=255)),
+                ('search_text', models.TextField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Search Document',
+                'verbose_name_plural': 'Search Documents',
+                'constraints': [models.UniqueConstraint(fields=('doc_type', 'object_id'), name='search_document_unique_object')],
+            },
+        ),
+        # Before the index, so PostgreSQL builds it once and SQLite's
+        # 'rebuild' copies the backfilled rows into the FTS table
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+        migrations.RunPython(
+            run({'postgresql': POSTGRES_INSTALL, 'sqlite': SQLITE_INSTALL}),
+            run({'postgresql': POSTGRES_UNINSTALL, 'sqlite': SQLITE_UNINSTALL}),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-17 08:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_searchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractWatermark',
+            fields=[
+                ('table', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_value', models.DateTimeField(blank=True, null=True)),
+                ('last_pk', models.BigIntegerField(blank=True, null=True)),
+                ('rows_extracted', models.PositiveBigIntegerField(default=0, help_text='Rows written by the last run')),
+                ('last_file', models.CharField(blank=True, max_length=255)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Extract Watermark',
+                'verbose_name_plural': 'Extract Watermarks',
+            },
+        ),
+    ]
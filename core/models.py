@@ -0,0 +1,71 @@
+from django.db import models
+
+
+class Sequence(models.Model):
+    """Named counter used to hand out sequential human-readable identifiers"""
+
+    name = models.CharField(max_length=50, primary_key=True, help_text="e.g. PAT2025, APT202508")
+    last_value = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_value}"
+
+    class Meta:
+        verbose_name = 'Sequence'
+        verbose_name_plural = 'Sequences'
+
+
+class SearchDocument(models.Model):
+    """Denormalized, searchable copy of a patient, appointment, doctor or medicine"""
+
+    DOC_TYPES = [
+        ('patient', 'Patient'),
+        ('appointment', 'Appointment'),
+        ('doctor', 'Doctor'),
+        ('medicine', 'Medicine'),
+    ]
+
+    doc_type = models.CharField(max_length=20, choices=DOC_TYPES)
+    object_id = models.PositiveBigIntegerField()
+
+    # What global search displays
+    title = models.CharField(max_length=255)
+    subtitle = models.CharField(max_length=255, blank=True)
+    url = models.CharField(max_length=255)
+
+    # Lower-cased, whitespace-normalized text the search matches against
+    search_text = models.TextField()
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.doc_type} #{self.object_id}: {self.title}"
+
+    class Meta:
+        verbose_name = 'Search Document'
+        verbose_name_plural = 'Search Documents'
+        constraints = [
+            models.UniqueConstraint(fields=['doc_type', 'object_id'], name='search_document_unique_object'),
+        ]
+
+
+class ExtractWatermark(models.Model):
+    """Position up to which a table has been copied out by ``manage.py extract``"""
+
+    table = models.CharField(max_length=50, primary_key=True)
+
+    # (updated_at, pk) of the last row extracted; rows after it are extracted next
+    last_value = models.DateTimeField(null=True, blank=True)
+    last_pk = models.BigIntegerField(null=True, blank=True)
+
+    rows_extracted = models.PositiveBigIntegerField(default=0, help_text="Rows written by the last run")
+    last_file = models.CharField(max_length=255, blank=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.table}: {self.last_value}"
+
+    class Meta:
+        verbose_name = 'Extract Watermark'
+        verbose_name_plural = 'Extract Watermarks'
@@ -0,0 +1,192 @@
+"""
+Keyset (cursor) pagination.
+
+``Paginator`` pages with ``OFFSET`` and a ``COUNT(*)`` per request, so deep
+pages get slower the further you scroll. ``KeysetPaginator`` instead
+remembers the sort key of the last row shown and asks for the rows after
+it (``WHERE (created_at, id) < (...) ORDER BY created_at DESC, id DESC
+LIMIT n``), which an index on the sort columns answers in the same time
+for page 500 as for page 1.
+
+The position travels as an opaque ``cursor`` token in the query string or
+JSON payload. Pages only know whether there is a previous/next page, not
+their number or the total count.
+"""
+import base64
+import datetime
+import json
+import uuid
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    """Raised for cursor tokens that cannot be decoded"""
+
+
+def _jsonable(value):
+    # Full isoformat (DjangoJSONEncoder would cut datetimes to milliseconds,
+    # and the key must round-trip exactly)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, uuid.UUID)):
+        return str(value)
+    return value
+
+
+def encode_cursor(values, backwards=False):
+    payload = json.dumps({'v': [_jsonable(value) for value in values], 'b': backwards}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return ``(values, backwards)`` from a cursor token"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return list(payload['v']), bool(payload['b'])
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor(f'Invalid cursor: {token!r}')
+
+
+class KeysetPage:
+    """One page of results plus the cursors of its neighbours"""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self)} rows>'
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    @property
+    def next_cursor(self):
+        if not self.has_next_page:
+            return None
+        return encode_cursor(self.paginator.key_for(self.object_list[-1]))
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous_page:
+            return None
+        return encode_cursor(self.paginator.key_for(self.object_list[0]), backwards=True)
+
+    def as_dict(self):
+        """Pagination block for JSON responses"""
+        return {
+            'has_next': self.has_next_page,
+            'has_previous': self.has_previous_page,
+            'next_cursor': self.next_cursor,
+            'previous_cursor': self.previous_cursor,
+        }
+
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` by its ordering instead of by offset.
+
+    ``ordering`` defaults to the queryset's ``order_by()`` or the model's
+    ``Meta.ordering``; the primary key is appended as a tie-breaker so the
+    key is unique. Ordering columns must be non-null model fields or
+    annotations on the queryset.
+    """
+
+    def __init__(self, queryset, per_page, ordering=None):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        ordering = list(ordering or queryset.query.order_by or queryset.model._meta.ordering)
+        if not ordering:
+            raise ValueError('KeysetPaginator needs an ordered queryset')
+        if not all(isinstance(name, str) and name != '?' for name in ordering):
+            raise ValueError('KeysetPaginator can only order by field or annotation names')
+        if not any(name.lstrip('-') in ('pk', queryset.model._meta.pk.name) for name in ordering):
+            ordering.append('-pk' if ordering[-1].startswith('-') else 'pk')
+        self.ordering = ordering
+
+    @property
+    def fields(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def _output_field(self, name):
+        if name in self.queryset.query.annotations:
+            return self.queryset.query.annotations[name].output_field
+        model_meta = self.queryset.model._meta
+        if name == 'pk':
+            return model_meta.pk
+        try:
+            return model_meta.get_field(name)
+        except FieldDoesNotExist:
+            raise ValueError(f'Cannot paginate on {name!r}: not a field or annotation')
+
+    def key_for(self, obj):
+        """Sort key of ``obj`` as JSON-friendly values"""
+        return [getattr(obj, name) for name in self.fields]
+
+    def _parse_key(self, values):
+        if len(values) != len(self.fields):
+            raise InvalidCursor('Cursor does not match the ordering')
+        try:
+            return [self._output_field(name).to_python(value) for name, value in zip(self.fields, values)]
+        except Exception:
+            raise InvalidCursor('Cursor values do not match the ordering')
+
+    def _after(self, key, reverse=False):
+        """Q selecting rows that sort after ``key`` (before it when ``reverse``)"""
+        condition = Q()
+        for position, name in enumerate(self.ordering):
+            field = name.lstrip('-')
+            descending = name.startswith('-') != reverse
+            step = Q(**{f'{field}__{"lt" if descending else "gt"}': key[position]})
+            for previous in range(position):
+                step &= Q(**{self.fields[previous]: key[previous]})
+            condition |= step
+        return condition
+
+    def get_page(self, cursor=None):
+        """Page following ``cursor``; a missing or invalid cursor gives the first page"""
+        values, backwards = None, False
+        if cursor:
+            try:
+                values, backwards = decode_cursor(cursor)
+                key = self._parse_key(values)
+            except InvalidCursor:
+                values, backwards = None, False
+
+        if values is None:
+            rows = list(self.queryset.order_by(*self.ordering)[:self.per_page + 1])
+            return KeysetPage(rows[:self.per_page], self, len(rows) > self.per_page, False)
+
+        if backwards:
+            reversed_ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+            rows = list(
+                self.queryset.filter(self._after(key, reverse=True)).order_by(*reversed_ordering)[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            rows.reverse()
+            return KeysetPage(rows, self, True, has_previous)
+
+        rows = list(self.queryset.filter(self._after(key)).order_by(*self.ordering)[:self.per_page + 1])
+        return KeysetPage(rows[:self.per_page], self, len(rows) > self.per_page, True)
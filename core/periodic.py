@@ -0,0 +1,37 @@
+"""
+Repeat a management command's work on an interval.
+
+Commands run by the procfile as long-lived processes (``rollup_stats``,
+``sweep_overdue``) take ``--every SECONDS``; ``run_every`` calls their
+work on that interval until the process gets SIGTERM or SIGINT, letting
+the current run finish first.
+"""
+import signal
+import time
+
+from django.core.management.base import CommandError
+
+
+def check_every(seconds):
+    """Validate an ``--every`` option (None: run once)"""
+    if seconds is not None and seconds <= 0:
+        raise CommandError('--every must be a positive number of seconds')
+
+
+def run_every(seconds, func):
+    """Call ``func`` every ``seconds`` (the first call after one interval) until stopped"""
+    running = True
+
+    def stop(signum, frame):
+        nonlocal running
+        running = False
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    next_run = time.monotonic() + seconds
+    while running:
+        if time.monotonic() < next_run:
+            time.sleep(min(1.0, next_run - time.monotonic()))
+            continue
+        func()
+        next_run = time.monotonic() + seconds
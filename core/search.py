@@ -0,0 +1,284 @@
+"""
+Cross-module search index behind global search.
+
+Patients, appointments, doctors and medicines are copied into one
+``SearchDocument`` table, denormalized into a title, a subtitle, a URL
+and lower-cased ``search_text``, and kept current by model signals (see
+core.signals). Global search is then a single query against the trigram
+index on ``search_text``:
+
+* each type contributes its ``CANDIDATES_PER_TYPE`` best matches from
+  the index, ordered on prefix matches and relevance before the limit;
+* the candidates are ranked (title prefix, text prefix, shorter titles
+  first) and ``ROW_NUMBER() OVER (PARTITION BY doc_type ...)`` keeps the
+  best ``limit`` of each type.
+
+``manage.py rebuild_search_index`` backfills the table in chunks.
+"""
+import unicodedata
+from dataclasses import dataclass
+
+from django.apps import apps
+from django.db import connection as default_connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Length, RowNumber
+
+from .models import SearchDocument
+from .text_index import TrigramTextIndex, fts5_phrase
+
+SEARCH_INDEX = TrigramTextIndex('core_searchdocument', ['search_text'], 'search_document', filter_fields=['doc_type'])
+MIN_TRIGRAM_LENGTH = 3
+CANDIDATES_PER_TYPE = 100
+
+
+def normalize(*parts):
+    """Lower-cased, whitespace-collapsed text for matching"""
+    text = ' '.join(str(part) for part in parts if part)
+    return ' '.join(unicodedata.normalize('NFKC', text).casefold().split())
+
+
+@dataclass(frozen=True)
+class SearchType:
+    """How one model is represented in the search index"""
+
+    doc_type: str
+    model: str
+    icon: str
+    build: object
+    limit: int = 5
+    select_related: tuple = ()
+    # Tracked fields (core.tracking) the document is built from; a save
+    # that changes none of them leaves the document alone
+    source_fields: tuple = ()
+
+    def get_model(self):
+        return apps.get_model(self.model)
+
+    def queryset(self):
+        return self.get_model().objects.select_related(*self.select_related)
+
+
+def patient_document(patient):
+    return {
+        'title': patient.get_full_name(),
+        'subtitle': f"ID: {patient.patient_id}",
+        'url': f"/dashboard/patients/{patient.pk}/",
+        'search_text': normalize(
+            patient.first_name, patient.last_name, patient.patient_id, patient.phone, patient.email
+        ),
+    }
+
+
+def appointment_document(appointment):
+    doctor_name = appointment.doctor.user.get_full_name()
+    return {
+        'title': f"{appointment.patient.get_full_name()} - {doctor_name}",
+        'subtitle': f"ID: {appointment.appointment_id} | {appointment.appointment_date}",
+        'url': f"/appointments/{appointment.pk}/",
+        'search_text': normalize(
+            appointment.appointment_id, appointment.patient.first_name, appointment.patient.last_name,
+            appointment.doctor.user.first_name, appointment.doctor.user.last_name,
+        ),
+    }
+
+
+def doctor_document(doctor):
+    return {
+        'title': doctor.user.get_full_name(),
+        'subtitle': f"Specialty: {doctor.specialty}",
+        'url': f"/doctors/{doctor.pk}/",
+        'search_text': normalize(
+            doctor.user.first_name, doctor.user.last_name, doctor.license_number, doctor.specialty
+        ),
+    }
+
+
+def medicine_document(medicine):
+    return {
+        'title': medicine.name,
+        'subtitle': f"Generic: {medicine.generic_name}",
+        'url': f"/pharmacy/medicines/{medicine.pk}/",
+        'search_text': normalize(medicine.name, medicine.generic_name, medicine.brand_name),
+    }
+
+
+# In the order global search lists them
+SEARCH_TYPES = [
+    SearchType('patient', 'patients.Patient', 'user', patient_document,
+               source_fields=('first_name', 'last_name', 'patient_id', 'phone', 'email')),
+    SearchType('appointment', 'appointments.Appointment', 'calendar-alt', appointment_document,
+               select_related=('patient', 'doctor__user'), source_fields=('patient', 'doctor', 'appointment_date')),
+    SearchType('doctor', 'doctors.Doctor', 'user-md', doctor_document, select_related=('user',)),
+    SearchType('medicine', 'pharmacy.Medicine', 'pills', medicine_document),
+]
+SEARCH_TYPES_BY_NAME = {search_type.doc_type: search_type for search_type in SEARCH_TYPES}
+
+
+def index_objects(doc_type, objects):
+    """Insert or refresh the search documents of ``objects``"""
+    build = SEARCH_TYPES_BY_NAME[doc_type].build
+    documents = [SearchDocument(doc_type=doc_type, object_id=obj.pk, **build(obj)) for obj in objects]
+    if documents:
+        SearchDocument.objects.bulk_create(
+            documents,
+            update_conflicts=True,
+            unique_fields=['doc_type', 'object_id'],
+            update_fields=['title', 'subtitle', 'url', 'search_text', 'updated_at'],
+        )
+    return len(documents)
+
+
+def index_queryset(doc_type, queryset=None, chunk_size=1000):
+    """Index ``queryset`` (default: every object of the type) in primary key chunks"""
+    if queryset is None:
+        queryset = SEARCH_TYPES_BY_NAME[doc_type].queryset()
+    queryset = queryset.order_by('pk')
+
+    indexed, last_pk = 0, None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            return indexed
+        with transaction.atomic():
+            indexed += index_objects(doc_type, chunk)
+        last_pk = chunk[-1].pk
+
+
+def remove_objects(doc_type, object_ids):
+    return SearchDocument.objects.filter(doc_type=doc_type, object_id__in=list(object_ids)).delete()[0]
+
+
+def rebuild(doc_type, chunk_size=1000):
+    """Backfill ``doc_type`` and drop documents of deleted objects; returns (indexed, removed)"""
+    search_type = SEARCH_TYPES_BY_NAME[doc_type]
+    indexed = index_queryset(doc_type, chunk_size=chunk_size)
+    removed = SearchDocument.objects.filter(doc_type=doc_type).exclude(
+        object_id__in=search_type.get_model().objects.values('pk')
+    ).delete()[0]
+    return indexed, removed
+
+
+def _like_pattern(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _candidate_sql(connection, doc_type, query, long_terms, short_terms, limit):
+    """
+    SQL selecting the ``limit`` best matching document ids of one type.
+
+    Candidates are ordered before the LIMIT, on the same prefix rank the
+    final ranking uses (title prefix, then text prefix) and then on the
+    index's own relevance (bm25 on SQLite, trigram similarity on
+    PostgreSQL), so the best matches are never cut before ranking.
+    """
+    normalized = normalize(query)
+    title_like = 'ILIKE' if connection.vendor == 'postgresql' else 'LIKE'
+    rank = (
+        f"CASE WHEN doc.title {title_like} %s ESCAPE '\\' THEN 0 "
+        f"WHEN doc.search_text LIKE %s ESCAPE '\\' THEN 1 ELSE 2 END"
+    )
+    rank_params = [f'{_like_pattern(query.strip())}%', f'{_like_pattern(normalized)}%']
+
+    conditions, params = [], []
+    for term in short_terms:
+        conditions.append("(doc.search_text LIKE %s ESCAPE '\\' OR doc.search_text LIKE %s ESCAPE '\\')")
+        params += [f'{_like_pattern(term)}%', f'% {_like_pattern(term)}%']
+
+    if long_terms and connection.vendor == 'sqlite':
+        fts = SEARCH_INDEX.fts_table
+        terms = ' AND '.join(fts5_phrase(term) for term in long_terms)
+        match = f'doc_type : {fts5_phrase(doc_type)} AND search_text : ({terms})'
+        where = ' AND '.join([f'{fts} MATCH %s'] + conditions)
+        return (
+            f'SELECT doc.id FROM {fts} JOIN core_searchdocument doc ON doc.id = {fts}.rowid '
+            f'WHERE {where} ORDER BY {rank}, {fts}.rank, LENGTH(doc.title) LIMIT %s',
+            [match, *params, *rank_params, limit],
+        )
+
+    # PostgreSQL: the pg_trgm index serves the LIKEs, the unique
+    # (doc_type, object_id) index the type filter
+    conditions.insert(0, 'doc.doc_type = %s')
+    params.insert(0, doc_type)
+    for term in long_terms:
+        conditions.append("doc.search_text LIKE %s ESCAPE '\\'")
+        params.append(f'%{_like_pattern(term)}%')
+    order, order_params = [rank], rank_params
+    if connection.vendor == 'postgresql':
+        order.append('similarity(doc.search_text, %s) DESC')
+        order_params = [*order_params, normalized]
+    order.append('LENGTH(doc.title)')
+    return (
+        f"SELECT doc.id FROM core_searchdocument doc WHERE {' AND '.join(conditions)} "
+        f"ORDER BY {', '.join(order)} LIMIT %s",
+        [*params, *order_params, limit],
+    )
+
+
+def search(query, limits=None, connection=None):
+    """
+    Best matching documents of every type for ``query``, in one query.
+
+    ``limits`` maps doc_type to the number of results wanted (default:
+    each type's ``limit``). Results are grouped by type in SEARCH_TYPES
+    order, best match first.
+    """
+    connection = connection or default_connection
+    limits = limits or {search_type.doc_type: search_type.limit for search_type in SEARCH_TYPES}
+    normalized = normalize(query)
+    terms = normalized.split()
+    if not terms:
+        return []
+    long_terms = [term for term in terms if len(term) >= MIN_TRIGRAM_LENGTH]
+    short_terms = [term for term in terms if len(term) < MIN_TRIGRAM_LENGTH]
+
+    parts, params = [], []
+    for position, doc_type in enumerate(limits):
+        sql, part_params = _candidate_sql(connection, doc_type, query, long_terms, short_terms, CANDIDATES_PER_TYPE)
+        parts.append(f'SELECT id FROM ({sql}) candidates_{position}')
+        params += part_params
+
+    documents = SearchDocument.objects.filter(id__in=RawSQL(' UNION ALL '.join(parts), params))
+
+    type_order = [search_type.doc_type for search_type in SEARCH_TYPES]
+    documents = documents.annotate(
+        rank=Case(
+            When(title__istartswith=query.strip(), then=Value(0)),
+            When(search_text__startswith=normalized, then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        ),
+        type_limit=Case(
+            *[When(doc_type=doc_type, then=Value(limit)) for doc_type, limit in limits.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        type_order=Case(
+            *[When(doc_type=doc_type, then=Value(index)) for index, doc_type in enumerate(type_order)],
+            output_field=IntegerField(),
+        ),
+    ).annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=[F('doc_type')],
+            order_by=[F('rank').asc(), Length('title').asc(), F('id').asc()],
+        ),
+    ).filter(position__lte=F('type_limit')).order_by('type_order', 'position')
+
+    return list(documents)
+
+
+def search_results(query, limits=None):
+    """``search()`` as the JSON rows global search returns"""
+    return [
+        {
+            'type': document.doc_type,
+            'id': document.object_id,
+            'title': document.title,
+            'subtitle': document.subtitle,
+            'url': document.url,
+            'icon': SEARCH_TYPES_BY_NAME[document.doc_type].icon,
+        }
+        for document in search(query, limits)
+    ]
@@ -0,0 +1,64 @@
+"""
+Concurrency-safe sequential number allocation.
+
+Identifiers such as PAT20250001 or INV2025080001 used to be derived by
+scanning for the highest existing value and adding one, which is slow on
+large tables and races into unique violations when two requests register
+at the same time. Here each prefix owns one row in ``core_sequence``; a
+single ``UPDATE ... SET last_value = last_value + n`` takes the row lock,
+so allocation is constant time and concurrent callers are serialised by
+the database (Postgres row lock, SQLite database write lock).
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, F, Max
+from django.db.models.functions import Cast, Substr
+
+from .models import Sequence
+
+
+def allocate(name, count=1, seed=None):
+    """
+    Reserve ``count`` consecutive numbers from sequence ``name``.
+
+    Returns a ``range`` of the reserved numbers. ``seed`` is an optional
+    callable returning the value to start from when the sequence row does
+    not exist yet (used to continue numbering of pre-existing data).
+    """
+    if count < 1:
+        raise ValueError('count must be at least 1')
+
+    with transaction.atomic():
+        updated = Sequence.objects.filter(name=name).update(last_value=F('last_value') + count)
+        if not updated:
+            start = seed() if seed else 0
+            try:
+                with transaction.atomic():
+                    Sequence.objects.create(name=name, last_value=start + count)
+            except IntegrityError:
+                # Another transaction created the row first; take our block from it
+                Sequence.objects.filter(name=name).update(last_value=F('last_value') + count)
+
+        last_value = Sequence.objects.values_list('last_value', flat=True).get(name=name)
+
+    return range(last_value - count + 1, last_value + 1)
+
+
+def max_existing_number(model, field, prefix):
+    """Highest numeric suffix already used for ``prefix`` in ``model.field``"""
+    result = model.objects.filter(
+        **{f'{field}__startswith': prefix}
+    ).aggregate(
+        last=Max(Cast(Substr(field, len(prefix) + 1), BigIntegerField()))
+    )
+    return result['last'] or 0
+
+
+def reserve_identifiers(prefix, model, field, count, width=4):
+    """Allocate ``count`` formatted identifiers such as PAT20250001"""
+    numbers = allocate(prefix, count, seed=lambda: max_existing_number(model, field, prefix))
+    return [f'{prefix}{number:0{width}d}' for number in numbers]
+
+
+def next_identifier(prefix, model, field, width=4):
+    """Allocate a single formatted identifier"""
+    return reserve_identifiers(prefix, model, field, 1, width=width)[0]
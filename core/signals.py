@@ -0,0 +1,59 @@
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save
+
+from .search import SEARCH_INDEX, SEARCH_TYPES, SEARCH_TYPES_BY_NAME, index_objects, index_queryset, remove_objects
+
+MODEL_DOC_TYPES = {search_type.model: search_type.doc_type for search_type in SEARCH_TYPES}
+
+
+def index_instance(sender, instance, created=False, **kwargs):
+    """Refresh the search document of the saved object"""
+    search_type = SEARCH_TYPES_BY_NAME[MODEL_DOC_TYPES[sender._meta.label]]
+    if not created and search_type.source_fields and not any(
+        instance.has_changed(field) for field in search_type.source_fields
+    ):
+        return
+    if search_type.select_related:
+        # Reload with the related rows the document is built from
+        instance = search_type.queryset().filter(pk=instance.pk).first()
+    if instance is not None:
+        index_objects(search_type.doc_type, [instance])
+
+
+def remove_instance(sender, instance, **kwargs):
+    """Drop the search document of the deleted object"""
+    remove_objects(MODEL_DOC_TYPES[sender._meta.label], [instance.pk])
+
+
+def reindex_patient_appointments(sender, instance, created, **kwargs):
+    """Appointment documents carry the patient's name"""
+    if not created and (instance.has_changed('first_name') or instance.has_changed('last_name')):
+        appointments = SEARCH_TYPES_BY_NAME['appointment'].queryset().filter(patient_id=instance.pk)
+        index_queryset('appointment', appointments)
+
+
+def reindex_doctor_user(sender, instance, created, update_fields=None, **kwargs):
+    """Doctor and appointment documents carry the doctor's user name"""
+    if created or (update_fields is not None and not {'first_name', 'last_name'} & set(update_fields)):
+        return
+    doctors = SEARCH_TYPES_BY_NAME['doctor'].queryset().filter(user_id=instance.pk)
+    if index_queryset('doctor', doctors):
+        appointments = SEARCH_TYPES_BY_NAME['appointment'].queryset().filter(doctor__user_id=instance.pk)
+        index_queryset('appointment', appointments)
+
+
+def ensure_search_index(sender, using='default', **kwargs):
+    """Reinstall the search index if a migration dropped it"""
+    SEARCH_INDEX.install(connections[using])
+
+
+def connect_search_signals(app_config):
+    """Keep SearchDocument in step with the indexed models"""
+    for search_type in SEARCH_TYPES:
+        uid = f'search_index_{search_type.doc_type}'
+        post_save.connect(index_instance, sender=search_type.model, dispatch_uid=f'{uid}_save')
+        post_delete.connect(remove_instance, sender=search_type.model, dispatch_uid=f'{uid}_delete')
+
+    post_save.connect(reindex_patient_appointments, sender='patients.Patient', dispatch_uid='search_index_patient_appointments')
+    post_save.connect(reindex_doctor_user, sender='accounts.User', dispatch_uid='search_index_doctor_user')
+    post_migrate.connect(ensure_search_index, sender=app_config)
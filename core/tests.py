@@ -0,0 +1,436 @@
+import csv
+import gzip
+import json
+import shutil
+import tempfile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import date
+from io import StringIO
+from django.core.management import call_command
+from .extract import extract_table
+from .export import ExportColumn, age_format, choice_label, full_name, iter_csv
+from .models import ExtractWatermark, SearchDocument, Sequence
+from .pagination import KeysetPaginator
+from .search import search, search_results
+from .sequences import allocate, reserve_identifiers, next_identifier
+from django.contrib.auth import get_user_model
+from notifications.models import Notification
+from patients.models import Patient
+
+
+class SequenceAllocatorTests(TestCase):
+    """Test cases for the sequential identifier allocator"""
+
+    def create_patient(self, **kwargs):
+        defaults = {
+            'first_name': 'Abebe', 'last_name': 'Kebede', 'date_of_birth': date(1990, 5, 17),
+            'gender': 'M', 'kebele': '01', 'woreda': 'Bole', 'phone': '0912345678',
+            'emergency_contact_name': 'Almaz Kebede', 'emergency_contact_phone': '0911223344',
+            'emergency_contact_relationship': 'Sister',
+        }
+        defaults.update(kwargs)
+        return Patient.objects.create(**defaults)
+
+    def test_allocate_is_sequential(self):
+        """Numbers are handed out one after another"""
+        self.assertEqual(list(allocate('TEST')), [1])
+        self.assertEqual(list(allocate('TEST')), [2])
+        self.assertEqual(Sequence.objects.get(name='TEST').last_value, 2)
+
+    def test_reserve_block(self):
+        """A block reservation skips the whole range for later callers"""
+        self.assertEqual(list(allocate('BULK', count=100)), list(range(1, 101)))
+        self.assertEqual(list(allocate('BULK')), [101])
+
+    def test_allocation_query_count(self):
+        """An existing sequence costs one UPDATE and one SELECT"""
+        allocate('FAST')
+        with CaptureQueriesContext(connection) as context:
+            allocate('FAST')
+
+        statements = [query['sql'].split()[0] for query in context.captured_queries
+                      if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(statements, ['UPDATE', 'SELECT'])
+
+    def test_seed_continues_existing_numbering(self):
+        """A new sequence continues from identifiers already in the table"""
+        prefix = f'PAT{timezone.now().year}'
+        Patient.objects.bulk_create([
+            Patient(patient_id=f'{prefix}0041', first_name='A', last_name='B', date_of_birth=date(1990, 1, 1),
+                    gender='F', kebele='01', woreda='Bole', phone='0912345678',
+                    emergency_contact_name='C', emergency_contact_phone='0912345678',
+                    emergency_contact_relationship='Mother'),
+        ])
+
+        self.assertEqual(next_identifier(prefix, Patient, 'patient_id'), f'{prefix}0042')
+        self.assertEqual(
+            reserve_identifiers(prefix, Patient, 'patient_id', 2),
+            [f'{prefix}0043', f'{prefix}0044'],
+        )
+
+    def test_patient_ids_use_sequence(self):
+        """Patient.save assigns IDs from the sequence"""
+        prefix = f'PAT{timezone.now().year}'
+        first = self.create_patient()
+        second = self.create_patient(first_name='Meron')
+
+        self.assertEqual(first.patient_id, f'{prefix}0001')
+        self.assertEqual(second.patient_id, f'{prefix}0002')
+
+
+class KeysetPaginatorTests(TestCase):
+    """Test cases for keyset (cursor) pagination"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='nurse', password='testpass123', role='nurse')
+        Notification.objects.bulk_create([
+            Notification(title=f'Note {index}', message='Hello', recipient=self.user,
+                         priority=['low', 'normal', 'high'][index % 3])
+            for index in range(23)
+        ])
+        # Give several rows the same timestamp so the primary key has to break ties
+        Notification.objects.filter(pk__in=list(Notification.objects.values_list('pk', flat=True)[:8])).update(
+            created_at=timezone.now()
+        )
+        self.queryset = Notification.objects.filter(recipient=self.user).order_by('-created_at')
+        self.expected = list(self.queryset.order_by('-created_at', '-pk').values_list('pk', flat=True))
+
+    def walk(self, paginator):
+        pages, cursor = [], None
+        while True:
+            page = paginator.get_page(cursor)
+            pages.append([notification.pk for notification in page])
+            if not page.has_next():
+                return pages, page
+            cursor = page.next_cursor
+
+    def test_forward_pages_cover_every_row_once(self):
+        """Following next cursors visits every row once, in order"""
+        pages, last_page = self.walk(KeysetPaginator(self.queryset, 5))
+
+        self.assertEqual([pk for page in pages for pk in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [5, 5, 5, 5, 3])
+        self.assertTrue(last_page.has_previous())
+
+    def test_previous_cursor_returns_the_earlier_page(self):
+        """Going back from a page returns exactly the page before it"""
+        paginator = KeysetPaginator(self.queryset, 5)
+        first = paginator.get_page()
+        second = paginator.get_page(first.next_cursor)
+        back = paginator.get_page(second.previous_cursor)
+
+        self.assertEqual([n.pk for n in back], [n.pk for n in first])
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_annotated_ordering(self):
+        """Annotations can be part of the key"""
+        from django.db.models import Case, IntegerField, Value, When
+
+        queryset = self.queryset.annotate(
+            rank=Case(When(priority='high', then=Value(0)), default=Value(1), output_field=IntegerField())
+        ).order_by('rank', '-created_at')
+        pages, _ = self.walk(KeysetPaginator(queryset, 4))
+
+        self.assertEqual(
+            [pk for page in pages for pk in page],
+            list(queryset.order_by('rank', '-created_at', '-pk').values_list('pk', flat=True)),
+        )
+
+    def test_deep_page_costs_one_query(self):
+        """A deep page is one LIMIT query, with no COUNT or OFFSET"""
+        paginator = KeysetPaginator(self.queryset, 5)
+        page = paginator.get_page()
+        for _ in range(3):
+            page = paginator.get_page(page.next_cursor)
+
+        with CaptureQueriesContext(connection) as context:
+            list(paginator.get_page(page.previous_cursor))
+
+        self.assertEqual(len(context.captured_queries), 1)
+        sql = context.captured_queries[0]['sql'].upper()
+        self.assertNotIn('OFFSET', sql)
+        self.assertNotIn('COUNT(', sql)
+
+    def test_list_views_do_not_count_per_page(self):
+        """List pages take their counters from caches, never a COUNT or SUM over the list"""
+        self.client.login(username='nurse', password='testpass123')
+        urls = ['/notifications/?mobile=1', '/dashboard/patients/', '/dashboard/patients/?mobile=1', '/appointments/', '/billing/']
+        for url in urls:
+            # Warm the cached dashboard snapshot and unread counter
+            self.client.get(url)
+
+        for url in urls:
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            sql = ' '.join(query['sql'].upper() for query in context.captured_queries)
+            self.assertNotIn('COUNT(', sql, url)
+            self.assertNotIn('SUM(', sql, url)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        """Garbage cursors show the first page instead of failing"""
+        page = KeysetPaginator(self.queryset, 5).get_page('not-a-cursor')
+        self.assertEqual([n.pk for n in page], self.expected[:5])
+
+    def test_notification_views_follow_cursors(self):
+        """The inbox page and JSON feed hand out working cursors"""
+        self.client.login(username='nurse', password='testpass123')
+
+        response = self.client.get('/notifications/')
+        self.assertEqual(len(response.context['page_obj']), 20)
+        self.assertContains(response, 'cursor=')
+
+        data = self.client.get('/notifications/api/feed/', {'per_page': 10}).json()
+        self.assertEqual([n['id'] for n in data['notifications']], self.expected[:10])
+        data = self.client.get('/notifications/api/feed/', {'per_page': 10, 'cursor': data['next_cursor']}).json()
+        self.assertEqual([n['id'] for n in data['notifications']], self.expected[10:20])
+        self.assertTrue(data['has_previous'])
+
+
+class SearchIndexTests(TestCase):
+    """Test cases for the cross-module search index"""
+
+    def setUp(self):
+        from patients.tests import create_doctor, create_patient
+        from appointments.models import Appointment
+        from pharmacy.models import Medicine
+
+        self.patient = create_patient(first_name='Tigist', last_name='Haile')
+        self.doctor = create_doctor()
+        self.appointment = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_date=date(2025, 3, 1),
+            appointment_time='09:00', chief_complaint='Headache',
+        )
+        self.medicine = Medicine.objects.create(
+            name='Tesfacillin', generic_name='Amoxicillin', manufacturer='EPHARM', category='antibiotic',
+            form='tablet', strength='500mg', stock_quantity=100, unit_price=10, cost_price=8,
+            expiry_date=date(2030, 1, 1),
+        )
+
+    def test_results_grouped_by_type(self):
+        """One query returns matches of every type, in global search order"""
+        with CaptureQueriesContext(connection) as queries:
+            results = search_results('tesf')
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([result['type'] for result in results], ['appointment', 'doctor', 'medicine'])
+        self.assertEqual(results[1]['url'], f'/doctors/{self.doctor.pk}/')
+        self.assertEqual(results[1]['icon'], 'user-md')
+
+    def test_every_term_must_match(self):
+        results = search_results('tigist haile')
+        self.assertEqual([result['type'] for result in results], ['patient', 'appointment'])
+        self.assertEqual(search_results('tigist zzz'), [])
+
+    def test_short_terms_use_prefix_match(self):
+        self.assertEqual([document.doc_type for document in search('ti')], ['patient', 'appointment'])
+        self.assertEqual(search('ig'), [])
+
+    def test_per_type_limits(self):
+        from patients.tests import create_patient
+
+        for index in range(4):
+            create_patient(first_name='Tigist', last_name=f'Haile{index}', phone=f'091100000{index}')
+        self.assertEqual(len(search('tigist', limits={'patient': 3})), 3)
+        self.assertEqual(len(search('tigist', limits={'patient': 10})), 5)
+        # Exact name first, then shorter titles
+        self.assertEqual(search('tigist haile', limits={'patient': 1})[0].object_id, self.patient.pk)
+
+    def test_best_match_survives_the_candidate_limit(self):
+        """More matches than CANDIDATES_PER_TYPE still rank the exact prefix hit first"""
+        from core.search import CANDIDATES_PER_TYPE
+
+        SearchDocument.objects.bulk_create([
+            SearchDocument(
+                doc_type='patient', object_id=10000 + index, title=f'Abebe Derartu{index}', url='/',
+                search_text=f'abebe derartu{index}',
+            )
+            for index in range(CANDIDATES_PER_TYPE + 20)
+        ])
+        best = SearchDocument.objects.create(
+            doc_type='patient', object_id=20000, title='Derartu Tulu', url='/', search_text='derartu tulu',
+        )
+        self.assertEqual(search('derartu', limits={'patient': 1})[0].pk, best.pk)
+        self.assertEqual(search('derartu tu', limits={'patient': 1})[0].pk, best.pk)
+
+    def test_related_rename_refreshes_documents(self):
+        """Appointment documents follow the patient and doctor names"""
+        self.patient.first_name = 'Selamawit'
+        self.patient.save()
+        self.assertEqual([document.doc_type for document in search('selamawit')], ['patient', 'appointment'])
+
+        self.doctor.user.last_name = 'Girma'
+        self.doctor.user.save(update_fields=['last_name'])
+        self.assertEqual([document.doc_type for document in search('girma')], ['appointment', 'doctor'])
+
+    def test_unrelated_patient_edit_leaves_documents_alone(self):
+        self.patient.allergies = 'Penicillin'
+        with CaptureQueriesContext(connection) as queries:
+            self.patient.save()
+        self.assertFalse([query for query in queries if 'core_searchdocument' in query['sql']])
+
+    def test_migration_backfill_matches_live_documents(self):
+        """The frozen document builders of core 0002 agree with core.search"""
+        from importlib import import_module
+        from django.apps import apps
+
+        fields = ('doc_type', 'object_id', 'title', 'subtitle', 'url', 'search_text')
+        live = sorted(SearchDocument.objects.values_list(*fields))
+        SearchDocument.objects.all().delete()
+        import_module('core.migrations.0002_searchdocument').backfill_documents(apps, None)
+        self.assertEqual(sorted(SearchDocument.objects.values_list(*fields)), live)
+        self.assertEqual(len(live), 4)
+
+    def test_delete_removes_document(self):
+        self.medicine.delete()
+        self.assertFalse(SearchDocument.objects.filter(doc_type='medicine').exists())
+        self.assertEqual([document.doc_type for document in search('tesf')], ['appointment', 'doctor'])
+
+    def test_rebuild_command_backfills(self):
+        SearchDocument.objects.all().delete()
+        self.assertEqual(search('tesf'), [])
+
+        output = StringIO()
+        call_command('rebuild_search_index', '--chunk-size', '1', stdout=output)
+        self.assertIn('patient: indexed 1, removed 0 stale', output.getvalue())
+        self.assertEqual(SearchDocument.objects.count(), 4)
+        self.assertEqual(len(search('tesf')), 3)
+
+
+class CSVExportTests(TestCase):
+    """Test cases for the streaming CSV export"""
+
+    def setUp(self):
+        from patients.tests import create_patient
+
+        for index in range(5):
+            create_patient(first_name=f'Abebe{index}', date_of_birth=date(1990, 6, 1), gender='MF'[index % 2])
+        self.columns = [
+            ExportColumn('Name', ('first_name', 'last_name'), full_name),
+            ExportColumn('Age', 'date_of_birth', age_format(today=date(2025, 5, 31))),
+            ExportColumn('Gender', 'gender', choice_label(Patient.GENDER_CHOICES)),
+            ExportColumn('Email', 'email'),
+        ]
+
+    def test_rows_are_streamed_in_chunks(self):
+        """Each piece holds at most chunk_size rows; no model instances are built"""
+        patients = Patient.objects.order_by('first_name')
+        with CaptureQueriesContext(connection) as queries:
+            pieces = list(iter_csv(patients, self.columns, chunk_size=2))
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([piece.count('\r\n') for piece in pieces], [3, 2, 1])
+        lines = ''.join(pieces).splitlines()
+        self.assertEqual(lines[0], 'Name,Age,Gender,Email')
+        self.assertEqual(lines[1], 'Abebe0 Kebede,34,Male,')
+        self.assertEqual(lines[2], 'Abebe1 Kebede,34,Female,')
+
+    def test_empty_export_has_header(self):
+        self.assertEqual(''.join(iter_csv(Patient.objects.none(), self.columns)), 'Name,Age,Gender,Email\r\n')
+
+
+@override_settings(EXTRACT_LAG_SECONDS=0)
+class ExtractTests(TestCase):
+    """Test cases for the incremental bulk extract"""
+
+    def setUp(self):
+        from patients.tests import create_patient
+
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+        self.patients = [create_patient(first_name=f'Abebe{index}') for index in range(3)]
+
+    def read(self, path):
+        with gzip.open(path, 'rt', encoding='utf-8') as stream:
+            return [json.loads(line) for line in stream]
+
+    def test_only_changed_rows_are_extracted(self):
+        """Each run picks up from the watermark the previous one left"""
+        first = extract_table('patients', output_dir=self.output_dir)
+        self.assertEqual(first['rows'], 3)
+        rows = self.read(first['file'])
+        self.assertEqual([row['first_name'] for row in rows], ['Abebe0', 'Abebe1', 'Abebe2'])
+        self.assertEqual(rows[0]['date_of_birth'], '1990-05-17')
+
+        self.assertEqual(extract_table('patients', output_dir=self.output_dir), {
+            'table': 'patients', 'rows': 0, 'file': None,
+        })
+
+        self.patients[0].phone = '0999999999'
+        self.patients[0].save()
+        changed = extract_table('patients', output_dir=self.output_dir)
+        self.assertEqual([row['phone'] for row in self.read(changed['file'])], ['0999999999'])
+
+        watermark = ExtractWatermark.objects.get(table='patients')
+        self.assertEqual(watermark.last_pk, self.patients[0].pk)
+        self.assertEqual(watermark.rows_extracted, 1)
+
+    @override_settings(EXTRACT_LAG_SECONDS=300)
+    def test_lag_leaves_recent_rows_and_overlap_rereads_late_commits(self):
+        """A run stops short of now; the next re-reads the window behind the watermark"""
+        from datetime import timedelta
+        from patients.models import Patient
+
+        now = timezone.now()
+        for patient, minutes in zip(self.patients, (20, 10, 1)):
+            Patient.objects.filter(pk=patient.pk).update(updated_at=now - timedelta(minutes=minutes))
+
+        first = extract_table('patients', output_dir=self.output_dir)
+        self.assertEqual([row['id'] for row in self.read(first['file'])], [p.pk for p in self.patients[:2]])
+
+        # Committed after the first run, but stamped before its watermark
+        Patient.objects.filter(pk=self.patients[2].pk).update(updated_at=now - timedelta(minutes=12))
+        second = extract_table('patients', output_dir=self.output_dir)
+        self.assertEqual(
+            [row['id'] for row in self.read(second['file'])], [self.patients[2].pk, self.patients[1].pk]
+        )
+
+    def test_full_csv_extract(self):
+        extract_table('patients', output_dir=self.output_dir)
+        result = extract_table('patients', file_format='csv', full=True, output_dir=self.output_dir)
+        with gzip.open(result['file'], 'rt', encoding='utf-8', newline='') as stream:
+            rows = list(csv.DictReader(stream))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[2]['patient_id'], self.patients[2].patient_id)
+
+    def test_command_rejects_unknown_tables(self):
+        from django.core.management.base import CommandError
+
+        with self.assertRaises(CommandError):
+            call_command('extract', 'staff', output_dir=self.output_dir, stdout=StringIO())
+
+
+class ChangeTrackingTests(TestCase):
+    """Test cases for the in-memory change tracking mixin"""
+
+    def setUp(self):
+        from billing.models import Invoice
+        from patients.tests import create_patient
+
+        Invoice.objects.create(patient=create_patient(), issue_date=date(2025, 3, 1), due_date=date(2025, 3, 31))
+        self.invoice = Invoice.objects.get()
+
+    def test_tracks_loaded_values(self):
+        self.assertFalse(self.invoice.has_changed('status'))
+        self.invoice.status = 'sent'
+        self.assertTrue(self.invoice.has_changed('status'))
+        self.assertEqual(self.invoice.previous('status'), 'draft')
+
+    def test_snapshot_moves_on_after_save(self):
+        self.invoice.status = 'sent'
+        self.invoice.save(update_fields=['status'])
+        self.assertFalse(self.invoice.has_changed('status'))
+        self.assertEqual(self.invoice.previous('status'), 'sent')
+
+    def test_new_and_deferred_instances_have_no_previous_value(self):
+        from billing.models import Invoice
+
+        self.assertIsNone(Invoice(status='paid').previous('status'))
+        self.assertTrue(Invoice(status='paid').has_changed('status'))
+        deferred = Invoice.objects.only('pk').get()
+        self.assertIsNone(deferred.previous('status'))
+
+    def test_untracked_field_is_an_error(self):
+        with self.assertRaises(ValueError):
+            self.invoice.has_changed('notes')
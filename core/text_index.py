@@ -0,0 +1,167 @@
+"""
+Substring (trigram) text indexes that work on both supported databases.
+
+* PostgreSQL: ``pg_trgm`` GIN indexes, one per column. ``LIKE``/``ILIKE``
+  with leading wildcards are answered from them. Django's ``icontains``
+  compiles to ``UPPER(col::text) LIKE UPPER(...)``, which they cannot
+  serve, so substring filters use ``ILikeContains`` instead.
+* SQLite: an external-content FTS5 table using the trigram tokenizer. It
+  shadows the source table and is kept in sync by triggers, so bulk
+  inserts and ``update()`` are covered too. Queries use ``MATCH``.
+
+Schema changes are applied from migrations and re-checked on post_migrate,
+because SQLite table rebuilds (``AlterField``) drop the triggers.
+"""
+from contextlib import contextmanager
+
+from django.db.models.lookups import IContains
+
+
+class ILikeContains(IContains):
+    """
+    ``icontains`` that compiles to a plain ``col ILIKE '%term%'`` on
+    PostgreSQL, the form the trigram GIN indexes serve; identical to
+    ``icontains`` elsewhere. Used as an expression:
+    ``filter(ILikeContains(F('first_name'), term))``.
+    """
+
+    def as_postgresql(self, compiler, connection):
+        # process_lhs() would add the UPPER() of lookup_cast()
+        lhs_sql, lhs_params = compiler.compile(self.lhs)
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs_sql} ILIKE {rhs_sql}', (*lhs_params, *rhs_params)
+
+
+class TrigramTextIndex:
+    """
+    Trigram index over ``fields`` of ``table``.
+
+    ``filter_fields`` are extra columns copied into the FTS5 table so a
+    MATCH can be narrowed by them (``doc_type : "patient"``); PostgreSQL
+    filters on those through ordinary B-tree indexes instead.
+    """
+
+    def __init__(self, table, fields, index_prefix, filter_fields=()):
+        self.table = table
+        self.fields = tuple(fields)
+        self.filter_fields = tuple(filter_fields)
+        self.index_prefix = index_prefix
+
+    @property
+    def fts_table(self):
+        return f'{self.table}_fts'
+
+    @property
+    def trigger_names(self):
+        return [f'{self.fts_table}_{action}' for action in ('insert', 'delete', 'update')]
+
+    def _columns(self, alias=None):
+        fields = self.filter_fields + self.fields
+        if alias:
+            return ', '.join(f'{alias}.{field}' for field in fields)
+        return ', '.join(fields)
+
+    def _insert_new(self):
+        return f'INSERT INTO {self.fts_table}(rowid, {self._columns()}) VALUES (new.id, {self._columns("new")});'
+
+    def _insert_trigger_sql(self):
+        return (
+            f'CREATE TRIGGER IF NOT EXISTS {self.trigger_names[0]} AFTER INSERT ON {self.table} '
+            f'BEGIN {self._insert_new()} END'
+        )
+
+    def sqlite_sql(self):
+        fts, columns = self.fts_table, self._columns()
+        insert_new = self._insert_new()
+        delete_old = (
+            f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {self._columns('old')});"
+        )
+        _, delete_trigger, update_trigger = self.trigger_names
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{columns}, content='{self.table}', content_rowid='id', tokenize='trigram')",
+            self._insert_trigger_sql(),
+            f'CREATE TRIGGER IF NOT EXISTS {delete_trigger} AFTER DELETE ON {self.table} BEGIN {delete_old} END',
+            f'CREATE TRIGGER IF NOT EXISTS {update_trigger} AFTER UPDATE ON {self.table} BEGIN '
+            f'{delete_old} {insert_new} END',
+        ]
+
+    def postgres_sql(self):
+        return ['CREATE EXTENSION IF NOT EXISTS pg_trgm'] + [
+            f'CREATE INDEX IF NOT EXISTS {self.index_prefix}_{field}_trgm_idx '
+            f'ON {self.table} USING gin ({field} gin_trgm_ops)'
+            for field in self.fields
+        ]
+
+    def sqlite_installed(self, connection):
+        names = [self.fts_table] + self.trigger_names
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT COUNT(*) FROM sqlite_master WHERE name IN ({', '.join(['%s'] * len(names))})", names
+            )
+            return cursor.fetchone()[0] == len(names)
+
+    def install(self, connection):
+        """
+        Create the index if it is missing; safe to call repeatedly.
+
+        On SQLite the FTS table is rebuilt from the source table whenever
+        any part of it had to be (re)created. Nothing is done while the
+        source table does not exist (its app migrated backwards).
+        """
+        if self.table not in connection.introspection.table_names():
+            return
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                for statement in self.postgres_sql():
+                    cursor.execute(statement)
+        elif connection.vendor == 'sqlite' and not self.sqlite_installed(connection):
+            with connection.cursor() as cursor:
+                for statement in self.sqlite_sql():
+                    cursor.execute(statement)
+                cursor.execute(f"INSERT INTO {self.fts_table}({self.fts_table}) VALUES ('rebuild')")
+
+    @contextmanager
+    def bulk_insert(self, connection):
+        """
+        Index the rows inserted inside the block with one statement instead
+        of the per-row insert trigger (SQLite; a no-op elsewhere).
+
+        Must run inside a transaction. Dropping the trigger takes SQLite's
+        write lock, so no other connection can insert unindexed rows before
+        it is restored at the end of the block; on error the rollback
+        restores it.
+        """
+        if connection.vendor != 'sqlite' or not self.sqlite_installed(connection):
+            yield
+            return
+        if not connection.in_atomic_block:
+            raise RuntimeError('bulk_insert() must run inside a transaction')
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {self.trigger_names[0]}')
+            cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {self.table}')
+            last_id = cursor.fetchone()[0]
+        yield
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.fts_table}(rowid, {self._columns()}) '
+                f'SELECT id, {self._columns()} FROM {self.table} WHERE id > %s',
+                [last_id],
+            )
+            cursor.execute(self._insert_trigger_sql())
+
+    def uninstall(self, connection):
+        statements = []
+        if connection.vendor == 'postgresql':
+            statements = [f'DROP INDEX IF EXISTS {self.index_prefix}_{field}_trgm_idx' for field in self.fields]
+        elif connection.vendor == 'sqlite':
+            statements = [f'DROP TRIGGER IF EXISTS {name}' for name in self.trigger_names]
+            statements.append(f'DROP TABLE IF EXISTS {self.fts_table}')
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+
+def fts5_phrase(term):
+    """Quote ``term`` as a literal FTS5 phrase"""
+    return '"{}"'.format(term.replace('"', '""'))
@@ -0,0 +1,72 @@
+"""
+In-memory field change tracking for models.
+
+Signal receivers used to re-read a row in ``pre_save`` just to find out
+whether ``status`` changed. ``ChangeTrackingMixin`` instead keeps the
+values an instance was loaded with (snapshotted in ``from_db``) so the
+comparison costs nothing::
+
+    class Invoice(ChangeTrackingMixin, models.Model):
+        tracked_fields = ('status',)
+
+    invoice.has_changed('status')   # True once status differs from the DB
+    invoice.previous('status')      # the value it was loaded with
+
+The snapshot moves forward after every ``save()``, so receivers of
+``post_save`` still see the values from before the save. Instances that
+were never loaded from the database (new objects) have no previous
+values: ``previous()`` returns None and ``has_changed()`` is True.
+"""
+
+
+class ChangeTrackingMixin:
+    """Mixin for models; list the fields to watch in ``tracked_fields``"""
+
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._take_snapshot()
+        return instance
+
+    def _tracked_attnames(self):
+        return [self._meta.get_field(name).attname for name in self.tracked_fields]
+
+    def _take_snapshot(self, attnames=None):
+        snapshot = self.__dict__.setdefault('_loaded_values', {})
+        for attname in attnames or self._tracked_attnames():
+            # Deferred fields are not in __dict__ and stay untracked
+            if attname in self.__dict__:
+                snapshot[attname] = self.__dict__[attname]
+
+    def _loaded_value(self, field_name):
+        if field_name not in self.tracked_fields:
+            raise ValueError(f'{self.__class__.__name__}.{field_name} is not a tracked field')
+        return self._meta.get_field(field_name).attname, self.__dict__.get('_loaded_values', {})
+
+    def has_changed(self, field_name):
+        """Whether ``field_name`` differs from the value loaded from the database"""
+        attname, snapshot = self._loaded_value(field_name)
+        if attname not in snapshot:
+            return True
+        return getattr(self, attname) != snapshot[attname]
+
+    def previous(self, field_name):
+        """The value ``field_name`` had when loaded (or last saved); None if unknown"""
+        attname, snapshot = self._loaded_value(field_name)
+        return snapshot.get(attname)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self._take_snapshot()
+        else:
+            attnames = [self._meta.get_field(name).attname for name in update_fields if name in self.tracked_fields]
+            if attnames:
+                self._take_snapshot(attnames)
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._take_snapshot()
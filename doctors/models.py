@@ -91,3 +91,7 @@ class Doctor(models.Model):
         ordering = ['user__first_name', 'user__last_name']
         verbose_name = 'Doctor'
         verbose_name_plural = 'Doctors'
+        indexes = [
+            # The watermark order of manage.py extract (see core.extract)
+            models.Index(fields=['updated_at', 'id'], name='doctor_updated_at'),
+        ]
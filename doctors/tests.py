@@ -1,3 +1,70 @@
+from datetime import date, time
+
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from appointments.models import Appointment
+from appointments.schedule import ScheduleGrid, schedule_range
+from patients.tests import create_doctor, create_patient
+
+User = get_user_model()
+
+
+class ScheduleGridTests(TestCase):
+    """Test cases for the single-query schedule grids"""
+
+    def setUp(self):
+        self.patient = create_patient()
+        self.doctors = [create_doctor(username=f'dr.{index}', specialty='cardiology') for index in range(3)]
+        for doctor in self.doctors:
+            for day in (3, 4, 17):
+                Appointment.objects.create(
+                    patient=self.patient, doctor=doctor, appointment_date=date(2030, 3, day),
+                    appointment_time='10:30', chief_complaint='Checkup',
+                )
+        user = User.objects.create_user(username='reception', password='testpass123', role='receptionist')
+        self.client.force_login(user)
+
+    def test_schedule_range(self):
+        self.assertEqual(schedule_range('week', date(2030, 3, 6)), (date(2030, 3, 4), date(2030, 3, 10)))
+        self.assertEqual(schedule_range('month', date(2030, 2, 14)), (date(2030, 2, 1), date(2030, 2, 28)))
+
+    def test_grid_groups_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            grid = ScheduleGrid(self.doctors, *schedule_range('month', date(2030, 3, 1)))
+            rows = grid.doctor_rows()
+            weeks = grid.weeks()
+            for appointment in grid.appointments:
+                appointment.patient.get_full_name()
+                appointment.doctor.get_full_name()
+        self.assertEqual(len(queries), 1)
+
+        self.assertEqual(len(grid.days), 31)
+        self.assertEqual([len(cell) for cell in rows[0][1]].count(1), 3)
+        # March 2030 starts on a Friday
+        self.assertEqual(weeks[0][:4], [None] * 4)
+        self.assertEqual(weeks[0][4].date, date(2030, 3, 1))
+
+        week = ScheduleGrid(self.doctors[:1], *schedule_range('week', date(2030, 3, 4)))
+        row = dict(week.hour_rows())[time(10)]
+        self.assertEqual([len(cell) for cell in row], [1, 0, 0, 0, 0, 0, 0])
+
+    def test_schedule_views(self):
+        response = self.client.get(reverse('doctors:doctor_schedule', args=[self.doctors[0].pk]), {'date': '2030-03-04'})
+        self.assertEqual(response.context['weekly_appointments'], 1)
+        self.assertEqual(response.context['week_start'], date(2030, 3, 4))
+        for params in ({'view': 'month', 'date': '2030-03-04'}, {'mobile': '1', 'date': '2030-03-04'}):
+            response = self.client.get(reverse('doctors:doctor_schedule', args=[self.doctors[0].pk]), params)
+            self.assertContains(response, self.patient.get_full_name())
 
-# Create your tests here.
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('doctors:department_schedule'), {
+                'specialty': 'cardiology', 'view': 'month', 'date': '2030-03-01',
+            })
+        self.assertEqual(response.status_code, 200)
+        appointment_queries = [query for query in queries if 'appointments_appointment' in query['sql']]
+        self.assertEqual(len(appointment_queries), 1)
+        self.assertEqual(len(response.context['grid'].appointments), 9)
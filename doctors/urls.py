@@ -5,6 +5,7 @@ app_name = 'doctors'
 
 urlpatterns = [
     path('', views.doctor_list_view, name='doctor_list'),
+    path('schedule/', views.department_schedule_view, name='department_schedule'),
     path('add/', views.doctor_add_view, name='doctor_add'),
     path('<int:pk>/', views.doctor_detail_view, name='doctor_detail'),
     path('<int:pk>/edit/', views.doctor_edit_view, name='doctor_edit'),
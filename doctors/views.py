@@ -5,6 +5,7 @@ from django.core.paginator import Paginator
 from django.db.models import Q, Count
 from django.http import JsonResponse
 from django.urls import reverse
+from django.utils import timezone
 from .models import Doctor
 from accounts.models import User
 from appointments.models import Appointment
@@ -237,32 +238,54 @@ def doctor_edit_view(request, pk):
 
     return render(request, template_name, context)
 
+def get_schedule_params(request):
+    """The grid type (week or month) and anchor date requested in ``request.GET``"""
+    from appointments.schedule import SCHEDULE_VIEWS
+
+    view = request.GET.get('view', 'week')
+    if view not in SCHEDULE_VIEWS:
+        view = 'week'
+    try:
+        anchor = datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        anchor = timezone.localdate()
+    return view, anchor
+
+
 @login_required
 def doctor_schedule_view(request, pk):
-    """Doctor schedule view with weekly calendar"""
-    doctor = get_object_or_404(Doctor.objects.select_related('user'), pk=pk)
+    """Doctor schedule view with weekly or monthly calendar"""
+    from appointments.schedule import ScheduleGrid, adjacent_anchors, schedule_range
 
-    # Get current week appointments
-    today = datetime.now().date()
-    week_start = today - timedelta(days=today.weekday())
-    week_end = week_start + timedelta(days=6)
-
-    appointments = Appointment.objects.filter(
-        doctor=doctor,
-        appointment_date__range=[week_start, week_end]
-    ).select_related('patient').order_by('appointment_date', 'appointment_time')
+    doctor = get_object_or_404(Doctor.objects.select_related('user'), pk=pk)
+    view, anchor = get_schedule_params(request)
+    start_date, end_date = schedule_range(view, anchor)
+    previous_date, next_date = adjacent_anchors(view, start_date, end_date)
 
-    # Organize appointments by day
-    weekly_schedule = {}
-    for i in range(7):
-        day = week_start + timedelta(days=i)
-        weekly_schedule[day] = appointments.filter(appointment_date=day)
+    # One query for the whole range, grouped by day and hour in Python
+    grid = ScheduleGrid([doctor], start_date, end_date)
+    status_counts = grid.status_counts()
+    today = grid.day(timezone.localdate())
 
     context = {
         'doctor': doctor,
-        'weekly_schedule': weekly_schedule,
-        'week_start': week_start,
-        'week_end': week_end,
+        'grid': grid,
+        'view': view,
+        'week_start': start_date,
+        'week_end': end_date,
+        'previous_date': previous_date,
+        'next_date': next_date,
+        'weekly_schedule': {day.date: day.appointments for day in grid.days},
+        'week_schedule': grid.days,
+        'todays_appointments': today.appointments if today else [],
+        'weekly_appointments': len(grid.appointments),
+        'avg_daily_appointments': round(len(grid.appointments) / len(grid.days), 1),
+        'completed_this_week': status_counts['completed'],
+        'cancelled_this_week': status_counts['cancelled'],
+        'week_stats': {
+            'total_appointments': len(grid.appointments),
+            'available_slots': grid.free_slot_count(),
+        },
     }
 
     # Check if mobile version is requested
@@ -270,3 +293,31 @@ def doctor_schedule_view(request, pk):
     template_name = 'doctors/mobile_schedule.html' if is_mobile else 'doctors/schedule.html'
 
     return render(request, template_name, context)
+
+
+@login_required
+def department_schedule_view(request):
+    """Week or month schedule of every active doctor in a specialty"""
+    from appointments.schedule import ScheduleGrid, adjacent_anchors, schedule_range
+
+    specialty = request.GET.get('specialty', '')
+    view, anchor = get_schedule_params(request)
+    start_date, end_date = schedule_range(view, anchor)
+    previous_date, next_date = adjacent_anchors(view, start_date, end_date)
+
+    doctors = Doctor.objects.select_related('user').filter(is_active=True)
+    if specialty:
+        doctors = doctors.filter(specialty=specialty)
+    grid = ScheduleGrid(doctors, start_date, end_date)
+
+    context = {
+        'grid': grid,
+        'view': view,
+        'specialty': specialty,
+        'specialty_choices': Doctor.SPECIALTY_CHOICES,
+        'start_date': start_date,
+        'end_date': end_date,
+        'previous_date': previous_date,
+        'next_date': next_date,
+    }
+    return render(request, 'doctors/department_schedule.html', context)
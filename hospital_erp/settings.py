@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'rest_framework',
 
     # Local apps
+    'core',
     'accounts',
     'patients',
     'appointments',
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
     'billing',
     'pharmacy',
     'notifications',
+    'analytics',
 ]
 
 MIDDLEWARE = [
@@ -177,6 +179,51 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20
 }
 
+# Cache Configuration
+# Local-memory cache by default. For several worker processes point 'default'
+# at a shared backend (FileBasedCache, Redis, Memcached) so invalidation
+# reaches every worker.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'hospital-erp',
+    }
+}
+
+# Dashboard widget cache (see patients/cache.py)
+DASHBOARD_CACHE_ALIAS = 'default'
+DASHBOARD_CACHE_TTL = 300  # seconds
+
+# Notifications
+NOTIFICATION_BATCH_SIZE = 500  # rows per INSERT when fanning out to staff
+
+# Notification dispatch: 'deferred' queues NotificationJob rows for
+# `manage.py run_notification_worker`; 'immediate' fans out after commit
+# in the web process.
+NOTIFICATION_DISPATCH_MODE = 'deferred'
+NOTIFICATION_WORKER_BATCH_SIZE = 100
+NOTIFICATION_WORKER_THREADS = 4
+NOTIFICATION_JOB_MAX_ATTEMPTS = 5
+NOTIFICATION_JOB_STALE_SECONDS = 300  # reclaim jobs a dead worker left behind
+NOTIFICATION_JOB_RETENTION_DAYS = 7
+
+# Unread badge counters (see notifications/counters.py)
+NOTIFICATION_UNREAD_RECONCILE_SECONDS = 900  # worker rewrites all counters this often
+
+# Bulk extracts for reporting (see core/extract.py)
+EXTRACT_OUTPUT_DIR = BASE_DIR / 'extracts'
+EXTRACT_WORKERS = 4
+EXTRACT_LAG_SECONDS = 300  # runs stop this far behind now and re-read this far behind the watermark
+
+# Appointment slot grid and default length in minutes (see appointments/slots.py)
+APPOINTMENT_SLOT_MINUTES = 30
+# ('HH:MM', 'HH:MM') worked every day by doctors with no weekly schedule;
+# None leaves them bookable around the clock
+DOCTOR_DEFAULT_WORKING_HOURS = None
+
+# Daily KPI rollups (see analytics/rollups.py); days recomputed on every run
+ROLLUP_LOOKBACK_DAYS = 3
+
 # Ethiopian specific settings
 CURRENCY_CODE = 'ETB'
 CURRENCY_SYMBOL = 'Br'
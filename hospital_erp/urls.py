@@ -32,6 +32,7 @@ urlpatterns = [
     path('billing/', include('billing.urls')),
     path('pharmacy/', include('pharmacy.urls')),
     path('notifications/', include('notifications.urls')),
+    path('analytics/', include('analytics.urls')),
     path('api/', include('accounts.api_urls')),
 
     # Override admin logout to redirect to homepage
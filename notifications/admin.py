@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Notification, NotificationPreference
+from .models import Notification, NotificationPreference, NotificationJob
 
 
 @admin.register(Notification)
@@ -46,3 +46,11 @@ class NotificationPreferenceAdmin(admin.ModelAdmin):
             'fields': ('sms_appointments', 'sms_urgent_only')
         }),
     )
+
+
+@admin.register(NotificationJob)
+class NotificationJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'event', 'status', 'attempts', 'available_at', 'created_at', 'processed_at']
+    list_filter = ['status', 'event']
+    search_fields = ['event', 'last_error']
+    readonly_fields = ['created_at', 'processed_at', 'locked_at']
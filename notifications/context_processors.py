@@ -1,4 +1,4 @@
-from .models import Notification
+from .counters import get_unread_count
 
 
 def notification_context(request):
@@ -9,10 +9,7 @@ def notification_context(request):
     
     if request.user.is_authenticated:
         try:
-            context['unread_notifications_count'] = Notification.objects.filter(
-                recipient=request.user,
-                is_read=False
-            ).count()
+            context['unread_notifications_count'] = get_unread_count(request.user.pk)
         except:
             # In case notifications table doesn't exist yet
             context['unread_notifications_count'] = 0
@@ -0,0 +1,78 @@
+"""
+Per-user unread notification counters.
+
+The unread badge is rendered on every page, so instead of a COUNT per
+request the number is kept in ``UnreadCounter`` (one row per user, read by
+primary key) and adjusted with ``F()`` as notifications are created, read
+and deleted. The adjustments run in the same transaction as the change
+they count, so every web and worker process sees the same number and a
+rollback undoes both. A missing row is recomputed with one COUNT on the
+next read; bulk fan-out recounts the affected users in one UPDATE.
+``reconcile_unread_counts`` rewrites every counter from the notifications
+and is run periodically by the notification worker to correct any drift
+(e.g. rows changed with ``update()`` in the shell).
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Notification, UnreadCounter
+
+
+def count_unread(user_id):
+    """Unread notifications for ``user_id`` straight from the notifications"""
+    return Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+
+
+def _write_counts(counts):
+    UnreadCounter.objects.bulk_create(
+        [UnreadCounter(user_id=user_id, unread=count) for user_id, count in counts.items()],
+        update_conflicts=True, unique_fields=['user'], update_fields=['unread'], batch_size=1000,
+    )
+
+
+def get_unread_count(user_id):
+    """Stored unread count; recomputed only when the user has no counter yet"""
+    count = UnreadCounter.objects.filter(user_id=user_id).values_list('unread', flat=True).first()
+    if count is None:
+        count = count_unread(user_id)
+        UnreadCounter.objects.bulk_create([UnreadCounter(user_id=user_id, unread=count)], ignore_conflicts=True)
+    return count
+
+
+def adjust_unread_count(user_id, delta):
+    """Add ``delta`` to the user's counter (a user without one is counted on the next read)"""
+    UnreadCounter.objects.filter(user_id=user_id).update(unread=Greatest(F('unread') + delta, 0))
+
+
+def set_unread_count(user_id, count):
+    """Overwrite the user's counter"""
+    _write_counts({user_id: count})
+
+
+def refresh_unread_counts(user_ids):
+    """Recount the counters of ``user_ids`` from the notifications, in one UPDATE"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    unread = Notification.objects.filter(recipient_id=OuterRef('user_id'), is_read=False).order_by().values(
+        'recipient_id'
+    ).annotate(total=Count('id')).values('total')
+    UnreadCounter.objects.filter(user_id__in=user_ids).update(unread=Coalesce(Subquery(unread), 0))
+
+
+def reconcile_unread_counts(user_ids=None):
+    """Rewrite counters from one grouped COUNT; returns users refreshed"""
+    from django.contrib.auth import get_user_model
+
+    users = get_user_model().objects.all()
+    unread = Notification.objects.filter(is_read=False)
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+        unread = unread.filter(recipient_id__in=user_ids)
+    counts = dict.fromkeys(users.values_list('pk', flat=True), 0)
+
+    for row in unread.values('recipient_id').annotate(total=Count('id')).order_by():
+        counts[row['recipient_id']] = row['total']
+
+    _write_counts(counts)
+    return len(counts)
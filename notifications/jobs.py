@@ -0,0 +1,289 @@
+"""
+Deferred notification dispatch.
+
+Model signals only record *that* something happened: once the saving
+transaction commits, a ``NotificationJob`` row is queued and the request
+returns. ``manage.py run_notification_worker`` claims pending jobs in
+batches, runs the matching handler on a thread pool and records the
+outcome, so queued work survives worker restarts and failed jobs are
+retried with back-off.
+
+Set ``NOTIFICATION_DISPATCH_MODE = 'immediate'`` to run handlers right
+after commit in the saving process instead (useful without a worker).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from appointments.models import Appointment
+from billing.models import Invoice
+from patients.models import Patient
+from .models import Notification, NotificationJob
+from .services import notify_roles, notify_roles_each
+
+logger = logging.getLogger(__name__)
+
+EVENT_HANDLERS = {}
+
+
+def handles(event):
+    """Register a function as the handler for ``event``"""
+    def decorator(func):
+        EVENT_HANDLERS[event] = func
+        return func
+    return decorator
+
+
+def get_dispatch_mode():
+    return getattr(settings, 'NOTIFICATION_DISPATCH_MODE', 'deferred')
+
+
+def enqueue(event, **payload):
+    """Queue ``event`` for the worker once the current transaction commits"""
+    if event not in EVENT_HANDLERS:
+        raise ValueError(f'Unknown notification event: {event}')
+
+    if get_dispatch_mode() == 'immediate':
+        transaction.on_commit(lambda: EVENT_HANDLERS[event](payload))
+    else:
+        transaction.on_commit(lambda: NotificationJob.objects.create(event=event, payload=payload))
+
+
+def claim_jobs(batch_size, stale_after=None):
+    """
+    Lock up to ``batch_size`` runnable jobs and mark them as processing.
+
+    Jobs left in 'processing' for longer than ``stale_after`` (a worker
+    died mid-batch) are claimed again.
+    """
+    now = timezone.now()
+    stale_after = stale_after or timedelta(seconds=getattr(settings, 'NOTIFICATION_JOB_STALE_SECONDS', 300))
+
+    with transaction.atomic():
+        job_ids = list(
+            NotificationJob.objects.filter(
+                Q(status='pending', available_at__lte=now) |
+                Q(status='processing', locked_at__lt=now - stale_after)
+            ).order_by('id').select_for_update(skip_locked=True).values_list('id', flat=True)[:batch_size]
+        )
+        if not job_ids:
+            return []
+        NotificationJob.objects.filter(id__in=job_ids).update(
+            status='processing', locked_at=now, attempts=F('attempts') + 1
+        )
+
+    return list(NotificationJob.objects.filter(id__in=job_ids).order_by('id'))
+
+
+def process_job(job):
+    """Run one claimed job and record success, retry or failure"""
+    max_attempts = getattr(settings, 'NOTIFICATION_JOB_MAX_ATTEMPTS', 5)
+    try:
+        handler = EVENT_HANDLERS[job.event]
+        with transaction.atomic():
+            handler(job.payload)
+            NotificationJob.objects.filter(pk=job.pk).update(
+                status='done', processed_at=timezone.now(), last_error=''
+            )
+        return True
+    except Exception as e:
+        logger.error(f'Notification job {job.pk} ({job.event}) failed: {str(e)}', exc_info=True)
+        if job.attempts >= max_attempts:
+            NotificationJob.objects.filter(pk=job.pk).update(
+                status='failed', processed_at=timezone.now(), last_error=str(e)
+            )
+        else:
+            # Exponential back-off: 30s, 60s, 120s, ...
+            retry_at = timezone.now() + timedelta(seconds=30 * 2 ** (job.attempts - 1))
+            NotificationJob.objects.filter(pk=job.pk).update(
+                status='pending', available_at=retry_at, last_error=str(e)
+            )
+        return False
+
+
+def _process_job_in_thread(job):
+    try:
+        return process_job(job)
+    finally:
+        connection.close()
+
+
+def run_pending(batch_size=100, threads=1):
+    """Claim and process one batch; returns the number of jobs handled"""
+    jobs = claim_jobs(batch_size)
+    if not jobs:
+        return 0
+
+    if threads <= 1:
+        for job in jobs:
+            process_job(job)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(_process_job_in_thread, jobs))
+    return len(jobs)
+
+
+def purge_finished_jobs(older_than_days):
+    """Delete completed jobs older than the retention window"""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    deleted, _ = NotificationJob.objects.filter(status='done', processed_at__lt=cutoff).delete()
+    return deleted
+
+
+# Event handlers
+# Each handler re-reads the current state of the object so notifications
+# reflect what was committed, and quietly skips objects deleted meanwhile.
+
+@handles('appointment_created')
+def appointment_created(payload):
+    appointment = Appointment.objects.select_related('patient', 'doctor__user').filter(
+        pk=payload['appointment_id']
+    ).first()
+    if appointment is None:
+        return
+
+    # Notify doctor about new appointment
+    Notification.objects.create(
+        title="New Appointment Scheduled",
+        message=f"New appointment with {appointment.patient.get_full_name()} on {appointment.appointment_date} at {appointment.appointment_time}",
+        notification_type='appointment',
+        priority='normal',
+        recipient=appointment.doctor.user,
+        sender_id=appointment.created_by_id,
+        action_url=f"/appointments/{appointment.pk}/"
+    )
+
+    # Notify admin users about new appointment
+    notify_roles(
+        ['admin'],
+        title="New Appointment Created",
+        message=f"Appointment scheduled for {appointment.patient.get_full_name()} with Dr. {appointment.doctor.get_full_name()}",
+        notification_type='appointment',
+        priority='low',
+        sender_id=appointment.created_by_id,
+        action_url=f"/appointments/{appointment.pk}/"
+    )
+
+
+@handles('appointment_status_changed')
+def appointment_status_changed(payload):
+    appointment = Appointment.objects.select_related('patient', 'doctor__user').filter(
+        pk=payload['appointment_id']
+    ).first()
+    if appointment is None:
+        return
+
+    status = payload['status']
+    if status == 'cancelled':
+        # Notify doctor about cancellation
+        Notification.objects.create(
+            title="Appointment Cancelled",
+            message=f"Appointment with {appointment.patient.get_full_name()} on {appointment.appointment_date} has been cancelled",
+            notification_type='appointment',
+            priority='high',
+            recipient=appointment.doctor.user,
+            action_url=f"/appointments/{appointment.pk}/"
+        )
+    elif status == 'completed':
+        # Notify about completion
+        Notification.objects.create(
+            title="Appointment Completed",
+            message=f"Appointment with {appointment.patient.get_full_name()} has been completed",
+            notification_type='appointment',
+            priority='normal',
+            recipient=appointment.doctor.user,
+            action_url=f"/appointments/{appointment.pk}/"
+        )
+
+
+@handles('patients_imported')
+def patients_imported(payload):
+    # Imports skip the save signals and leave their search documents to the worker
+    from core.search import index_queryset
+
+    index_queryset('patient', Patient.objects.filter(patient_id__in=payload['patient_ids']))
+
+
+@handles('patient_registered')
+def patient_registered(payload):
+    patient = Patient.objects.filter(pk=payload['patient_id']).first()
+    if patient is None:
+        return
+
+    # Notify all doctors and admin users
+    notify_roles(
+        ['doctor', 'admin', 'nurse'],
+        title="New Patient Registered",
+        message=f"New patient {patient.get_full_name()} has been registered",
+        notification_type='patient',
+        priority='normal',
+        action_url=f"/patients/{patient.pk}/"
+    )
+
+
+@handles('invoice_created')
+def invoice_created(payload):
+    invoice = Invoice.objects.select_related('patient').filter(pk=payload['invoice_id']).first()
+    if invoice is None:
+        return
+
+    # Notify admin and billing staff about new invoice
+    notify_roles(
+        ['admin', 'receptionist'],
+        title="New Invoice Created",
+        message=f"Invoice {invoice.invoice_number} created for {invoice.patient.get_full_name()} - {invoice.total_amount} ETB",
+        notification_type='billing',
+        priority='normal',
+        action_url=f"/billing/{invoice.pk}/"
+    )
+
+
+@handles('invoice_status_changed')
+def invoice_status_changed(payload):
+    invoice = Invoice.objects.filter(pk=payload['invoice_id']).first()
+    if invoice is None:
+        return
+
+    status = payload['status']
+    if status == 'paid':
+        # Invoice fully paid
+        notify_roles(
+            ['admin', 'receptionist'],
+            title="Invoice Paid",
+            message=f"Invoice {invoice.invoice_number} has been fully paid - {invoice.total_amount} ETB",
+            notification_type='billing',
+            priority='normal',
+            action_url=f"/billing/{invoice.pk}/"
+        )
+    elif status == 'overdue':
+        # Invoice overdue
+        notify_roles(
+            ['admin', 'receptionist'],
+            title="Invoice Overdue",
+            message=f"Invoice {invoice.invoice_number} is overdue - {invoice.balance_due} ETB remaining",
+            notification_type='billing',
+            priority='high',
+            action_url=f"/billing/{invoice.pk}/"
+        )
+
+
+@handles('invoices_overdue')
+def invoices_overdue(payload):
+    # Queued by billing.overdue.sweep_overdue: one job for many invoices,
+    # read with one query and fanned out with one bulk insert
+    invoices = Invoice.objects.filter(pk__in=payload['invoice_ids'], status='overdue').order_by('pk')
+    notify_roles_each(['admin', 'receptionist'], [
+        dict(
+            title="Invoice Overdue",
+            message=f"Invoice {invoice.invoice_number} is overdue - {invoice.balance_due} ETB remaining",
+            notification_type='billing',
+            priority='high',
+            action_url=f"/billing/{invoice.pk}/",
+        )
+        for invoice in invoices
+    ])
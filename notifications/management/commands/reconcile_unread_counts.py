@@ -0,0 +1,14 @@
+"""
+Management command that rebuilds the unread notification counters
+"""
+from django.core.management.base import BaseCommand
+
+from notifications.counters import reconcile_unread_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute every user\'s unread notification count from the notifications'
+
+    def handle(self, *args, **options):
+        refreshed = reconcile_unread_counts()
+        self.stdout.write(self.style.SUCCESS(f'Refreshed unread counters for {refreshed} users'))
@@ -0,0 +1,71 @@
+"""
+Management command that fans out queued notification jobs
+"""
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from notifications.counters import reconcile_unread_counts
+from notifications.jobs import purge_finished_jobs, run_pending
+
+
+class Command(BaseCommand):
+    help = 'Process queued notification jobs (see notifications/jobs.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=getattr(settings, 'NOTIFICATION_WORKER_BATCH_SIZE', 100),
+            help='Jobs claimed per batch'
+        )
+        parser.add_argument(
+            '--threads', type=int,
+            default=getattr(settings, 'NOTIFICATION_WORKER_THREADS', 4),
+            help='Worker threads processing a batch'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=2.0,
+            help='Seconds to sleep when the queue is empty'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Drain the queue and exit instead of polling forever'
+        )
+
+    def handle(self, *args, **options):
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        retention_days = getattr(settings, 'NOTIFICATION_JOB_RETENTION_DAYS', 7)
+        reconcile_every = getattr(settings, 'NOTIFICATION_UNREAD_RECONCILE_SECONDS', 900)
+        last_reconciled = time.monotonic()
+        batch_size = options['batch_size']
+        threads = options['threads']
+        processed = 0
+
+        self.stdout.write(f'Notification worker started ({threads} threads, batch size {batch_size})')
+
+        while self.running:
+            handled = run_pending(batch_size=batch_size, threads=threads)
+            processed += handled
+
+            if handled:
+                continue
+            if options['once']:
+                break
+
+            # Queue is empty: tidy up old jobs, then wait for new ones
+            purge_finished_jobs(retention_days)
+            if time.monotonic() - last_reconciled >= reconcile_every:
+                reconcile_unread_counts()
+                last_reconciled = time.monotonic()
+            time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Notification worker stopped after {processed} jobs'))
+
+    def stop(self, signum, frame):
+        """Finish the current batch, then exit"""
+        self.running = False
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 07:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_notificationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='alert_key',
+            field=models.CharField(blank=True, db_index=True, help_text='Identifies recurring alerts (e.g. low_stock:42) so they are not duplicated', max_length=100),
+        ),
+    ]
@@ -30,7 +30,8 @@ class Notification(models.Model):
     priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='normal')
     
     # Recipients
-    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    # Indexed through notif_recipient_created_idx (see Meta.indexes)
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications', db_index=False)
     sender = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='sent_notifications')
     
     # Status
@@ -39,6 +40,10 @@ class Notification(models.Model):
     
     # Optional Links
     action_url = models.URLField(blank=True, help_text="URL to redirect when notification is clicked")
+    alert_key = models.CharField(
+        max_length=100, blank=True, db_index=True,
+        help_text="Identifies recurring alerts (e.g. low_stock:42) so they are not duplicated"
+    )
     
     # System Fields
     created_at = models.DateTimeField(auto_now_add=True)
@@ -47,9 +52,12 @@ class Notification(models.Model):
     def mark_as_read(self):
         """Mark notification as read"""
         if not self.is_read:
+            from .counters import adjust_unread_count
+
             self.is_read = True
             self.read_at = timezone.now()
             self.save()
+            adjust_unread_count(self.recipient_id, -1)
     
     def get_icon(self):
         """Get appropriate icon for notification type"""
@@ -77,11 +85,36 @@ class Notification(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Notification'
         verbose_name_plural = 'Notifications'
+        indexes = [
+            # Inbox and dropdown: a user's notifications, newest first
+            models.Index(fields=['recipient', '-created_at'], name='notif_recipient_created_idx'),
+            # Unread badge, unread filter and mark-all-as-read; read rows,
+            # the bulk of the table, are left out of the index
+            models.Index(
+                fields=['recipient', '-created_at'],
+                condition=models.Q(is_read=False),
+                name='notif_unread_recipient_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.recipient.username}"
 
 
+class UnreadCounter(models.Model):
+    """A user's unread notification count, kept in step by notifications.counters"""
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='unread_counter')
+    unread = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Unread Counter'
+        verbose_name_plural = 'Unread Counters'
+
+    def __str__(self):
+        return f"{self.unread} unread for user {self.user_id}"
+
+
 class NotificationPreference(models.Model):
     """User notification preferences"""
     
@@ -114,3 +147,38 @@ class NotificationPreference(models.Model):
     class Meta:
         verbose_name = 'Notification Preference'
         verbose_name_plural = 'Notification Preferences'
+
+
+class NotificationJob(models.Model):
+    """Queued notification event, fanned out by run_notification_worker"""
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    event = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+
+    # Retry bookkeeping
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Notification Job'
+        verbose_name_plural = 'Notification Jobs'
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='notif_job_status_avail_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} #{self.pk} ({self.status})"
@@ -0,0 +1,81 @@
+"""
+Notification fan-out helpers.
+
+Recipients are resolved with one ``values_list`` query and the
+notifications are written with ``bulk_create``, so notifying the whole
+staff costs a constant number of queries instead of one INSERT per user.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from .counters import refresh_unread_counts
+from .models import Notification
+
+User = get_user_model()
+
+
+def get_batch_size():
+    """Rows per INSERT statement when fanning out notifications"""
+    return getattr(settings, 'NOTIFICATION_BATCH_SIZE', 500)
+
+
+def recipients_with_roles(roles):
+    """IDs of every user holding one of ``roles``"""
+    return list(User.objects.filter(role__in=roles).values_list('id', flat=True))
+
+
+def _create_notifications(notifications):
+    """Bulk insert ``notifications`` and refresh their recipients' unread counters"""
+    if not notifications:
+        return []
+    created = Notification.objects.bulk_create(notifications, batch_size=get_batch_size())
+    # bulk_create sends no signals, so the counters are not bumped one by one
+    refresh_unread_counts(notification.recipient_id for notification in created)
+    return created
+
+
+def notify_users(recipient_ids, **fields):
+    """Create the same notification for each recipient in bulk"""
+    return _create_notifications([
+        Notification(recipient_id=recipient_id, **fields) for recipient_id in recipient_ids
+    ])
+
+
+def notify_roles(roles, **fields):
+    """Create the same notification for every user holding one of ``roles``"""
+    return notify_users(recipients_with_roles(roles), **fields)
+
+
+def notify_roles_each(roles, notifications):
+    """Create every notification in ``notifications`` (dicts of fields) for each user holding one of ``roles``"""
+    recipient_ids = recipients_with_roles(roles)
+    return _create_notifications([
+        Notification(recipient_id=recipient_id, **fields)
+        for fields in notifications
+        for recipient_id in recipient_ids
+    ])
+
+
+def sync_alerts(recipient_ids, alerts):
+    """
+    Make sure every recipient has an unread notification for each alert.
+
+    ``alerts`` maps an alert key (e.g. ``low_stock:42``) to the notification
+    fields. Existing unread (recipient, key) pairs are read in one query and
+    only the missing ones are bulk created.
+    """
+    recipient_ids = list(recipient_ids)
+    if not recipient_ids or not alerts:
+        return []
+
+    existing = set(
+        Notification.objects.filter(
+            recipient_id__in=recipient_ids, alert_key__in=list(alerts), is_read=False
+        ).values_list('recipient_id', 'alert_key')
+    )
+    return _create_notifications([
+        Notification(recipient_id=recipient_id, alert_key=key, **fields)
+        for key, fields in alerts.items()
+        for recipient_id in recipient_ids
+        if (recipient_id, key) not in existing
+    ])
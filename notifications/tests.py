@@ -0,0 +1,294 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from datetime import date, timedelta
+from django.utils import timezone
+from .models import Notification, NotificationJob, UnreadCounter
+from .counters import get_unread_count, reconcile_unread_counts
+from .jobs import run_pending
+from .services import notify_roles
+from .signals import check_expiring_medicines, check_low_stock_medicines
+from patients.models import Patient
+from pharmacy.models import Medicine
+
+User = get_user_model()
+
+
+def create_staff(count, role):
+    """Bulk-create ``count`` staff users holding ``role``"""
+    return User.objects.bulk_create([
+        User(username=f'{role}{index}', role=role) for index in range(count)
+    ])
+
+
+def register_patient(**kwargs):
+    defaults = {
+        'first_name': 'Abebe', 'last_name': 'Kebede', 'date_of_birth': date(1990, 5, 17),
+        'gender': 'M', 'kebele': '01', 'woreda': 'Bole', 'phone': '0912345678',
+        'emergency_contact_name': 'Almaz Kebede', 'emergency_contact_phone': '0911223344',
+        'emergency_contact_relationship': 'Sister',
+    }
+    defaults.update(kwargs)
+    return Patient.objects.create(**defaults)
+
+
+def create_medicine(name, **kwargs):
+    defaults = {
+        'name': name, 'manufacturer': 'EPHARM', 'category': 'antibiotic', 'form': 'tablet',
+        'strength': '500mg', 'stock_quantity': 100, 'minimum_stock_level': 20,
+        'unit_price': 10, 'cost_price': 8, 'expiry_date': date.today() + timedelta(days=365),
+    }
+    defaults.update(kwargs)
+    return Medicine.objects.create(**defaults)
+
+
+class NotificationFanOutTests(TestCase):
+    """Test cases for bulk notification fan-out"""
+
+    def test_notify_roles_targets_roles(self):
+        """Only users with the requested roles are notified"""
+        create_staff(3, 'doctor')
+        create_staff(2, 'pharmacist')
+
+        created = notify_roles(['doctor'], title='Test', message='Hello', notification_type='system')
+
+        self.assertEqual(len(created), 3)
+        self.assertEqual(Notification.objects.filter(recipient__role='doctor').count(), 3)
+        self.assertFalse(Notification.objects.filter(recipient__role='pharmacist').exists())
+
+    def test_registration_queries_do_not_grow_with_staff(self):
+        """Registering a patient costs the same queries for 5 or 50 staff"""
+        def registration_queries():
+            with CaptureQueriesContext(connection) as context:
+                with self.captureOnCommitCallbacks(execute=True):
+                    register_patient()
+            return len(context.captured_queries)
+
+        register_patient()  # create the patient ID sequence up front
+        create_staff(5, 'nurse')
+        small_staff = registration_queries()
+        create_staff(45, 'doctor')
+        large_staff = registration_queries()
+
+        self.assertEqual(small_staff, large_staff)
+        # Both queued registrations fan out to the 50 staff present now
+        self.assertEqual(run_pending(), 2)
+        self.assertEqual(Notification.objects.filter(notification_type='patient').count(), 2 * 50)
+
+
+class NotificationJobQueueTests(TestCase):
+    """Test cases for the deferred notification job queue"""
+
+    def setUp(self):
+        create_staff(3, 'doctor')
+
+    def test_save_only_queues_a_job(self):
+        """Saving a patient queues one job after commit and notifies nobody yet"""
+        with self.captureOnCommitCallbacks(execute=True):
+            patient = register_patient()
+
+        job = NotificationJob.objects.get()
+        self.assertEqual(job.event, 'patient_registered')
+        self.assertEqual(job.payload, {'patient_id': patient.pk})
+        self.assertFalse(Notification.objects.exists())
+
+        self.assertEqual(run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_no_job_without_commit(self):
+        """A rolled back save never queues work"""
+        register_patient()  # on_commit callbacks are discarded by TestCase
+        self.assertFalse(NotificationJob.objects.exists())
+
+    def test_failed_job_is_retried_later(self):
+        """A failing handler puts the job back with back-off"""
+        job = NotificationJob.objects.create(event='patient_registered', payload={})
+
+        run_pending()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'pending')
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('patient_id', job.last_error)
+        self.assertGreater(job.available_at, job.created_at)
+
+    def test_stale_processing_job_is_reclaimed(self):
+        """Jobs held by a worker that died are picked up again"""
+        with self.captureOnCommitCallbacks(execute=True):
+            register_patient()
+        NotificationJob.objects.update(status='processing', locked_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(Notification.objects.count(), 3)
+
+
+class PharmacyAlertTests(TestCase):
+    """Test cases for set-based low stock and expiry alerts"""
+
+    def setUp(self):
+        create_staff(2, 'pharmacist')
+        create_staff(1, 'admin')
+        create_staff(2, 'doctor')
+        self.low = create_medicine('Amoxicillin', stock_quantity=5)
+        self.expiring = create_medicine('Paracetamol', expiry_date=date.today() + timedelta(days=5))
+        create_medicine('Ibuprofen')
+
+    def test_low_stock_alerts_each_recipient_once(self):
+        """Pharmacists and admins get one alert per low stock medicine"""
+        created = check_low_stock_medicines()
+
+        self.assertEqual(len(created), 3)
+        self.assertEqual(
+            set(Notification.objects.values_list('alert_key', flat=True)), {f'low_stock:{self.low.pk}'}
+        )
+        self.assertFalse(Notification.objects.filter(recipient__role='doctor').exists())
+
+        self.assertEqual(check_low_stock_medicines(), [])
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_read_alert_is_raised_again(self):
+        """Only unread alerts suppress a new one"""
+        check_expiring_medicines()
+        alert = Notification.objects.filter(alert_key=f'expiring:{self.expiring.pk}').first()
+        alert.mark_as_read()
+
+        created = check_expiring_medicines()
+
+        self.assertEqual([n.recipient_id for n in created], [alert.recipient_id])
+        self.assertEqual(created[0].priority, 'high')
+
+    def test_queries_do_not_grow_with_medicines(self):
+        """Reconciliation costs the same queries for one or many medicines"""
+        with CaptureQueriesContext(connection) as few:
+            check_low_stock_medicines()
+        for index in range(10):
+            create_medicine(f'Low {index}', stock_quantity=1)
+        with CaptureQueriesContext(connection) as many:
+            check_low_stock_medicines()
+
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+        self.assertEqual(Notification.objects.count(), 3 * 11)
+
+
+class UnreadCounterTests(TestCase):
+    """Test cases for the stored unread notification counter"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='nurse', password='testpass123', role='nurse')
+
+    def notify(self, count=1):
+        return [
+            Notification.objects.create(title='Test', message='Hello', recipient=self.user)
+            for _ in range(count)
+        ]
+
+    def stored_count(self):
+        return UnreadCounter.objects.get(user=self.user).unread
+
+    def test_count_is_one_primary_key_lookup(self):
+        """Once the counter exists, reading it is one indexed lookup, not a COUNT"""
+        self.notify(2)
+        self.assertEqual(get_unread_count(self.user.pk), 2)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(get_unread_count(self.user.pk), 2)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT(', queries[0]['sql'].upper())
+
+    def test_counter_follows_create_read_and_delete(self):
+        """Creating, reading and deleting adjust the stored counter"""
+        get_unread_count(self.user.pk)
+        first, second, third = self.notify(3)
+        self.assertEqual(self.stored_count(), 3)
+
+        first.mark_as_read()
+        second.delete()
+        first.delete()  # already read, counter unchanged
+        self.assertEqual(self.stored_count(), 1)
+
+    def test_rolled_back_notification_is_not_counted(self):
+        get_unread_count(self.user.pk)
+        try:
+            with transaction.atomic():
+                self.notify()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(self.stored_count(), 0)
+
+    def test_views_keep_counter_in_step(self):
+        """mark_all_as_read and delete_notification update the badge"""
+        self.client.login(username='nurse', password='testpass123')
+        notifications = self.notify(3)
+        get_unread_count(self.user.pk)
+
+        self.client.post(f'/notifications/delete/{notifications[0].pk}/')
+        self.assertEqual(get_unread_count(self.user.pk), 2)
+
+        self.client.post('/notifications/mark-all-read/')
+        self.assertEqual(get_unread_count(self.user.pk), 0)
+
+    def test_bulk_fan_out_and_reconcile(self):
+        """Bulk fan-out recounts the recipients and reconcile rewrites every counter"""
+        self.assertEqual(get_unread_count(self.user.pk), 0)
+        notify_roles(['nurse'], title='Test', message='Hello')
+        self.assertEqual(self.stored_count(), 1)
+
+        Notification.objects.update(is_read=True)  # bypasses every hook
+        self.assertEqual(reconcile_unread_counts(), 1)
+        self.assertEqual(get_unread_count(self.user.pk), 0)
+
+
+class StatusChangeNotificationTests(TestCase):
+    """Test cases for status change notifications without re-reading the row"""
+
+    def setUp(self):
+        from patients.tests import create_doctor
+        from appointments.models import Appointment
+        from billing.models import Invoice
+
+        patient = register_patient()
+        Appointment.objects.create(
+            patient=patient, doctor=create_doctor(), appointment_date=date(2025, 3, 1),
+            appointment_time='09:00', chief_complaint='Headache',
+        )
+        Invoice.objects.create(patient=patient, issue_date=date(2025, 3, 1), due_date=date(2025, 3, 31))
+        self.appointment = Appointment.objects.get()
+        self.invoice = Invoice.objects.get()
+
+    def save_queries(self, instance, status):
+        instance.status = status
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                instance.save()
+        return [query['sql'] for query in context.captured_queries], callbacks
+
+    def test_appointment_status_update_is_one_update(self):
+        queries, callbacks = self.save_queries(self.appointment, 'completed')
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0].startswith('UPDATE'))
+
+        for callback in callbacks:
+            callback()
+        job = NotificationJob.objects.get(event='appointment_status_changed')
+        self.assertEqual(job.payload['status'], 'completed')
+
+    def test_invoice_status_update_is_one_update(self):
+        queries, callbacks = self.save_queries(self.invoice, 'paid')
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0].startswith('UPDATE'))
+
+        for callback in callbacks:
+            callback()
+        self.assertTrue(NotificationJob.objects.filter(event='invoice_status_changed').exists())
+
+    def test_unchanged_status_queues_nothing(self):
+        """Saving other fields, or saving twice, does not repeat the notification"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.invoice.status = 'paid'
+            self.invoice.save()
+            self.invoice.notes = 'Paid at the counter'
+            self.invoice.save()
+        self.assertEqual(NotificationJob.objects.filter(event='invoice_status_changed').count(), 1)
@@ -7,6 +7,7 @@ urlpatterns = [
     path('', views.notification_list, name='notification_list'),
     path('debug/', views.notification_list_debug, name='notification_list_debug'),
     path('dropdown/', views.notification_dropdown, name='notification_dropdown'),
+    path('api/feed/', views.notification_feed_api, name='notification_feed_api'),
     path('mark-read/<int:pk>/', views.mark_as_read, name='mark_as_read'),
     path('mark-all-read/', views.mark_all_as_read, name='mark_all_as_read'),
     path('delete/<int:pk>/', views.delete_notification, name='delete_notification'),
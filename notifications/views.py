@@ -2,9 +2,10 @@ from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
-from django.core.paginator import Paginator
-from django.db.models import Q
+from django.db.models import Case, IntegerField, Q, Value, When
+from core.pagination import KeysetPaginator
 from .models import Notification, NotificationPreference
+from .counters import get_unread_count, set_unread_count
 
 
 @login_required
@@ -43,13 +44,14 @@ def notification_list(request):
         notifications = notifications.order_by('created_at')
     elif sort_by == 'priority':
         # Custom ordering for priority: urgent, high, normal, low
-       priority_order = ['urgent', 'high', 'normal', 'low']
+        priority_order = ['urgent', 'high', 'normal', 'low']
 
-       case_statement = " ".join([f"WHEN '{p}' THEN {i}" for i, p in enumerate(priority_order)])
-
-       notifications = notifications.extra(
-        select={'priority_order': f"CASE priority {case_statement} END"}
-       ).order_by('priority_order', '-created_at')
+        notifications = notifications.annotate(
+            priority_order=Case(
+                *[When(priority=p, then=Value(i)) for i, p in enumerate(priority_order)],
+                output_field=IntegerField(),
+            )
+        ).order_by('priority_order', '-created_at')
 
     elif sort_by == 'type':
         notifications = notifications.order_by('notification_type', '-created_at')
@@ -58,10 +60,8 @@ def notification_list(request):
     else:  # default: date_desc
         notifications = notifications.order_by('-created_at')
 
-    # Pagination
-    paginator = Paginator(notifications, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination on the chosen ordering
+    page_obj = KeysetPaginator(notifications, 20).get_page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
@@ -72,7 +72,7 @@ def notification_list(request):
         'sort_by': sort_by,
         'notification_types': Notification.NOTIFICATION_TYPES,
         'priority_choices': Notification.PRIORITY_CHOICES,
-        'unread_count': Notification.objects.filter(recipient=request.user, is_read=False).count(),
+        'unread_count': get_unread_count(request.user.pk),
     }
 
     # Check if mobile version is requested
@@ -89,10 +89,7 @@ def notification_dropdown(request):
         recipient=request.user
     ).order_by('-created_at')[:10]
     
-    unread_count = Notification.objects.filter(
-        recipient=request.user, 
-        is_read=False
-    ).count()
+    unread_count = get_unread_count(request.user.pk)
     
     context = {
         'notifications': notifications,
@@ -101,6 +98,39 @@ def notification_dropdown(request):
     return render(request, 'notifications/dropdown.html', context)
 
 
+@login_required
+def notification_feed_api(request):
+    """JSON feed of the user's notifications with cursor pagination"""
+    notifications = Notification.objects.filter(recipient=request.user)
+    if request.GET.get('status') == 'unread':
+        notifications = notifications.filter(is_read=False)
+
+    try:
+        per_page = min(max(int(request.GET.get('per_page', 20)), 1), 100)
+    except ValueError:
+        per_page = 20
+
+    page_obj = KeysetPaginator(notifications.order_by('-created_at'), per_page).get_page(request.GET.get('cursor'))
+
+    return JsonResponse({
+        'success': True,
+        'notifications': [
+            {
+                'id': notification.pk,
+                'title': notification.title,
+                'message': notification.message,
+                'type': notification.notification_type,
+                'priority': notification.priority,
+                'is_read': notification.is_read,
+                'action_url': notification.action_url,
+                'created_at': notification.created_at.isoformat(),
+            }
+            for notification in page_obj
+        ],
+        **page_obj.as_dict(),
+    })
+
+
 @login_required
 @require_POST
 def mark_as_read(request, pk):
@@ -122,6 +152,7 @@ def mark_all_as_read(request):
         recipient=request.user,
         is_read=False
     ).update(is_read=True)
+    set_unread_count(request.user.pk, 0)
 
     return JsonResponse({
         'success': True,
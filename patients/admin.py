@@ -1,10 +1,29 @@
-from django.contrib import admin
+import csv
+import io
+
+from django import forms
+from django.contrib import admin, messages
+from django.http import HttpResponse
+from django.shortcuts import redirect, render
+from django.urls import path
+from .importer import IMPORT_FORMATS, PatientImporter, detect_format, read_rows
 from .models import Patient
 
+
+class PatientImportForm(forms.Form):
+    """Upload form for the bulk patient import"""
+
+    file = forms.FileField(help_text="CSV with a header row of patient field names, or JSON Lines")
+    file_format = forms.ChoiceField(
+        choices=[('', 'Detect from file name')] + [(name, name.upper()) for name in IMPORT_FORMATS],
+        required=False,
+    )
+
 @admin.register(Patient)
 class PatientAdmin(admin.ModelAdmin):
     """Patient admin interface"""
 
+    change_list_template = 'admin/patients/patient/change_list.html'
     list_display = ('patient_id', 'first_name', 'last_name', 'phone', 'city', 'get_age', 'created_at')
     list_filter = ('gender', 'blood_type', 'city', 'region', 'is_active', 'created_at')
     search_fields = ('patient_id', 'first_name', 'last_name', 'phone', 'email', 'kebele', 'woreda')
@@ -36,3 +55,36 @@ class PatientAdmin(admin.ModelAdmin):
     def get_age(self, obj):
         return obj.get_age()
     get_age.short_description = 'Age'
+
+    def get_urls(self):
+        urls = [
+            path('import/', self.admin_site.admin_view(self.import_view), name='patients_patient_import'),
+        ]
+        return urls + super().get_urls()
+
+    def import_view(self, request):
+        """Bulk import patients from an uploaded CSV or JSONL file"""
+        if not self.has_add_permission(request):
+            return HttpResponse(status=403)
+
+        form = PatientImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            file_format = form.cleaned_data['file_format'] or detect_format(upload.name)
+            report = io.StringIO()
+            source = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            result = PatientImporter(rejected_writer=csv.writer(report)).run(read_rows(source, file_format))
+
+            if result.rejected:
+                # Hand back the rejected rows so they can be fixed and re-uploaded
+                messages.warning(request, f'Imported {result.created} patients; {result.rejected} rows rejected.')
+                response = HttpResponse(report.getvalue(), content_type='text/csv')
+                response['Content-Disposition'] = 'attachment; filename="rejected_patients.csv"'
+                return response
+            messages.success(request, f'Imported {result.created} patients.')
+            return redirect('admin:patients_patient_changelist')
+
+        return render(request, 'admin/patients/patient/import.html', {
+            **self.admin_site.each_context(request), 'opts': self.model._meta, 'form': form,
+            'title': 'Import patients',
+        })
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class PatientsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'patients'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from .signals import connect_dashboard_cache_signals, ensure_search_index
+        connect_dashboard_cache_signals()
+        post_migrate.connect(ensure_search_index, sender=self)
@@ -0,0 +1,87 @@
+"""
+Cache layer for dashboard widgets.
+
+Each widget result is stored under a key bucketed by the local date, so
+"today" and "this month" figures roll over on their own, and is dropped
+as soon as one of the models it is built from is saved or deleted.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+# Models each cached widget is computed from. A save or delete on any of
+# them invalidates the widget (see patients.signals).
+WIDGET_DEPENDENCIES = {
+    'dashboard_stats': (
+        'patients.Patient',
+        'doctors.Doctor',
+        'pharmacy.Medicine',
+        'appointments.Appointment',
+        'billing.Invoice',
+    ),
+    'patient_trends': ('patients.Patient',),
+    'patient_demographics': ('patients.Patient',),
+    'appointments_by_doctor': ('appointments.Appointment', 'doctors.Doctor'),
+    'revenue_breakdown': ('billing.Invoice', 'appointments.Appointment'),
+}
+
+
+def get_dashboard_cache():
+    """Cache backend used for dashboard widgets (pluggable via settings)"""
+    return caches[getattr(settings, 'DASHBOARD_CACHE_ALIAS', 'default')]
+
+
+def get_dashboard_cache_ttl():
+    return getattr(settings, 'DASHBOARD_CACHE_TTL', 300)
+
+
+def widget_cache_key(name, day=None):
+    """Cache key for a widget in the given (default: current) date bucket"""
+    day = day or timezone.localdate()
+    return f'dashboard:{name}:{day.isoformat()}'
+
+
+def cached_widget(name):
+    """
+    Cache the result of a zero-argument dashboard widget function.
+
+    The undecorated function stays reachable as ``func.uncached``.
+    """
+    if name not in WIDGET_DEPENDENCIES:
+        raise ValueError(f'Unknown dashboard widget: {name}')
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper():
+            return get_dashboard_cache().get_or_set(
+                widget_cache_key(name), func, get_dashboard_cache_ttl()
+            )
+
+        wrapper.uncached = func
+        return wrapper
+
+    return decorator
+
+
+def invalidate_widgets(names):
+    """Drop the current bucket of the given widgets"""
+    get_dashboard_cache().delete_many([widget_cache_key(name) for name in names])
+
+
+def widgets_for_model(label):
+    """Widgets that depend on a model given as 'app_label.ModelName'"""
+    return [name for name, models in WIDGET_DEPENDENCIES.items() if label in models]
+
+
+def invalidate_for_model(label):
+    """
+    Invalidate every widget built from ``label`` once the current
+    transaction commits, so a concurrent reader cannot re-cache the
+    pre-commit state.
+    """
+    names = widgets_for_model(label)
+    if names:
+        transaction.on_commit(lambda: invalidate_widgets(names))
@@ -0,0 +1,204 @@
+"""
+Bulk patient import from CSV or JSON Lines.
+
+Registering patients one ``save()`` at a time costs a sequence update, the
+staff notification fan-out, cache invalidation and a search index refresh
+per row. ``import_patients`` streams the file instead and, per chunk:
+
+* validates every row with the model fields' own ``clean()`` (choices,
+  lengths, the phone ``RegexValidator``, dates), without touching the
+  database;
+* reserves one block of patient IDs for the valid rows;
+* inserts them in one statement without building model instances:
+  ``COPY`` on PostgreSQL, a prepared ``executemany`` INSERT elsewhere
+  (with the SQLite patient search table filled by one INSERT ... SELECT
+  instead of a trigger per row, see ``TrigramTextIndex.bulk_insert``);
+* queues one ``patients_imported`` job that builds their global search
+  documents in the background (see notifications.jobs), so the import
+  does not wait for the index.
+
+Rows that fail validation are written to a rejected-rows CSV report with
+the line they came from and the reasons. No per-patient registration
+notifications are sent for imported patients.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.sequences import reserve_identifiers
+from .models import Patient
+from .search import PATIENT_INDEX
+
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_FORMATS = ('csv', 'jsonl')
+# Field types whose cleaned values are passed to the database as they are
+TEXT_FIELD_TYPES = ('CharField', 'TextField', 'EmailField')
+# Columns read from the file; patient_id is always allocated by the ERP
+IMPORT_FIELDS = [
+    'first_name', 'last_name', 'date_of_birth', 'gender', 'blood_type',
+    'kebele', 'woreda', 'city', 'region', 'phone', 'email',
+    'emergency_contact_name', 'emergency_contact_phone', 'emergency_contact_relationship',
+    'medical_history', 'allergies', 'current_medications',
+]
+
+
+def detect_format(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def read_rows(stream, file_format):
+    """Yield ``(line_number, row_dict)`` from a text stream"""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif file_format == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except ValueError as exc:
+                    row = {'_error': f'Invalid JSON: {exc}'}
+                yield line_number, row if isinstance(row, dict) else {'_error': 'Expected a JSON object'}
+    else:
+        raise ValueError(f'Unknown import format: {file_format}')
+
+
+@dataclass
+class ImportResult:
+    """Outcome of an import run"""
+
+    created: int = 0
+    rejected: int = 0
+    rejected_rows: list = field(default_factory=list)
+
+
+class PatientImporter:
+    """
+    Validates and inserts patients chunk by chunk.
+
+    ``rejected_writer`` is an optional ``csv.writer`` receiving one row per
+    rejected input row (line, errors, original values); the first
+    ``keep_rejected`` rejections are also kept on the result for display.
+    """
+
+    def __init__(self, chunk_size=IMPORT_CHUNK_SIZE, rejected_writer=None, keep_rejected=20):
+        self.chunk_size = chunk_size
+        self.rejected_writer = rejected_writer
+        self.keep_rejected = keep_rejected
+        self.fields = [Patient._meta.get_field(name) for name in IMPORT_FIELDS]
+        # clean_row() leaves out empty fields that have a default
+        self.defaults = {
+            model_field.attname: model_field.get_default() for model_field in self.fields if model_field.has_default()
+        }
+        # Dates and the like go through the field's database conversion; text goes as is
+        self.converted_fields = [
+            model_field for model_field in self.fields if model_field.get_internal_type() not in TEXT_FIELD_TYPES
+        ]
+        if rejected_writer is not None:
+            rejected_writer.writerow(['line', 'errors'] + IMPORT_FIELDS)
+
+    def clean_row(self, row):
+        """Model-field validated values of ``row``; raises ValidationError"""
+        if '_error' in row:
+            raise ValidationError({'row': [row['_error']]})
+        values, errors = {}, {}
+        for model_field in self.fields:
+            raw = row.get(model_field.name)
+            if raw is None or (isinstance(raw, str) and not raw.strip()):
+                if model_field.has_default():
+                    continue
+                if model_field.blank:
+                    # Nothing to validate in an empty optional text field
+                    values[model_field.attname] = ''
+                    continue
+                raw = ''
+            elif isinstance(raw, str):
+                raw = raw.strip()
+            try:
+                values[model_field.attname] = model_field.clean(raw, None)
+            except ValidationError as exc:
+                errors[model_field.name] = exc.messages
+        if errors:
+            raise ValidationError(errors)
+        return values
+
+    def reject(self, result, line_number, row, error):
+        messages = '; '.join(
+            f"{name}: {' '.join(messages)}" for name, messages in error.message_dict.items()
+        )
+        result.rejected += 1
+        if len(result.rejected_rows) < self.keep_rejected:
+            result.rejected_rows.append((line_number, messages))
+        if self.rejected_writer is not None:
+            self.rejected_writer.writerow([line_number, messages] + [row.get(name, '') for name in IMPORT_FIELDS])
+
+    def _system_values(self, now):
+        """Database values of the columns not read from the file (except patient_id)"""
+        values = {}
+        for model_field in Patient._meta.concrete_fields:
+            if model_field.primary_key or model_field.name in IMPORT_FIELDS or model_field.name == 'patient_id':
+                continue
+            if getattr(model_field, 'auto_now', False) or getattr(model_field, 'auto_now_add', False):
+                value = now
+            else:
+                value = model_field.get_default()
+            values[model_field.attname] = model_field.get_db_prep_save(value, connection)
+        return values
+
+    def insert(self, rows):
+        """Give ``rows`` (cleaned values) IDs from one reserved block and insert them in one statement"""
+        from notifications.jobs import enqueue
+
+        now = timezone.now()
+        identifiers = reserve_identifiers(f'PAT{now.year}', Patient, 'patient_id', len(rows))
+        shared = {**self.defaults, **self._system_values(now)}
+        fields = [model_field for model_field in Patient._meta.concrete_fields if not model_field.primary_key]
+        records = []
+        for values, patient_id in zip(rows, identifiers):
+            values = {**shared, **values, 'patient_id': patient_id}
+            for model_field in self.converted_fields:
+                values[model_field.attname] = model_field.get_db_prep_save(values[model_field.attname], connection)
+            records.append([values[model_field.attname] for model_field in fields])
+
+        table = connection.ops.quote_name(Patient._meta.db_table)
+        column_list = ', '.join(connection.ops.quote_name(model_field.column) for model_field in fields)
+        with transaction.atomic(), PATIENT_INDEX.bulk_insert(connection), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql' and hasattr(cursor, 'copy_expert'):
+                buffer = io.StringIO()
+                # Every column is NOT NULL, so quote everything: "" is an empty string
+                csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(records)
+                buffer.seek(0)
+                cursor.copy_expert(f'COPY {table} ({column_list}) FROM STDIN WITH (FORMAT csv)', buffer)
+            else:
+                placeholders = ', '.join(['%s'] * len(fields))
+                cursor.executemany(f'INSERT INTO {table} ({column_list}) VALUES ({placeholders})', records)
+            enqueue('patients_imported', patient_ids=identifiers)
+
+    def run(self, rows):
+        """Import ``(line_number, row_dict)`` pairs; returns an ImportResult"""
+        from .cache import invalidate_for_model
+
+        result = ImportResult()
+        batch = []
+        for line_number, row in rows:
+            try:
+                batch.append(self.clean_row(row))
+            except ValidationError as exc:
+                self.reject(result, line_number, row, exc)
+            if len(batch) >= self.chunk_size:
+                self.insert(batch)
+                result.created += len(batch)
+                batch = []
+        if batch:
+            self.insert(batch)
+            result.created += len(batch)
+
+        if result.created:
+            invalidate_for_model('patients.Patient')
+        return result
@@ -0,0 +1,44 @@
+"""
+Management command that bulk-imports patients from a CSV or JSON Lines file
+"""
+import csv
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from patients.importer import IMPORT_CHUNK_SIZE, IMPORT_FORMATS, PatientImporter, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import patients from a CSV or JSONL file; invalid rows go to a rejected-rows report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or JSONL file of patients')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='File format (default: from the extension)')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help='Patients inserted per batch')
+        parser.add_argument('--rejected', help='Where to write rejected rows (default: <path>.rejected.csv)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or detect_format(path)
+        rejected_path = options['rejected'] or f'{path}.rejected.csv'
+
+        started = time.perf_counter()
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as source, \
+                    open(rejected_path, 'w', encoding='utf-8', newline='') as rejected:
+                importer = PatientImporter(chunk_size=options['chunk_size'], rejected_writer=csv.writer(rejected))
+                result = importer.run(read_rows(source, file_format))
+        except OSError as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.created} patients in {elapsed:.1f}s '
+            f'({result.created / elapsed if elapsed else 0:,.0f} rows/s)'
+        ))
+        if result.rejected:
+            self.stdout.write(self.style.WARNING(f'Rejected {result.rejected} rows, see {rejected_path}'))
+        else:
+            os.remove(rejected_path)
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+# Frozen copy of what patients.search.PATIENT_INDEX installs today; later
+# changes to core.text_index must not change what this migration did.
+FIELDS = ('first_name', 'last_name', 'patient_id', 'phone', 'email')
+COLUMNS = ', '.join(FIELDS)
+NEW = ', '.join(f'new.{field}' for field in FIELDS)
+OLD = ', '.join(f'old.{field}' for field in FIELDS)
+FTS = 'patients_patient_fts'
+
+INSERT_NEW = f'INSERT INTO {FTS}(rowid, {COLUMNS}) VALUES (new.id, {NEW});'
+DELETE_OLD = f"INSERT INTO {FTS}({FTS}, rowid, {COLUMNS}) VALUES ('delete', old.id, {OLD});"
+
+SQLITE_INSTALL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS} USING fts5("
+    f"{COLUMNS}, content='patients_patient', content_rowid='id', tokenize='trigram')",
+    f'CREATE TRIGGER IF NOT EXISTS {FTS}_insert AFTER INSERT ON patients_patient BEGIN {INSERT_NEW} END',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS}_delete AFTER DELETE ON patients_patient BEGIN {DELETE_OLD} END',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS}_update AFTER UPDATE ON patients_patient BEGIN {DELETE_OLD} {INSERT_NEW} END',
+    f"INSERT INTO {FTS}({FTS}) VALUES ('rebuild')",
+]
+SQLITE_UNINSTALL = [f'DROP TRIGGER IF EXISTS {FTS}_{action}' for action in ('insert', 'delete', 'update')] + [
+    f'DROP TABLE IF EXISTS {FTS}',
+]
+POSTGRES_INSTALL = ['CREATE EXTENSION IF NOT EXISTS pg_trgm'] + [
+    f'CREATE INDEX IF NOT EXISTS patient_{field}_trgm_idx ON patients_patient USING gin ({field} gin_trgm_ops)'
+    for field in FIELDS
+]
+POSTGRES_UNINSTALL = [f'DROP INDEX IF EXISTS patient_{field}_trgm_idx' for field in FIELDS]
+
+
+def run(statements_by_vendor):
+    def operation(apps, schema_editor):
+        statements = statements_by_vendor.get(schema_editor.connection.vendor, [])
+        with schema_editor.connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+    """pg_trgm GIN indexes on PostgreSQL, an FTS5 shadow table on SQLite"""
+
+    dependencies = [
+        ('patients', '0002_patient_date_of_birth_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'postgresql': POSTGRES_INSTALL, 'sqlite': SQLITE_INSTALL}),
+            run({'postgresql': POSTGRES_UNINSTALL, 'sqlite': SQLITE_UNINSTALL}),
+        ),
+    ]
@@ -1,8 +1,10 @@
 from django.db import models
 from django.core.validators import RegexValidator
 from django.utils import timezone
+from core.sequences import next_identifier
+from core.tracking import ChangeTrackingMixin
 
-class Patient(models.Model):
+class Patient(ChangeTrackingMixin, models.Model):
     """Patient model with Ethiopian-specific fields"""
 
     GENDER_CHOICES = [
@@ -11,6 +13,9 @@ class Patient(models.Model):
         ('O', 'Other'),
     ]
 
+    # Fields of the patient's and its appointments' search documents (see core.search)
+    tracked_fields = ('first_name', 'last_name', 'patient_id', 'phone', 'email')
+
     BLOOD_TYPE_CHOICES = [
         ('A+', 'A+'),
         ('A-', 'A-'),
@@ -26,7 +31,7 @@ class Patient(models.Model):
     patient_id = models.CharField(max_length=20, unique=True, editable=False)
     first_name = models.CharField(max_length=50)
     last_name = models.CharField(max_length=50)
-    date_of_birth = models.DateField()
+    date_of_birth = models.DateField(db_index=True)
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES)
     blood_type = models.CharField(max_length=3, choices=BLOOD_TYPE_CHOICES, blank=True)
 
@@ -63,17 +68,7 @@ class Patient(models.Model):
         if not self.patient_id:
             # Generate patient ID: PAT + year + sequential number
             year = timezone.now().year
-            last_patient = Patient.objects.filter(
-                patient_id__startswith=f'PAT{year}'
-            ).order_by('patient_id').last()
-
-            if last_patient:
-                last_number = int(last_patient.patient_id[-4:])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-
-            self.patient_id = f'PAT{year}{new_number:04d}'
+            self.patient_id = next_identifier(f'PAT{year}', Patient, 'patient_id')
 
         super().save(*args, **kwargs)
 
@@ -93,3 +88,7 @@ class Patient(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Patient'
         verbose_name_plural = 'Patients'
+        indexes = [
+            # The watermark order of manage.py extract (see core.extract)
+            models.Index(fields=['updated_at', 'id'], name='patient_updated_at'),
+        ]
@@ -0,0 +1,181 @@
+"""
+Indexed patient lookup by name, patient ID, phone and email.
+
+``icontains`` across five columns is a sequential scan with a
+leading-wildcard LIKE, repeated on every keystroke at reception.
+``PatientSearch`` hides two index-backed implementations:
+
+* PostgreSQL: ``pg_trgm`` GIN indexes on each searched column. Substring
+  matches are plain ``ILIKE`` (``core.text_index.ILikeContains``) so the
+  indexes answer them, and results are ranked by trigram similarity.
+* SQLite: an FTS5 trigram table shadowing ``patients_patient``. Results
+  are ranked by bm25.
+
+Both indexes are managed by ``core.text_index.TrigramTextIndex``. Ranking
+happens in the query itself (``ORDER BY rank LIMIT n``), so every match is
+considered, not just the first few; ``explain()`` shows the plan.
+
+Terms shorter than three characters cannot use a trigram index (nor can
+the ``UPPER(col) LIKE`` of ``istartswith``), so they only narrow a query
+that also has a longer term; a query made only of short terms matches
+nothing, like a keystroke too early in a typeahead. Queries shaped like a
+patient ID (PAT2025...) are a range scan on the unique patient_id index
+instead.
+"""
+import re
+
+from django.db import connection as default_connection
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+from core.text_index import ILikeContains, TrigramTextIndex, fts5_phrase
+from .models import Patient
+
+SEARCH_FIELDS = ('first_name', 'last_name', 'patient_id', 'phone', 'email')
+MIN_TRIGRAM_LENGTH = 3
+PATIENT_ID_PATTERN = re.compile(r'^PAT\d{3,}$', re.IGNORECASE)
+
+PATIENT_INDEX = TrigramTextIndex('patients_patient', SEARCH_FIELDS, 'patient')
+FTS_TABLE = PATIENT_INDEX.fts_table
+
+
+def install_search_index(connection):
+    """Create the patient search index if it is missing (see core.text_index)"""
+    PATIENT_INDEX.install(connection)
+
+
+def uninstall_search_index(connection):
+    PATIENT_INDEX.uninstall(connection)
+
+
+def split_terms(query):
+    return [term for term in re.split(r'\s+', query.strip()) if term]
+
+
+class PatientSearch:
+    """
+    Ranked patient search.
+
+    ``search(query, limit)`` returns the best matching patients, best
+    first; ``filter(queryset, query)`` narrows an existing queryset and
+    keeps its ordering (used by the patient list).
+    """
+
+    def __init__(self, connection=None):
+        self.connection = connection or default_connection
+
+    @property
+    def backend(self):
+        if self.connection.vendor == 'postgresql':
+            return 'trigram'
+        if self.connection.vendor == 'sqlite':
+            return 'fts5'
+        return 'like'
+
+    def _prefix_q(self, term):
+        return Q(*[Q(**{f'{field}__istartswith': term}) for field in SEARCH_FIELDS], _connector=Q.OR)
+
+    def _contains_q(self, term):
+        return Q(*[ILikeContains(F(field), term) for field in SEARCH_FIELDS], _connector=Q.OR)
+
+    def _match_expression(self, terms):
+        # Every term must occur somewhere; quotes make FTS5 treat it literally
+        return ' AND '.join(fts5_phrase(term) for term in terms)
+
+    def _split(self, query):
+        terms = split_terms(query)
+        long_terms = [term for term in terms if len(term) >= MIN_TRIGRAM_LENGTH]
+        short_terms = [term for term in terms if len(term) < MIN_TRIGRAM_LENGTH]
+        return long_terms, short_terms
+
+    def _condition(self, long_terms, short_terms):
+        """Q matching every term, using the search index for long terms"""
+        condition = Q()
+        for term in short_terms:
+            condition &= self._prefix_q(term)
+        if not long_terms:
+            return condition
+
+        if self.backend == 'fts5':
+            condition &= Q(id__in=RawSQL(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [self._match_expression(long_terms)]
+            ))
+        else:
+            # On PostgreSQL the trigram GIN indexes serve these ILIKEs
+            for term in long_terms:
+                condition &= self._contains_q(term)
+        return condition
+
+    def filter(self, queryset, query):
+        """Patients in ``queryset`` matching every term of ``query``"""
+        long_terms, short_terms = self._split(query)
+        if not long_terms:
+            # Nothing an index can serve; short terms alone match nothing
+            return queryset.none() if short_terms else queryset
+        return queryset.filter(self._condition(long_terms, short_terms))
+
+    def search(self, query, limit=10):
+        """Up to ``limit`` patients matching ``query``, best match first"""
+        if not split_terms(query):
+            return []
+        return list(self.ranked(query, limit))
+
+    def ranked(self, query, limit=10):
+        """The ranked, limited query behind ``search`` (a QuerySet, or a RawQuerySet on SQLite)"""
+        if PATIENT_ID_PATTERN.match(query.strip()):
+            prefix = query.strip().upper()
+            # Range scan on the unique index; the bound is the next prefix (PAT2025 -> PAT2026)
+            patients = Patient.objects.filter(
+                patient_id__gte=prefix, patient_id__lt=prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            )
+            return patients.order_by('patient_id')[:limit]
+
+        long_terms, short_terms = self._split(query)
+        if not long_terms:
+            return Patient.objects.none()
+        if self.backend == 'fts5':
+            return self._ranked_fts5(long_terms, short_terms, limit)
+        if self.backend == 'trigram':
+            return self._ranked_trigram(query, long_terms, short_terms, limit)
+        patients = Patient.objects.filter(self._condition(long_terms, short_terms))
+        return patients.order_by('last_name', 'first_name', 'id')[:limit]
+
+    def explain(self, query, limit=10):
+        """The database's plan for ``search(query, limit)``"""
+        ranked = self.ranked(query, limit)
+        if hasattr(ranked, 'explain'):
+            return ranked.explain()
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {ranked.raw_query}', ranked.params)
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+    def _ranked_fts5(self, long_terms, short_terms, limit):
+        # Join the FTS table and let it order by bm25; short terms narrow the join
+        table = Patient._meta.db_table
+        where, params = f'{FTS_TABLE} MATCH %s', [self._match_expression(long_terms)]
+        if short_terms:
+            subquery, subquery_params = (
+                Patient.objects.filter(self._condition([], short_terms)).values('id').query.sql_with_params()
+            )
+            where += f' AND {table}.id IN ({subquery})'
+            params.extend(subquery_params)
+        return Patient.objects.raw(
+            f'SELECT {table}.* FROM {FTS_TABLE} JOIN {table} ON {table}.id = {FTS_TABLE}.rowid '
+            f'WHERE {where} ORDER BY {FTS_TABLE}.rank LIMIT %s',
+            [*params, limit],
+        )
+
+    def _ranked_trigram(self, query, long_terms, short_terms, limit):
+        from django.contrib.postgres.search import TrigramSimilarity, TrigramWordSimilarity
+        from django.db.models import Value
+        from django.db.models.functions import Concat, Greatest
+
+        patients = Patient.objects.filter(self._condition(long_terms, short_terms)).annotate(
+            rank=Greatest(
+                TrigramWordSimilarity(query, Concat('first_name', Value(' '), 'last_name')),
+                TrigramSimilarity('patient_id', query),
+                TrigramSimilarity('phone', query),
+                TrigramSimilarity('email', query),
+            )
+        )
+        return patients.order_by('-rank', 'id')[:limit]
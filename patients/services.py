@@ -0,0 +1,242 @@
+"""
+Dashboard statistics service shared by the desktop, mobile and API dashboards
+"""
+from dataclasses import dataclass, asdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+
+def calculate_percentage_change(old_value, new_value):
+    """Calculate percentage change between two values"""
+    if old_value == 0:
+        return {'percentage': 100 if new_value > 0 else 0, 'direction': 'up' if new_value > 0 else 'neutral'}
+
+    change = ((new_value - old_value) / old_value) * 100
+    return {
+        'percentage': abs(round(change, 1)),
+        'direction': 'up' if change > 0 else 'down' if change < 0 else 'neutral'
+    }
+
+
+def start_of_day(day):
+    """Timezone-aware midnight for a date, used to filter DateTimeFields"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def years_before(day, years):
+    """The same calendar day ``years`` earlier (Feb 29 falls back to Feb 28)"""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+
+@dataclass(frozen=True)
+class DashboardPeriods:
+    """Date boundaries every dashboard KPI is measured against"""
+
+    today: date
+    yesterday: date
+    month_start: date
+    last_month_start: date
+    year_start: date
+    last_year_start: date
+
+    @classmethod
+    def for_date(cls, today):
+        month_start = today.replace(day=1)
+        year_start = today.replace(month=1, day=1)
+        return cls(
+            today=today,
+            yesterday=today - timedelta(days=1),
+            month_start=month_start,
+            last_month_start=(month_start - timedelta(days=1)).replace(day=1),
+            year_start=year_start,
+            last_year_start=years_before(year_start, 1),
+        )
+
+
+@dataclass(frozen=True)
+class DashboardStats:
+    """Immutable snapshot of every dashboard KPI"""
+
+    # Patients
+    total_patients: int
+    new_patients_month: int
+    last_month_patients: int
+
+    # Doctors
+    total_doctors: int
+    new_doctors_month: int
+    last_month_doctors: int
+
+    # Pharmacy
+    total_medicines: int
+    new_medicines_month: int
+    last_month_medicines: int
+    low_stock_medicines: int
+
+    # Appointments
+    today_appointments: int
+    yesterday_appointments: int
+    total_appointments_month: int
+    last_month_appointments: int
+
+    # Revenue (paid invoices only)
+    monthly_revenue: Decimal
+    last_month_revenue: Decimal
+    yearly_revenue: Decimal
+    last_year_revenue: Decimal
+
+    generated_at: datetime
+
+    @property
+    def patient_change(self):
+        return calculate_percentage_change(self.last_month_patients, self.new_patients_month)
+
+    @property
+    def doctor_change(self):
+        return calculate_percentage_change(self.last_month_doctors, self.new_doctors_month)
+
+    @property
+    def medicine_change(self):
+        return calculate_percentage_change(self.last_month_medicines, self.new_medicines_month)
+
+    @property
+    def appointments_change(self):
+        return calculate_percentage_change(self.yesterday_appointments, self.today_appointments)
+
+    @property
+    def total_appointments_change(self):
+        return calculate_percentage_change(self.last_month_appointments, self.total_appointments_month)
+
+    @property
+    def revenue_change(self):
+        return calculate_percentage_change(self.last_month_revenue, self.monthly_revenue)
+
+    @property
+    def yearly_revenue_change(self):
+        return calculate_percentage_change(self.last_year_revenue, self.yearly_revenue)
+
+    def as_context(self):
+        """Template context used by the desktop and mobile dashboards"""
+        context = asdict(self)
+        context.update({
+            'patient_change': self.patient_change,
+            'new_patients_change': self.patient_change,
+            'doctor_change': self.doctor_change,
+            'new_doctors_change': self.doctor_change,
+            'medicine_change': self.medicine_change,
+            'appointments_change': self.appointments_change,
+            'total_appointments_change': self.total_appointments_change,
+            'revenue_change': self.revenue_change,
+            'yearly_revenue_change': self.yearly_revenue_change,
+        })
+        return context
+
+    def as_json(self):
+        """JSON-serialisable payload for the dashboard stats API"""
+        return {
+            'total_patients': self.total_patients,
+            'today_appointments': self.today_appointments,
+            'monthly_revenue': float(self.monthly_revenue),
+            'low_stock_medicines': self.low_stock_medicines,
+            'total_doctors': self.total_doctors,
+            'total_medicines': self.total_medicines,
+            'total_appointments_month': self.total_appointments_month,
+            'new_patients_month': self.new_patients_month,
+            'new_doctors_month': self.new_doctors_month,
+            'yearly_revenue': float(self.yearly_revenue),
+            'timestamp': self.generated_at.isoformat(),
+        }
+
+
+class DashboardStatsService:
+    """
+    Computes all dashboard KPIs from the daily rollups plus one aggregate per table.
+
+    Patient registrations, appointments and paid revenue per period are
+    summed from ``analytics`` DailyStats rows (computed live for the recent
+    days not rolled up yet); doctor, medicine and patient totals use one
+    conditional ``aggregate()`` each. A full snapshot costs the same
+    handful of queries whatever the size of the tables.
+    """
+
+    def __init__(self, today=None):
+        self.periods = DashboardPeriods.for_date(today or timezone.localdate())
+
+    def _created_in_month_counts(self, model, extra=None):
+        """Total, this-month and last-month counts keyed on created_at"""
+        periods = self.periods
+        month_start = start_of_day(periods.month_start)
+        last_month_start = start_of_day(periods.last_month_start)
+        return model.objects.aggregate(
+            total=Count('id'),
+            current_month=Count('id', filter=Q(created_at__gte=month_start)),
+            last_month=Count('id', filter=Q(created_at__gte=last_month_start, created_at__lt=month_start)),
+            **(extra or {})
+        )
+
+    def _daily_totals(self):
+        """Per-period sums of the daily rollups"""
+        from analytics.rollups import daily_stats, sum_by_period
+
+        periods = self.periods
+        next_year_start = periods.year_start.replace(year=periods.year_start.year + 1)
+        months = [
+            ('current_month', periods.month_start, None),
+            ('last_month', periods.last_month_start, periods.month_start),
+        ]
+        days = daily_stats(min(periods.last_year_start, periods.last_month_start))
+        return {
+            'patients': sum_by_period(days, 'new_patients', months),
+            'appointments': sum_by_period(days, 'appointments', months + [
+                ('today', periods.today, periods.today + timedelta(days=1)),
+                ('yesterday', periods.yesterday, periods.today),
+            ]),
+            'revenue': sum_by_period(days, 'paid_revenue', months + [
+                ('current_year', periods.year_start, next_year_start),
+                ('last_year', periods.last_year_start, periods.year_start),
+            ]),
+        }
+
+    def get_stats(self):
+        """Build a fresh DashboardStats snapshot"""
+        from doctors.models import Doctor
+        from pharmacy.models import Medicine
+        from .models import Patient
+
+        totals = self._daily_totals()
+        patients, appointments, revenue = totals['patients'], totals['appointments'], totals['revenue']
+        doctors = self._created_in_month_counts(Doctor)
+        medicines = self._created_in_month_counts(Medicine, extra={
+            'low_stock': Count('id', filter=Q(
+                is_active=True,
+                stock_quantity__lte=F('minimum_stock_level'),
+            )),
+        })
+
+        return DashboardStats(
+            total_patients=Patient.objects.count(),
+            new_patients_month=patients['current_month'],
+            last_month_patients=patients['last_month'],
+            total_doctors=doctors['total'],
+            new_doctors_month=doctors['current_month'],
+            last_month_doctors=doctors['last_month'],
+            total_medicines=medicines['total'],
+            new_medicines_month=medicines['current_month'],
+            last_month_medicines=medicines['last_month'],
+            low_stock_medicines=medicines['low_stock'],
+            today_appointments=appointments['today'],
+            yesterday_appointments=appointments['yesterday'],
+            total_appointments_month=appointments['current_month'],
+            last_month_appointments=appointments['last_month'],
+            monthly_revenue=Decimal(revenue['current_month']),
+            last_month_revenue=Decimal(revenue['last_month']),
+            yearly_revenue=Decimal(revenue['current_year']),
+            last_year_revenue=Decimal(revenue['last_year']),
+            generated_at=timezone.now(),
+        )
@@ -0,0 +1,24 @@
+from django.db import connections
+from django.db.models.signals import post_save, post_delete
+
+from .cache import WIDGET_DEPENDENCIES, invalidate_for_model
+
+
+def invalidate_dashboard_cache(sender, **kwargs):
+    """Invalidate cached dashboard widgets built from the saved/deleted model"""
+    invalidate_for_model(sender._meta.label)
+
+
+def connect_dashboard_cache_signals():
+    """Hook cache invalidation up to every model a dashboard widget reads"""
+    labels = {label for models in WIDGET_DEPENDENCIES.values() for label in models}
+    for label in labels:
+        dispatch_uid = f'dashboard_cache_{label}'
+        post_save.connect(invalidate_dashboard_cache, sender=label, dispatch_uid=f'{dispatch_uid}_save')
+        post_delete.connect(invalidate_dashboard_cache, sender=label, dispatch_uid=f'{dispatch_uid}_delete')
+
+
+def ensure_search_index(sender, using='default', **kwargs):
+    """Reinstall the patient search index if a migration dropped it"""
+    from .search import install_search_index
+    install_search_index(connections[using])
@@ -1,3 +1,370 @@
-from django.test import TestCase
+import csv
+import io
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+from datetime import date, timedelta
+from decimal import Decimal
+from .models import Patient
+from .services import DashboardStatsService, years_before
+from .cache import get_dashboard_cache, widget_cache_key
+from .search import PatientSearch
+from .importer import PatientImporter, read_rows
+from . import views
+from appointments.models import Appointment
+from billing.models import Invoice
+from doctors.models import Doctor
+from pharmacy.models import Medicine
 
-# Create your tests here.
+User = get_user_model()
+
+
+def create_patient(**kwargs):
+    """Create a patient with sensible Ethiopian defaults"""
+    defaults = {
+        'first_name': 'Abebe',
+        'last_name': 'Kebede',
+        'date_of_birth': date(1990, 5, 17),
+        'gender': 'M',
+        'kebele': '01',
+        'woreda': 'Bole',
+        'phone': '0912345678',
+        'emergency_contact_name': 'Almaz Kebede',
+        'emergency_contact_phone': '0911223344',
+        'emergency_contact_relationship': 'Sister',
+    }
+    defaults.update(kwargs)
+    return Patient.objects.create(**defaults)
+
+
+def create_doctor(username='dr.tesfaye', **kwargs):
+    """Create a doctor together with its user account"""
+    user = User.objects.create_user(username=username, password='testpass123', role='doctor',
+                                    first_name='Tesfaye', last_name='Alemu')
+    defaults = {
+        'user': user,
+        'license_number': f'ETH-MD-{username}',
+        'specialty': 'general',
+        'medical_school': 'Addis Ababa University',
+        'graduation_year': 2010,
+        'consultation_fee': Decimal('500.00'),
+    }
+    defaults.update(kwargs)
+    return Doctor.objects.create(**defaults)
+
+
+class DashboardStatsServiceTests(TestCase):
+    """Test cases for the aggregated dashboard statistics service"""
+
+    def setUp(self):
+        get_dashboard_cache().clear()
+        self.today = timezone.localdate()
+        self.patient = create_patient()
+        self.doctor = create_doctor()
+
+        Medicine.objects.create(
+            name='Amoxicillin', manufacturer='EPHARM', category='antibiotic', form='capsule',
+            strength='500mg', stock_quantity=5, minimum_stock_level=20,
+            unit_price=Decimal('10.00'), cost_price=Decimal('8.00'),
+            expiry_date=self.today + timedelta(days=365),
+        )
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_date=self.today,
+            appointment_time='09:00', chief_complaint='Headache',
+        )
+        Invoice.objects.create(
+            patient=self.patient, issue_date=self.today, due_date=self.today,
+            subtotal=Decimal('250.00'), status='paid',
+        )
+        Invoice.objects.create(
+            patient=self.patient, issue_date=self.today, due_date=self.today,
+            subtotal=Decimal('100.00'), status='draft',
+        )
+
+    def test_snapshot_counts(self):
+        """Every KPI is reported from the snapshot"""
+        stats = DashboardStatsService().get_stats()
+
+        self.assertEqual(stats.total_patients, 1)
+        self.assertEqual(stats.new_patients_month, 1)
+        self.assertEqual(stats.total_doctors, 1)
+        self.assertEqual(stats.total_medicines, 1)
+        self.assertEqual(stats.low_stock_medicines, 1)
+        self.assertEqual(stats.today_appointments, 1)
+        self.assertEqual(stats.total_appointments_month, 1)
+        self.assertEqual(stats.monthly_revenue, Decimal('250.00'))
+        self.assertEqual(stats.yearly_revenue, Decimal('250.00'))
+        self.assertEqual(stats.patient_change, {'percentage': 100, 'direction': 'up'})
+
+    def test_snapshot_query_count(self):
+        """A full snapshot costs a fixed handful of queries (rollups, live recent days, totals)"""
+        with self.assertNumQueries(7):
+            DashboardStatsService().get_stats()
+
+    def test_dashboard_stats_api(self):
+        """The stats API serialises the same snapshot"""
+        User.objects.create_user(username='reception', password='testpass123')
+        client = Client()
+        client.login(username='reception', password='testpass123')
+
+        response = client.get(reverse('patients:dashboard_stats_api'))
+
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertTrue(payload['success'])
+        self.assertEqual(payload['total_patients'], 1)
+        self.assertEqual(payload['monthly_revenue'], 250.0)
+
+
+class DashboardCacheTests(TestCase):
+    """Test cases for cached dashboard widgets"""
+
+    def setUp(self):
+        get_dashboard_cache().clear()
+        create_patient()
+
+    def test_widget_is_computed_once(self):
+        """Repeated dashboard loads are served from the cache"""
+        views.get_patient_demographics_data()
+
+        with self.assertNumQueries(0):
+            data = views.get_patient_demographics_data()
+        self.assertEqual(data['total_patients'], 1)
+
+    def test_patient_save_invalidates_widgets(self):
+        """Registering a patient drops the widgets built from patients"""
+        views.get_patient_demographics_data()
+        views.get_appointments_by_doctor_data()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_patient(first_name='Meron', phone='0922334455')
+
+        cache = get_dashboard_cache()
+        self.assertIsNone(cache.get(widget_cache_key('patient_demographics')))
+        self.assertIsNotNone(cache.get(widget_cache_key('appointments_by_doctor')))
+        self.assertEqual(views.get_patient_demographics_data()['total_patients'], 2)
+
+
+class PatientDemographicsTests(TestCase):
+    """Test cases for the SQL age-bucket histogram"""
+
+    def setUp(self):
+        get_dashboard_cache().clear()
+
+    def test_age_buckets_on_birthday_boundaries(self):
+        """Patients land in the bucket of their exact calendar age"""
+        today = timezone.localdate()
+        for index, age in enumerate([0, 18, 19, 35, 36, 50, 51, 65, 66, 90]):
+            create_patient(date_of_birth=years_before(today, age), phone=f'09123456{index:02d}')
+
+        with CaptureQueriesContext(connection) as queries:
+            data = views.get_patient_demographics_data.uncached()
+        self.assertEqual(len(queries), 2)
+        # Only date_of_birth is read, so its index can serve the histogram alone
+        age_sql = next(query['sql'] for query in queries if 'CASE WHEN' in query['sql'])
+        self.assertIn('COUNT(*)', age_sql)
+        self.assertNotIn('"patients_patient"."id"', age_sql)
+
+        self.assertEqual(data['age_distribution']['labels'], ['0-18', '19-35', '36-50', '51-65', '65+'])
+        self.assertEqual(data['age_distribution']['data'], [2, 2, 2, 2, 2])
+        self.assertEqual(data['total_patients'], 10)
+
+
+class PatientSearchTests(TestCase):
+    """Test cases for the indexed patient search"""
+
+    def setUp(self):
+        self.abebe = create_patient(first_name='Abebe', last_name='Kebede', phone='0912345678')
+        self.almaz = create_patient(first_name='Almaz', last_name='Tesfaye', phone='0923456789',
+                                    email='almaz@example.com')
+        self.tigist = create_patient(first_name='Tigist', last_name='Abebe', phone='0934567890')
+        self.search = PatientSearch()
+
+    def names(self, patients):
+        return [patient.get_full_name() for patient in patients]
+
+    def test_substring_matches_any_field(self):
+        """Names, phone numbers, patient IDs and emails are all searchable"""
+        self.assertEqual(self.names(self.search.search('tesf')), ['Almaz Tesfaye'])
+        self.assertEqual(self.names(self.search.search('4567890')), ['Tigist Abebe'])
+        self.assertEqual(self.names(self.search.search('example.com')), ['Almaz Tesfaye'])
+        self.assertEqual(self.search.search(self.abebe.patient_id), [self.abebe])
+
+    def test_every_term_must_match(self):
+        """Multi-word queries narrow the results"""
+        self.assertEqual(
+            set(self.names(self.search.search('abebe'))), {'Abebe Kebede', 'Tigist Abebe'}
+        )
+        self.assertEqual(self.names(self.search.search('abebe kebe')), ['Abebe Kebede'])
+        self.assertEqual(self.names(self.search.search('abebe ti')), ['Tigist Abebe'])
+
+    def test_short_terms_only_narrow_longer_ones(self):
+        """One or two characters alone are not searched; no index could serve them"""
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search.search('Ti'), [])
+        self.assertFalse(self.search.filter(Patient.objects.all(), 'ti a').exists())
+        self.assertEqual(self.names(self.search.search('abebe ti')), ['Tigist Abebe'])
+
+    def test_better_matches_rank_first(self):
+        """A patient matching the term twice ranks above a single match"""
+        create_patient(first_name='Abebe', last_name='Abebe', phone='0945678901')
+        self.assertEqual(self.names(self.search.search('abebe'))[0], 'Abebe Abebe')
+
+    def test_ranking_covers_every_match(self):
+        """The best match ranks first even behind hundreds of weaker ones"""
+        Patient.objects.bulk_create([
+            Patient(patient_id=f'PAT2024{index:07d}', first_name='Kebedech', last_name=f'Lemma{index}',
+                    date_of_birth=date(1990, 1, 1), gender='F', kebele='01', woreda='Bole',
+                    phone='0900000000', emergency_contact_name='Contact',
+                    emergency_contact_phone='0911223344', emergency_contact_relationship='Sibling')
+            for index in range(300)
+        ])
+        best = create_patient(first_name='Kebe', last_name='Kebe', phone='0956789012')
+
+        self.assertEqual(self.search.search('kebe', limit=5)[0], best)
+
+    def test_plan_uses_search_index(self):
+        """The ranked query is answered from the trigram index"""
+        plan = self.search.explain('abebe kebe')
+        if connection.vendor == 'postgresql':
+            self.assertIn('_trgm_idx', plan)
+        else:
+            self.assertIn('VIRTUAL TABLE INDEX', plan)
+
+    def test_postgresql_contains_is_plain_ilike(self):
+        """Substring filters compile to the ILIKE the pg_trgm indexes serve, not UPPER(...) LIKE"""
+        from django.db.backends.postgresql.base import DatabaseWrapper
+
+        postgresql = DatabaseWrapper({**connection.settings_dict, 'ENGINE': 'django.db.backends.postgresql'})
+        patients = PatientSearch(postgresql).filter(Patient.objects.all(), 'tesf')
+        sql, params = patients.query.get_compiler(connection=postgresql).as_sql()
+
+        self.assertIn('"patients_patient"."first_name" ILIKE %s', sql)
+        self.assertNotIn('UPPER', sql)
+        self.assertIn('%tesf%', params)
+
+    def test_index_follows_updates_and_deletes(self):
+        """Saves, queryset updates and deletes are reflected immediately"""
+        self.almaz.last_name = 'Girma'
+        self.almaz.save()
+        Patient.objects.filter(pk=self.tigist.pk).update(last_name='Haile')
+        self.abebe.delete()
+
+        self.assertEqual(self.names(self.search.search('girma')), ['Almaz Girma'])
+        self.assertEqual(self.search.search('tesfaye'), [])
+        self.assertEqual(self.names(self.search.search('haile')), ['Tigist Haile'])
+        self.assertEqual(self.search.search('kebede'), [])
+
+    def test_filter_keeps_queryset_ordering(self):
+        """filter() narrows a queryset for the patient list"""
+        patients = self.search.filter(Patient.objects.order_by('first_name'), 'abebe')
+        self.assertEqual(self.names(patients), ['Abebe Kebede', 'Tigist Abebe'])
+
+    def test_ajax_search_endpoint(self):
+        """patient_search_ajax returns ranked matches"""
+        get_user_model().objects.create_user(username='reception', password='testpass123', role='receptionist')
+        self.client.login(username='reception', password='testpass123')
+
+        response = self.client.get(reverse('patients:patient_search_ajax'), {'q': 'tesfaye'})
+
+        self.assertEqual([p['name'] for p in response.json()['patients']], ['Almaz Tesfaye'])
+
+
+class PatientExportTests(TestCase):
+    """Test cases for the patient CSV export view"""
+
+    def setUp(self):
+        create_patient(first_name='Abebe', gender='M', city='Addis Ababa')
+        create_patient(first_name='Almaz', gender='F', city='Adama')
+        User.objects.create_user(username='reception', password='testpass123', role='receptionist')
+        self.client.login(username='reception', password='testpass123')
+
+    def test_export_streams_filtered_patients(self):
+        """The export applies the same filters as the patient list"""
+        response = self.client.get(reverse('patients:patient_export'), {'gender': 'F'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="patients.csv"')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'Patient ID,Name,Age,Gender,Phone,City,Blood Type,Created Date')
+        self.assertEqual(len(lines), 2)
+        self.assertIn('Almaz Kebede', lines[1])
+        self.assertIn('Female,0912345678,Adama', lines[1])
+
+
+class PatientImportTests(TestCase):
+    """Test cases for the bulk patient import"""
+
+    HEADER = 'first_name,last_name,date_of_birth,gender,kebele,woreda,phone,' \
+             'emergency_contact_name,emergency_contact_phone,emergency_contact_relationship\n'
+
+    def csv_rows(self, *lines):
+        return read_rows(io.StringIO(self.HEADER + ''.join(f'{line}\n' for line in lines)), 'csv')
+
+    def test_valid_rows_are_created_and_invalid_rows_reported(self):
+        """Rows failing the model validators are rejected with their line number"""
+        report = io.StringIO()
+        importer = PatientImporter(chunk_size=2, rejected_writer=csv.writer(report))
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            result = importer.run(self.csv_rows(
+                'Abebe,Kebede,1990-05-17,M,01,Bole,+251912345678,Almaz,+251911223344,Sister',
+                'Almaz,Tesfaye,1985-02-01,F,02,Yeka,12345,Abebe,+251911223344,Brother',
+                'Tigist,Haile,1992-13-01,X,03,Arada,+251923456789,Abebe,+251911223344,Brother',
+                'Dawit,Girma,2001-01-09,M,04,Kirkos,+251934567890,Hana,251911223344,Wife',
+            ))
+        self.assertEqual((result.created, result.rejected), (2, 2))
+        self.assertLess(len(queries), 20)
+
+        ids = list(Patient.objects.order_by('patient_id').values_list('patient_id', flat=True))
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(int(ids[1][-4:]), int(ids[0][-4:]) + 1)
+        self.assertEqual(Patient.objects.get(first_name='Dawit').city, 'Addis Ababa')
+
+        rejected = list(csv.reader(io.StringIO(report.getvalue())))
+        self.assertEqual([row[0] for row in rejected[1:]], ['3', '4'])
+        self.assertIn('phone', rejected[1][1])
+        self.assertIn('date_of_birth', rejected[2][1])
+        self.assertIn('gender', rejected[2][1])
+
+        # The global search documents are built by the worker
+        from core.search import search
+        from notifications.jobs import run_pending
+        self.assertEqual(search('dawit'), [])
+        run_pending()
+        self.assertEqual([document.title for document in search('dawit')], ['Dawit Girma'])
+        self.assertEqual(Patient.objects.get(first_name='Dawit').date_of_birth, date(2001, 1, 9))
+
+        # The typeahead index is filled in bulk and its insert trigger restored
+        from .search import PATIENT_INDEX
+        self.assertEqual(self.names_found('girma'), ['Dawit Girma'])
+        if connection.vendor == 'sqlite':
+            self.assertTrue(PATIENT_INDEX.sqlite_installed(connection))
+        create_patient(first_name='Selam', last_name='Girma')
+        self.assertEqual(sorted(self.names_found('girma')), ['Dawit Girma', 'Selam Girma'])
+
+    def names_found(self, query):
+        return [patient.get_full_name() for patient in PatientSearch().search(query)]
+
+    def test_jsonl_rows(self):
+        rows = read_rows(io.StringIO(
+            '{"first_name": "Hana", "last_name": "Bekele", "date_of_birth": "1999-09-09", "gender": "F",'
+            ' "kebele": "05", "woreda": "Bole", "phone": "+251912121212", "emergency_contact_name": "Yonas",'
+            ' "emergency_contact_phone": "+251913131313", "emergency_contact_relationship": "Brother"}\n'
+            'not json\n'
+        ), 'jsonl')
+        result = PatientImporter().run(rows)
+        self.assertEqual((result.created, result.rejected), (1, 1))
+        self.assertEqual(result.rejected_rows[0][0], 2)
+
+    def test_admin_upload(self):
+        User.objects.create_superuser(username='admin', password='testpass123', email='admin@example.com')
+        self.client.login(username='admin', password='testpass123')
+        upload = SimpleUploadedFile('clinic.csv', (
+            self.HEADER + 'Abebe,Kebede,1990-05-17,M,01,Bole,+251912345678,Almaz,+251911223344,Sister\n'
+        ).encode())
+        response = self.client.post(reverse('admin:patients_patient_import'), {'file': upload})
+        self.assertRedirects(response, reverse('admin:patients_patient_changelist'))
+        self.assertTrue(Patient.objects.filter(first_name='Abebe').exists())
@@ -1,22 +1,25 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.db.models import Q, Sum, F, Count
 from django.db import models
 from django.http import JsonResponse, HttpResponse
 from django.utils import timezone
 from django.urls import reverse
 from .models import Patient
+from .services import DashboardStatsService, calculate_percentage_change, years_before
+from .cache import cached_widget
+from .search import PatientSearch
+from core.search import search_results
 from appointments.models import Appointment
 from billing.models import Invoice
+from core.pagination import KeysetPaginator
 import json
 from datetime import datetime, timedelta
 
 @login_required
 def dashboard_view(request):
     """Main dashboard view with real statistics and mobile detection"""
-    from datetime import timedelta
     from pharmacy.models import Medicine
     from django.shortcuts import redirect
 
@@ -44,67 +47,10 @@ def dashboard_view(request):
 
         return redirect(redirect_url)
 
-    # Calculate date ranges first
-    today = datetime.now().date()
-    yesterday = today - timedelta(days=1)
-    current_month = datetime.now().replace(day=1)
-    last_month = (current_month - timedelta(days=1)).replace(day=1)
+    # All KPIs come from one cached snapshot
+    stats = get_dashboard_stats()
 
-    # Get real statistics
-    total_patients = Patient.objects.count()
-
-    # Doctor statistics
     from doctors.models import Doctor
-    total_doctors = Doctor.objects.count()
-    current_month_doctors = Doctor.objects.filter(created_at__gte=current_month).count()
-    last_month_doctors = Doctor.objects.filter(
-        created_at__gte=last_month,
-        created_at__lt=current_month
-    ).count()
-    doctor_change = calculate_percentage_change(last_month_doctors, current_month_doctors)
-
-    # Pharmacy statistics
-    total_medicines = Medicine.objects.count()
-    current_month_medicines = Medicine.objects.filter(created_at__gte=current_month).count()
-    last_month_medicines = Medicine.objects.filter(
-        created_at__gte=last_month,
-        created_at__lt=current_month
-    ).count()
-    medicine_change = calculate_percentage_change(last_month_medicines, current_month_medicines)
-
-    # Today's appointments with percentage change
-    today_appointments = Appointment.objects.filter(appointment_date=today).count()
-    yesterday_appointments = Appointment.objects.filter(appointment_date=yesterday).count()
-    appointments_change = calculate_percentage_change(yesterday_appointments, today_appointments)
-
-    # Calculate monthly revenue with percentage change
-
-    monthly_revenue = Invoice.objects.filter(
-        issue_date__gte=current_month,
-        status='paid'
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
-
-    last_month_revenue = Invoice.objects.filter(
-        issue_date__gte=last_month,
-        issue_date__lt=current_month,
-        status='paid'
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
-
-    revenue_change = calculate_percentage_change(last_month_revenue, monthly_revenue)
-
-    # Patient growth this month
-    current_month_patients = Patient.objects.filter(created_at__gte=current_month).count()
-    last_month_patients = Patient.objects.filter(
-        created_at__gte=last_month,
-        created_at__lt=current_month
-    ).count()
-    patient_change = calculate_percentage_change(last_month_patients, current_month_patients)
-
-    # Low stock medicines
-    low_stock_medicines = Medicine.objects.filter(
-        stock_quantity__lte=F('minimum_stock_level'),
-        is_active=True
-    ).count()
 
     # Get recent patients
     recent_patients = Patient.objects.order_by('-created_at')[:5]
@@ -134,17 +80,7 @@ def dashboard_view(request):
     recent_activity = get_recent_activity()
 
     context = {
-        'total_patients': total_patients,
-        'today_appointments': today_appointments,
-        'monthly_revenue': monthly_revenue,
-        'low_stock_medicines': low_stock_medicines,
-        'appointments_change': appointments_change,
-        'revenue_change': revenue_change,
-        'patient_change': patient_change,
-        'total_doctors': total_doctors,
-        'doctor_change': doctor_change,
-        'total_medicines': total_medicines,
-        'medicine_change': medicine_change,
+        **stats.as_context(),
         'recent_patients': recent_patients,
         'recent_appointments': recent_appointments,
         'recent_doctors': recent_doctors,
@@ -163,7 +99,6 @@ def dashboard_view(request):
 @login_required
 def mobile_dashboard_view(request):
     """Mobile dashboard view with same data as desktop but mobile template"""
-    from datetime import timedelta
     from pharmacy.models import Medicine
 
     # Enhanced responsive detection
@@ -189,67 +124,10 @@ def mobile_dashboard_view(request):
 
         return redirect(redirect_url)
 
-    # Calculate date ranges first
-    today = datetime.now().date()
-    yesterday = today - timedelta(days=1)
-    current_month = datetime.now().replace(day=1)
-    last_month = (current_month - timedelta(days=1)).replace(day=1)
-
-    # Get real statistics (same as desktop dashboard)
-    total_patients = Patient.objects.count()
+    # All KPIs come from one cached snapshot
+    stats = get_dashboard_stats()
 
-    # Doctor statistics
     from doctors.models import Doctor
-    total_doctors = Doctor.objects.count()
-    current_month_doctors = Doctor.objects.filter(created_at__gte=current_month).count()
-    last_month_doctors = Doctor.objects.filter(
-        created_at__gte=last_month,
-        created_at__lt=current_month
-    ).count()
-    doctor_change = calculate_percentage_change(last_month_doctors, current_month_doctors)
-
-    # Pharmacy statistics
-    total_medicines = Medicine.objects.count()
-    current_month_medicines = Medicine.objects.filter(created_at__gte=current_month).count()
-    last_month_medicines = Medicine.objects.filter(
-        created_at__gte=last_month,
-        created_at__lt=current_month
-    ).count()
-    medicine_change = calculate_percentage_change(last_month_medicines, current_month_medicines)
-
-    # Today's appointments with percentage change
-    today_appointments = Appointment.objects.filter(appointment_date=today).count()
-    yesterday_appointments = Appointment.objects.filter(appointment_date=yesterday).count()
-    appointments_change = calculate_percentage_change(yesterday_appointments, today_appointments)
-
-    # Calculate monthly revenue with percentage change
-
-    monthly_revenue = Invoice.objects.filter(
-        issue_date__gte=current_month,
-        status='paid'
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
-
-    last_month_revenue = Invoice.objects.filter(
-        issue_date__gte=last_month,
-        issue_date__lt=current_month,
-        status='paid'
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
-
-    revenue_change = calculate_percentage_change(last_month_revenue, monthly_revenue)
-
-    # Patient growth this month
-    current_month_patients = Patient.objects.filter(created_at__gte=current_month).count()
-    last_month_patients = Patient.objects.filter(
-        created_at__gte=last_month,
-        created_at__lt=current_month
-    ).count()
-    patient_change = calculate_percentage_change(last_month_patients, current_month_patients)
-
-    # Low stock medicines
-    low_stock_medicines = Medicine.objects.filter(
-        stock_quantity__lte=F('minimum_stock_level'),
-        is_active=True
-    ).count()
 
     # Get recent patients
     recent_patients = Patient.objects.order_by('-created_at')[:5]
@@ -278,51 +156,8 @@ def mobile_dashboard_view(request):
     # Get recent activity
     recent_activity = get_recent_activity()
 
-    # Additional statistics for the new mobile layout
-    # Total appointments this month
-    total_appointments_month = Appointment.objects.filter(
-        appointment_date__gte=current_month
-    ).count()
-    last_month_appointments = Appointment.objects.filter(
-        appointment_date__gte=last_month,
-        appointment_date__lt=current_month
-    ).count()
-    total_appointments_change = calculate_percentage_change(last_month_appointments, total_appointments_month)
-
-    # New patients this month (already calculated above as current_month_patients)
-    new_patients_month = current_month_patients
-    new_patients_change = calculate_percentage_change(last_month_patients, new_patients_month)
-
-    # New doctors this month (already calculated above as current_month_doctors)
-    new_doctors_month = current_month_doctors
-    new_doctors_change = calculate_percentage_change(last_month_doctors, new_doctors_month)
-
-    # Yearly revenue
-    current_year = datetime.now().year
-    yearly_revenue = Invoice.objects.filter(
-        issue_date__year=current_year,
-        status='paid'
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
-
-    last_year_revenue = Invoice.objects.filter(
-        issue_date__year=current_year - 1,
-        status='paid'
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
-
-    yearly_revenue_change = calculate_percentage_change(last_year_revenue, yearly_revenue)
-
     context = {
-        'total_patients': total_patients,
-        'today_appointments': today_appointments,
-        'monthly_revenue': monthly_revenue,
-        'low_stock_medicines': low_stock_medicines,
-        'appointments_change': appointments_change,
-        'revenue_change': revenue_change,
-        'patient_change': patient_change,
-        'total_doctors': total_doctors,
-        'doctor_change': doctor_change,
-        'total_medicines': total_medicines,
-        'medicine_change': medicine_change,
+        **stats.as_context(),
         'recent_patients': recent_patients,
         'recent_appointments': recent_appointments,
         'recent_doctors': recent_doctors,
@@ -332,15 +167,6 @@ def mobile_dashboard_view(request):
         'appointments_by_doctor': appointments_by_doctor,
         'revenue_breakdown': revenue_breakdown,
         'recent_activity': recent_activity,
-        # Additional context for new mobile layout
-        'total_appointments_month': total_appointments_month,
-        'total_appointments_change': total_appointments_change,
-        'new_patients_month': new_patients_month,
-        'new_patients_change': new_patients_change,
-        'new_doctors_month': new_doctors_month,
-        'new_doctors_change': new_doctors_change,
-        'yearly_revenue': yearly_revenue,
-        'yearly_revenue_change': yearly_revenue_change,
     }
     return render(request, 'dashboard/mobile/index.html', context)
 
@@ -357,53 +183,26 @@ def mobile_responsive_test_view(request):
     return render(request, 'dashboard/mobile/responsive-test.html')
 
 
-def calculate_percentage_change(old_value, new_value):
-    """Calculate percentage change between two values"""
-    if old_value == 0:
-        return {'percentage': 100 if new_value > 0 else 0, 'direction': 'up' if new_value > 0 else 'neutral'}
-
-    change = ((new_value - old_value) / old_value) * 100
-    return {
-        'percentage': abs(round(change, 1)),
-        'direction': 'up' if change > 0 else 'down' if change < 0 else 'neutral'
-    }
+@cached_widget('dashboard_stats')
+def get_dashboard_stats():
+    """Get the dashboard KPI snapshot"""
+    return DashboardStatsService().get_stats()
 
 
+@cached_widget('patient_trends')
 def get_patient_trends_data():
-    """Get enhanced patient registration trends for the last 6 months"""
-    from django.db.models.functions import TruncMonth, TruncWeek
-    from datetime import datetime, timedelta
-
-    six_months_ago = datetime.now() - timedelta(days=180)
-
-    # Monthly trends
-    monthly_trends = Patient.objects.filter(
-        created_at__gte=six_months_ago
-    ).annotate(
-        month=TruncMonth('created_at')
-    ).values('month').annotate(
-        count=Count('id')
-    ).order_by('month')
-
-    # Format data for chart
-    labels = []
-    data = []
-
-    # Ensure we have data for all 6 months
-    current_date = datetime.now()
-    for i in range(6):
-        month_date = current_date.replace(day=1) - timedelta(days=30*i)
-        month_label = month_date.strftime('%b %Y')
+    """Get patient registration trends for the last 6 months"""
+    from analytics.timeseries import time_series
 
-        # Find matching data
-        month_count = 0
-        for trend in monthly_trends:
-            if trend['month'].strftime('%b %Y') == month_label:
-                month_count = trend['count']
-                break
+    today = timezone.localdate()
+    first_month = today.replace(day=1)
+    for _ in range(5):
+        first_month = (first_month - timedelta(days=1)).replace(day=1)
 
-        labels.insert(0, month_label)
-        data.insert(0, month_count)
+    # One gap-filled point per calendar month
+    series = time_series('registrations', first_month, today, 'month')
+    labels = [month.strftime('%b %Y') for month, _ in series]
+    data = [count for _, count in series]
 
     return {
         'labels': labels,
@@ -413,19 +212,21 @@ def get_patient_trends_data():
     }
 
 
+@cached_widget('patient_demographics')
 def get_patient_demographics_data():
     """Get patient demographics breakdown"""
-    total_patients = Patient.objects.count()
+    from django.db.models import Case, When, Value, CharField
 
     # Gender distribution
     gender_data = Patient.objects.values('gender').annotate(
         count=Count('id')
     ).order_by('gender')
 
-    # Age groups
-    from django.utils import timezone
-    today = timezone.now().date()
-
+    # Age groups, bucketed in SQL on date-of-birth cutoffs so the patient
+    # table never has to be loaded into memory. Only date_of_birth is read
+    # (COUNT(*), not COUNT(id)), so its index alone can answer the query
+    # (an index-only scan on PostgreSQL, a covering index on SQLite)
+    today = timezone.localdate()
     age_groups = {
         '0-18': 0,
         '19-35': 0,
@@ -434,18 +235,22 @@ def get_patient_demographics_data():
         '65+': 0
     }
 
-    for patient in Patient.objects.all():
-        age = (today - patient.date_of_birth).days // 365
-        if age <= 18:
-            age_groups['0-18'] += 1
-        elif age <= 35:
-            age_groups['19-35'] += 1
-        elif age <= 50:
-            age_groups['36-50'] += 1
-        elif age <= 65:
-            age_groups['51-65'] += 1
-        else:
-            age_groups['65+'] += 1
+    age_bucket = Case(
+        When(date_of_birth__gt=years_before(today, 19), then=Value('0-18')),
+        When(date_of_birth__gt=years_before(today, 36), then=Value('19-35')),
+        When(date_of_birth__gt=years_before(today, 51), then=Value('36-50')),
+        When(date_of_birth__gt=years_before(today, 66), then=Value('51-65')),
+        default=Value('65+'),
+        output_field=CharField(),
+    )
+    age_data = Patient.objects.annotate(
+        age_group=age_bucket
+    ).values('age_group').annotate(
+        count=Count('*')
+    ).order_by()
+
+    for item in age_data:
+        age_groups[item['age_group']] = item['count']
 
     return {
         'gender_distribution': {
@@ -456,38 +261,34 @@ def get_patient_demographics_data():
             'labels': list(age_groups.keys()),
             'data': list(age_groups.values())
         },
-        'total_patients': total_patients
+        'total_patients': sum(age_groups.values())
     }
 
 
+@cached_widget('appointments_by_doctor')
 def get_appointments_by_doctor_data():
-    """Get enhanced appointments analytics by doctor for current month"""
-    current_month = datetime.now().replace(day=1)
-
-    # Get appointment counts and completion rates by doctor
-    from django.db.models import Case, When, IntegerField
-
-    doctor_stats = Appointment.objects.filter(
-        appointment_date__gte=current_month
-    ).values(
-        'doctor__user__first_name',
-        'doctor__user__last_name',
-        'doctor__id'
-    ).annotate(
-        total_appointments=Count('id'),
-        completed_appointments=Count(
-            Case(
-                When(status='completed', then=1),
-                output_field=IntegerField()
-            )
-        ),
-        cancelled_appointments=Count(
-            Case(
-                When(status='cancelled', then=1),
-                output_field=IntegerField()
-            )
-        )
-    ).order_by('-total_appointments')[:5]
+    """Get appointments analytics by doctor for current month (from the daily rollups)"""
+    from analytics.rollups import appointment_stats
+    from doctors.models import Doctor
+
+    totals = {}
+    for row in appointment_stats(timezone.localdate().replace(day=1)):
+        doctor = totals.setdefault(row.doctor_id, {
+            'doctor__id': row.doctor_id, 'total_appointments': 0,
+            'completed_appointments': 0, 'cancelled_appointments': 0,
+        })
+        doctor['total_appointments'] += row.count
+        if row.status in ('completed', 'cancelled'):
+            doctor[f'{row.status}_appointments'] += row.count
+    doctor_stats = sorted(totals.values(), key=lambda item: item['total_appointments'], reverse=True)[:5]
+
+    names = {
+        pk: (first_name, last_name) for pk, first_name, last_name in Doctor.objects.filter(
+            pk__in=[item['doctor__id'] for item in doctor_stats]
+        ).values_list('pk', 'user__first_name', 'user__last_name')
+    }
+    for item in doctor_stats:
+        item['doctor__user__first_name'], item['doctor__user__last_name'] = names.get(item['doctor__id'], ('', ''))
 
     labels = []
     data = []
@@ -523,27 +324,12 @@ def get_appointments_by_doctor_data():
     }
 
 
+@cached_widget('revenue_breakdown')
 def get_revenue_breakdown_data():
-    """Get revenue breakdown by appointment type for current month"""
-    current_month = datetime.now().replace(day=1)
-
-    # Get revenue by appointment type from invoices
-    revenue_data = Invoice.objects.filter(
-        issue_date__gte=current_month,
-        status='paid',
-        appointment__isnull=False
-    ).values(
-        'appointment__appointment_type'
-    ).annotate(
-        total_revenue=Sum('total_amount')
-    ).order_by('-total_revenue')
-
-    # Get pharmacy revenue (invoices without appointments)
-    pharmacy_revenue = Invoice.objects.filter(
-        issue_date__gte=current_month,
-        status='paid',
-        appointment__isnull=True
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
+    """Get revenue breakdown by appointment type for current month (from the revenue cube)"""
+    from billing.cube import revenue_slice
+
+    revenue_data = revenue_slice(timezone.localdate().replace(day=1), by=('appointment_type',))
 
     labels = []
     data = []
@@ -559,11 +345,15 @@ def get_revenue_breakdown_data():
         'lab_test': 'Lab Tests',
     }
 
+    # Invoices without an appointment are pharmacy sales; list them last
+    pharmacy_revenue = 0
     for item in revenue_data:
-        appointment_type = item['appointment__appointment_type']
-        readable_name = type_mapping.get(appointment_type, appointment_type.title())
-        labels.append(readable_name)
-        data.append(float(item['total_revenue']))
+        appointment_type = item['appointment_type']
+        if not appointment_type:
+            pharmacy_revenue = item['revenue']
+            continue
+        labels.append(type_mapping.get(appointment_type, appointment_type.title()))
+        data.append(float(item['revenue']))
 
     # Add pharmacy revenue if exists
     if pharmacy_revenue > 0:
@@ -619,71 +409,9 @@ def get_recent_activity():
 @login_required
 def dashboard_stats_api(request):
     """API endpoint for real-time dashboard statistics"""
-    from django.http import JsonResponse
-    from pharmacy.models import Medicine
-
     try:
-        # Get real statistics
-        total_patients = Patient.objects.count()
-        today = datetime.now().date()
-        yesterday = today - timedelta(days=1)
-
-        # Today's appointments
-        today_appointments = Appointment.objects.filter(appointment_date=today).count()
-
-        # Calculate monthly revenue
-        current_month = datetime.now().replace(day=1)
-        monthly_revenue = Invoice.objects.filter(
-            issue_date__gte=current_month,
-            status='paid'
-        ).aggregate(total=Sum('total_amount'))['total'] or 0
-
-        # Low stock medicines
-        low_stock_medicines = Medicine.objects.filter(
-            stock_quantity__lte=F('minimum_stock_level'),
-            is_active=True
-        ).count()
-
-        # Doctor statistics
-        from doctors.models import Doctor
-        total_doctors = Doctor.objects.count()
-
-        # Medicine statistics
-        total_medicines = Medicine.objects.count()
-
-        # Additional statistics for mobile dashboard
-        # Total appointments this month
-        total_appointments_month = Appointment.objects.filter(
-            appointment_date__gte=current_month
-        ).count()
-
-        # New patients this month
-        new_patients_month = Patient.objects.filter(created_at__gte=current_month).count()
-
-        # New doctors this month
-        new_doctors_month = Doctor.objects.filter(created_at__gte=current_month).count()
-
-        # Yearly revenue
-        current_year = datetime.now().year
-        yearly_revenue = Invoice.objects.filter(
-            issue_date__year=current_year,
-            status='paid'
-        ).aggregate(total=Sum('total_amount'))['total'] or 0
-
-        return JsonResponse({
-            'success': True,
-            'total_patients': total_patients,
-            'today_appointments': today_appointments,
-            'monthly_revenue': float(monthly_revenue),
-            'low_stock_medicines': low_stock_medicines,
-            'total_doctors': total_doctors,
-            'total_medicines': total_medicines,
-            'total_appointments_month': total_appointments_month,
-            'new_patients_month': new_patients_month,
-            'new_doctors_month': new_doctors_month,
-            'yearly_revenue': float(yearly_revenue),
-            'timestamp': timezone.now().isoformat()
-        })
+        stats = get_dashboard_stats()
+        return JsonResponse({'success': True, **stats.as_json()})
 
     except Exception as e:
         return JsonResponse({
@@ -691,50 +419,50 @@ def dashboard_stats_api(request):
             'error': str(e)
         }, status=500)
 
-@login_required
-def patient_list_view(request):
-    """Patient list view with search and filtering"""
-    patients = Patient.objects.all()
-
+def filter_patients(patients, params):
+    """Apply the patient list search and filters in ``params`` (shared with the export)"""
     # Search functionality
-    search_query = request.GET.get('search', '')
+    search_query = params.get('search', '')
     if search_query:
-        patients = patients.filter(
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query) |
-            Q(patient_id__icontains=search_query) |
-            Q(phone__icontains=search_query) |
-            Q(email__icontains=search_query)
-        )
+        patients = PatientSearch().filter(patients, search_query)
 
     # Filter by gender
-    gender_filter = request.GET.get('gender', '')
+    gender_filter = params.get('gender', '')
     if gender_filter:
         patients = patients.filter(gender=gender_filter)
 
     # Filter by city
-    city_filter = request.GET.get('city', '')
+    city_filter = params.get('city', '')
     if city_filter:
         patients = patients.filter(city=city_filter)
 
     # Filter by blood type
-    blood_type_filter = request.GET.get('blood_type', '')
+    blood_type_filter = params.get('blood_type', '')
     if blood_type_filter:
         patients = patients.filter(blood_type=blood_type_filter)
 
-    # Pagination
-    paginator = Paginator(patients, 10)  # Show 10 patients per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    return patients
+
+@login_required
+def patient_list_view(request):
+    """Patient list view with search and filtering"""
+    patients = filter_patients(Patient.objects.all(), request.GET)
+    search_query = request.GET.get('search', '')
+    gender_filter = request.GET.get('gender', '')
+    city_filter = request.GET.get('city', '')
+    blood_type_filter = request.GET.get('blood_type', '')
+
+    # Keyset pagination: 10 patients per page, newest first
+    page_obj = KeysetPaginator(patients, 10).get_page(request.GET.get('cursor'))
 
     # Get filter options
     cities = Patient.objects.values_list('city', flat=True).distinct()
     blood_types = Patient.objects.values_list('blood_type', flat=True).distinct()
 
-    # Calculate new patients this month for mobile stats
-    from datetime import datetime, timedelta
-    current_month = datetime.now().replace(day=1)
-    new_patients_count = Patient.objects.filter(created_at__gte=current_month).count()
+    # Counters come from the cached dashboard snapshot instead of a COUNT
+    # per page; a filtered list has no total
+    stats = get_dashboard_stats()
+    is_filtered = any([search_query, gender_filter, city_filter, blood_type_filter])
 
     context = {
         'patients': page_obj,  # Changed to 'patients' for mobile template compatibility
@@ -745,8 +473,8 @@ def patient_list_view(request):
         'blood_type_filter': blood_type_filter,
         'cities': cities,
         'blood_types': blood_types,
-        'total_patients': patients.count(),
-        'new_patients_count': new_patients_count,
+        'total_patients': None if is_filtered else stats.total_patients,
+        'new_patients_count': stats.new_patients_month,
     }
 
     # Check if mobile version is requested
@@ -889,30 +617,21 @@ def patient_delete_view(request, pk):
 
 @login_required
 def patient_export_view(request):
-    """Export patients to CSV"""
-    import csv
-    from django.http import HttpResponse
-
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="patients.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['Patient ID', 'Name', 'Age', 'Gender', 'Phone', 'City', 'Blood Type', 'Created Date'])
-
-    patients = Patient.objects.all()
-    for patient in patients:
-        writer.writerow([
-            patient.patient_id,
-            patient.get_full_name(),
-            patient.get_age(),
-            patient.get_gender_display(),
-            patient.phone,
-            patient.city,
-            patient.blood_type,
-            patient.created_at.strftime('%Y-%m-%d')
-        ])
-
-    return response
+    """Stream the (filtered) patient list as CSV"""
+    from core.export import ExportColumn, age_format, choice_label, csv_export_response, date_format, full_name
+
+    columns = [
+        ExportColumn('Patient ID', 'patient_id'),
+        ExportColumn('Name', ('first_name', 'last_name'), full_name),
+        ExportColumn('Age', 'date_of_birth', age_format()),
+        ExportColumn('Gender', 'gender', choice_label(Patient.GENDER_CHOICES)),
+        ExportColumn('Phone', 'phone'),
+        ExportColumn('City', 'city'),
+        ExportColumn('Blood Type', 'blood_type'),
+        ExportColumn('Created Date', 'created_at', date_format()),
+    ]
+    patients = filter_patients(Patient.objects.all(), request.GET)
+    return csv_export_response(patients, columns, 'patients.csv')
 
 @login_required
 def patient_search_ajax(request):
@@ -921,11 +640,7 @@ def patient_search_ajax(request):
     patients = []
 
     if query:
-        patient_objects = Patient.objects.filter(
-            Q(first_name__icontains=query) |
-            Q(last_name__icontains=query) |
-            Q(patient_id__icontains=query)
-        )[:10]
+        patient_objects = PatientSearch().search(query, limit=10)
 
         patients = [{
             'id': patient.id,
@@ -945,79 +660,8 @@ def global_search_ajax(request):
     results = []
 
     if query and len(query) >= 2:
-        # Search patients
-        patients = Patient.objects.filter(
-            Q(first_name__icontains=query) |
-            Q(last_name__icontains=query) |
-            Q(patient_id__icontains=query)
-        )[:5]
-
-        for patient in patients:
-            results.append({
-                'type': 'patient',
-                'id': patient.id,
-                'title': patient.get_full_name(),
-                'subtitle': f"ID: {patient.patient_id}",
-                'url': f"/dashboard/patients/{patient.id}/",
-                'icon': 'user'
-            })
-
-        # Search appointments
-        from appointments.models import Appointment
-        appointments = Appointment.objects.select_related('patient', 'doctor__user').filter(
-            Q(appointment_id__icontains=query) |
-            Q(patient__first_name__icontains=query) |
-            Q(patient__last_name__icontains=query) |
-            Q(doctor__user__first_name__icontains=query) |
-            Q(doctor__user__last_name__icontains=query)
-        )[:5]
-
-        for appointment in appointments:
-            results.append({
-                'type': 'appointment',
-                'id': appointment.id,
-                'title': f"{appointment.patient.get_full_name()} - {appointment.doctor.user.get_full_name()}",
-                'subtitle': f"ID: {appointment.appointment_id} | {appointment.appointment_date}",
-                'url': f"/appointments/{appointment.id}/",
-                'icon': 'calendar-alt'
-            })
-
-        # Search doctors
-        from doctors.models import Doctor
-        doctors = Doctor.objects.select_related('user').filter(
-            Q(user__first_name__icontains=query) |
-            Q(user__last_name__icontains=query) |
-            Q(license_number__icontains=query) |
-            Q(specialty__icontains=query)
-        )[:5]
-
-        for doctor in doctors:
-            results.append({
-                'type': 'doctor',
-                'id': doctor.id,
-                'title': doctor.user.get_full_name(),
-                'subtitle': f"Specialty: {doctor.specialty}",
-                'url': f"/doctors/{doctor.id}/",
-                'icon': 'user-md'
-            })
-
-        # Search medicines
-        from pharmacy.models import Medicine
-        medicines = Medicine.objects.filter(
-            Q(name__icontains=query) |
-            Q(generic_name__icontains=query) |
-            Q(brand_name__icontains=query)
-        )[:5]
-
-        for medicine in medicines:
-            results.append({
-                'type': 'medicine',
-                'id': medicine.id,
-                'title': medicine.name,
-                'subtitle': f"Generic: {medicine.generic_name}",
-                'url': f"/pharmacy/medicines/{medicine.id}/",
-                'icon': 'pills'
-            })
+        # One ranked query over the cross-module search index
+        results = search_results(query)
 
     return JsonResponse({'results': results})
 
@@ -1,6 +1,17 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Medicine, Prescription
+from .models import Medicine, MedicineLot, Prescription, StockMovement
+
+class MedicineLotInline(admin.TabularInline):
+    """Read-only lots of a medicine (stock moves through pharmacy.stock)"""
+    model = MedicineLot
+    extra = 0
+    fields = ('lot_number', 'expiry_date', 'quantity', 'received_at')
+    readonly_fields = fields
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 @admin.register(Medicine)
 class MedicineAdmin(admin.ModelAdmin):
@@ -9,8 +20,10 @@ class MedicineAdmin(admin.ModelAdmin):
     list_display = ('name', 'category', 'form', 'strength', 'stock_quantity', 'unit_price', 'expiry_date', 'stock_status')
     list_filter = ('category', 'form', 'manufacturer', 'is_active', 'expiry_date')
     search_fields = ('name', 'generic_name', 'brand_name', 'manufacturer')
-    readonly_fields = ('created_at', 'updated_at')
+    # Stock changes are recorded as StockMovements (see pharmacy.stock)
+    readonly_fields = ('stock_quantity', 'created_at', 'updated_at')
     ordering = ('name',)
+    inlines = [MedicineLotInline]
 
     fieldsets = (
         ('Basic Information', {
@@ -71,3 +84,23 @@ class PrescriptionAdmin(admin.ModelAdmin):
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('appointment__patient', 'medicine', 'dispensed_by')
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    """Read-only view of the stock ledger"""
+
+    list_display = ('medicine', 'lot', 'movement_type', 'quantity', 'balance_after', 'reason', 'reference', 'created_by', 'created_at')
+    list_filter = ('movement_type', 'created_at')
+    search_fields = ('medicine__name', 'reason', 'reference')
+    date_hierarchy = 'created_at'
+    list_select_related = ('medicine', 'lot__medicine', 'created_by')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
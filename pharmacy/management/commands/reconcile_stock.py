@@ -0,0 +1,23 @@
+"""
+Management command that checks medicine stock against the stock ledger
+"""
+from django.core.management.base import BaseCommand
+
+from pharmacy.stock import ledger_drift, reconcile_ledger
+
+
+class Command(BaseCommand):
+    help = 'Report medicines whose stock differs from the sum of their stock movements or lots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Move the lots to the stock and record the correcting movements')
+
+    def handle(self, *args, **options):
+        if options['fix']:
+            count = reconcile_ledger()
+            self.stdout.write(self.style.SUCCESS(f'Reconciled {count} medicines'))
+            return
+        drift = ledger_drift()
+        for medicine_id, stock, ledger, lots in drift:
+            self.stdout.write(f'Medicine {medicine_id}: stock {stock}, ledger {ledger}, lots {lots}')
+        self.stdout.write(self.style.SUCCESS(f'{len(drift)} medicines differ from their ledger or lots'))
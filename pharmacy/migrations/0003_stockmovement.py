@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-17 08:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_opening_balances(apps, schema_editor):
+    Medicine = apps.get_model('pharmacy', 'Medicine')
+    StockMovement = apps.get_model('pharmacy', 'StockMovement')
+    stock = Medicine.objects.filter(stock_quantity__gt=0).values_list('pk', 'stock_quantity')
+    StockMovement.objects.bulk_create(
+        (
+            StockMovement(
+                medicine_id=pk, movement_type='add', quantity=quantity, balance_after=quantity,
+                reason='Opening balance',
+            )
+            for pk, quantity in stock.iterator()
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0002_prescription_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movement_type', models.CharField(choices=[('add', 'Stock Added'), ('remove', 'Stock Removed'), ('set', 'Stock Set'), ('dispense', 'Dispensed')], max_length=20)),
+                ('quantity', models.IntegerField(help_text='Signed change in stock')),
+                ('balance_after', models.PositiveIntegerField()),
+                ('reason', models.CharField(blank=True, max_length=200)),
+                ('reference', models.CharField(blank=True, help_text='Purchase order, invoice number, etc.', max_length=100)),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='pharmacy.medicine')),
+                ('prescription', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='pharmacy.prescription')),
+            ],
+            options={
+                'verbose_name': 'Stock Movement',
+                'verbose_name_plural': 'Stock Movements',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['medicine', 'created_at'], name='stock_movement_medicine')],
+            },
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
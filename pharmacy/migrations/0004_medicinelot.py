@@ -0,0 +1,57 @@
+# Generated by Django 5.2.5 on 2026-10-17 08:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_lots_from_stock(apps, schema_editor):
+    Medicine = apps.get_model('pharmacy', 'Medicine')
+    MedicineLot = apps.get_model('pharmacy', 'MedicineLot')
+    stock = Medicine.objects.filter(stock_quantity__gt=0).values_list('pk', 'expiry_date', 'stock_quantity')
+    MedicineLot.objects.bulk_create(
+        (
+            MedicineLot(medicine_id=pk, expiry_date=expiry_date, quantity=quantity)
+            for pk, expiry_date, quantity in stock.iterator()
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0003_stockmovement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicineLot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lot_number', models.CharField(blank=True, max_length=50)),
+                ('expiry_date', models.DateField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lots', to='pharmacy.medicine')),
+            ],
+            options={
+                'verbose_name': 'Medicine Lot',
+                'verbose_name_plural': 'Medicine Lots',
+                'ordering': ['expiry_date', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='lot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='pharmacy.medicinelot'),
+        ),
+        migrations.AddIndex(
+            model_name='medicinelot',
+            index=models.Index(fields=['medicine', 'expiry_date'], name='medicine_lot_fefo'),
+        ),
+        migrations.AddConstraint(
+            model_name='medicinelot',
+            constraint=models.UniqueConstraint(fields=('medicine', 'lot_number', 'expiry_date'), name='unique_medicine_lot'),
+        ),
+        migrations.RunPython(create_lots_from_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-17 09:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_extract_watermark_indexes'),
+        ('pharmacy', '0004_medicinelot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicine',
+            index=models.Index(fields=['updated_at', 'id'], name='medicine_updated_at'),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['updated_at', 'id'], name='prescription_updated_at'),
+        ),
+    ]
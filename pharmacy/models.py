@@ -44,7 +44,8 @@ class Medicine(models.Model):
     form = models.CharField(max_length=20, choices=FORM_CHOICES)
     strength = models.CharField(max_length=50, help_text="e.g., 500mg, 10ml")
 
-    # Inventory Information
+    # Inventory Information: the total over the medicine's lots, changed
+    # only through pharmacy.stock
     stock_quantity = models.PositiveIntegerField(default=0)
     minimum_stock_level = models.PositiveIntegerField(default=10)
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -52,6 +53,7 @@ class Medicine(models.Model):
 
     # Dates
     manufacture_date = models.DateField(blank=True, null=True)
+    # Earliest expiry among the lots in stock (kept up to date by pharmacy.stock)
     expiry_date = models.DateField()
 
     # Additional Information
@@ -96,13 +98,10 @@ class Medicine(models.Model):
             return False
 
     def can_dispense(self, quantity):
-        """Check if specified quantity can be dispensed"""
+        """Check if specified quantity can be dispensed from lots not expiring within 7 days"""
+        from .stock import dispensable_quantity
         try:
-            return (
-                self.is_active and
-                self.stock_quantity >= quantity and
-                not self.is_expiring_soon(7)  # Don't dispense if expiring in 7 days
-            )
+            return self.is_active and dispensable_quantity(self) >= quantity
         except (TypeError, ValueError):
             return False
 
@@ -110,6 +109,10 @@ class Medicine(models.Model):
         ordering = ['name']
         verbose_name = 'Medicine'
         verbose_name_plural = 'Medicines'
+        indexes = [
+            # The watermark order of manage.py extract (see core.extract)
+            models.Index(fields=['updated_at', 'id'], name='medicine_updated_at'),
+        ]
 
 
 class Prescription(models.Model):
@@ -145,6 +148,7 @@ class Prescription(models.Model):
         blank=True,
         related_name='dispensed_prescriptions'
     )
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.medicine.name} for {self.appointment.patient.get_full_name()}"
@@ -161,3 +165,81 @@ class Prescription(models.Model):
         ordering = ['-prescribed_date']
         verbose_name = 'Prescription'
         verbose_name_plural = 'Prescriptions'
+        indexes = [
+            # The watermark order of manage.py extract (see core.extract)
+            models.Index(fields=['updated_at', 'id'], name='prescription_updated_at'),
+        ]
+
+
+class MedicineLot(models.Model):
+    """
+    One delivery (batch) of a medicine with its own expiry. Dispensing
+    takes from the lots first-expiry-first-out (see pharmacy.stock).
+    """
+
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='lots')
+    lot_number = models.CharField(max_length=50, blank=True)
+    expiry_date = models.DateField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    # System Fields
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.medicine.name} lot {self.lot_number or '-'} ({self.expiry_date}): {self.quantity} units"
+
+    class Meta:
+        ordering = ['expiry_date', 'id']
+        verbose_name = 'Medicine Lot'
+        verbose_name_plural = 'Medicine Lots'
+        indexes = [
+            # FEFO allocation and the expiry reports
+            models.Index(fields=['medicine', 'expiry_date'], name='medicine_lot_fefo'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['medicine', 'lot_number', 'expiry_date'], name='unique_medicine_lot'),
+        ]
+
+
+class StockMovement(models.Model):
+    """
+    One change to a medicine's stock, per lot touched. Written in the same
+    transaction as the conditional stock update (see pharmacy.stock), so
+    the quantities of a medicine's movements add up to its stock_quantity.
+    """
+
+    MOVEMENT_TYPE_CHOICES = [
+        ('add', 'Stock Added'),
+        ('remove', 'Stock Removed'),
+        ('set', 'Stock Set'),
+        ('dispense', 'Dispensed'),
+    ]
+
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='stock_movements')
+    movement_type = models.CharField(max_length=20, choices=MOVEMENT_TYPE_CHOICES)
+    quantity = models.IntegerField(help_text="Signed change in stock")
+    balance_after = models.PositiveIntegerField()
+
+    # Why and against what the stock moved
+    reason = models.CharField(max_length=200, blank=True)
+    reference = models.CharField(max_length=100, blank=True, help_text="Purchase order, invoice number, etc.")
+    notes = models.TextField(blank=True)
+    prescription = models.ForeignKey(
+        Prescription, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements'
+    )
+    lot = models.ForeignKey(MedicineLot, on_delete=models.SET_NULL, null=True, blank=True, related_name='movements')
+
+    # System Fields
+    created_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.medicine.name}: {self.quantity:+d} ({self.get_movement_type_display()})"
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        verbose_name = 'Stock Movement'
+        verbose_name_plural = 'Stock Movements'
+        indexes = [
+            models.Index(fields=['medicine', 'created_at'], name='stock_movement_medicine'),
+        ]
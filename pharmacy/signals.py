@@ -0,0 +1,16 @@
+"""
+Give the stock a medicine is created with its lot and ledger entry (see
+pharmacy.stock), however the medicine was created.
+"""
+from django.db.models.signals import post_save
+
+
+def medicine_saved(sender, instance, created, raw=False, **kwargs):
+    from .stock import record_opening_stock
+
+    if created and not raw:
+        record_opening_stock(instance)
+
+
+def connect_stock_signals():
+    post_save.connect(medicine_saved, sender='pharmacy.Medicine', dispatch_uid='opening_stock_medicine_saved')
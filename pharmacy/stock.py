@@ -0,0 +1,318 @@
+"""
+Stock changes as a ledger over lots.
+
+A medicine's stock lives in its lots (``MedicineLot``, one per delivery
+and expiry); ``Medicine.stock_quantity`` is their total and
+``Medicine.expiry_date`` the earliest expiry still in stock.
+
+Every change goes through ``move_stock``:
+
+* deliveries are added to a lot; removals and dispensing are allocated
+  first-expiry-first-out from the lots read and locked with one query,
+  ordered by the ``(medicine, expiry_date)`` index; dispensing skips
+  lots expiring within ``DISPENSE_EXPIRY_MARGIN_DAYS``;
+* lot and medicine quantities are changed with conditional UPDATEs
+  (``F('quantity') - n`` where ``quantity >= n``), so stock can never go
+  negative and concurrent dispensers cannot lose each other's updates;
+* one ``StockMovement`` per lot touched is written in the same
+  transaction.
+
+The movements of a medicine add up to its stock, and so do its lots;
+``ledger_drift`` finds medicines where either does not (e.g. stock
+written around these helpers) and ``manage.py reconcile_stock --fix``
+moves the lots to the recorded stock and records the difference.
+
+The report querysets (``low_stock_medicines``, ``expiring_medicines``)
+aggregate over the lots in SQL.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, Min, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Medicine, MedicineLot, Prescription, StockMovement
+
+# Lots expiring this close are not dispensed (see Medicine.can_dispense)
+DISPENSE_EXPIRY_MARGIN_DAYS = 7
+
+
+class StockError(ValueError):
+    """A stock change that cannot be applied (bad quantity, not enough stock)"""
+
+
+def _current_stock(medicine_id):
+    return Medicine.objects.filter(pk=medicine_id).values_list('stock_quantity', flat=True).get()
+
+
+def dispense_cutoff(today=None):
+    """Lots expiring on or before this day are not dispensed"""
+    return (today or timezone.localdate()) + timedelta(days=DISPENSE_EXPIRY_MARGIN_DAYS)
+
+
+def dispensable_quantity(medicine, today=None):
+    """Units of ``medicine`` in lots that can still be dispensed"""
+    return medicine.lots.filter(expiry_date__gt=dispense_cutoff(today)).aggregate(
+        total=Coalesce(Sum('quantity'), 0)
+    )['total']
+
+
+def allocate_fefo(lots, quantity):
+    """``[(lot, units)]`` taking ``quantity`` from ``lots`` in order, or None if they hold too little"""
+    allocation = []
+    for lot in lots:
+        if quantity <= 0:
+            break
+        units = min(lot.quantity, quantity)
+        allocation.append((lot, units))
+        quantity -= units
+    return allocation if quantity <= 0 else None
+
+
+def _locked_lots(medicine, expiring_after=None):
+    """The in-stock lots of ``medicine``, first expiry first, locked until commit (one query)"""
+    lots = MedicineLot.objects.select_for_update().filter(medicine=medicine, quantity__gt=0)
+    if expiring_after is not None:
+        lots = lots.filter(expiry_date__gt=expiring_after)
+    return list(lots.order_by('expiry_date', 'id'))
+
+
+def _receiving_lot(medicine, lot_number, expiry_date):
+    lot, _ = MedicineLot.objects.get_or_create(
+        medicine=medicine, lot_number=lot_number, expiry_date=expiry_date or medicine.expiry_date,
+    )
+    return lot
+
+
+def _next_expiry():
+    return Subquery(
+        MedicineLot.objects.filter(medicine=OuterRef('pk'), quantity__gt=0)
+        .order_by('expiry_date').values('expiry_date')[:1]
+    )
+
+
+def move_stock(medicine, movement_type, quantity, reason='', reference='', notes='', user=None,
+               prescription=None, lot_number='', expiry_date=None):
+    """
+    Apply a stock movement to ``medicine`` and record it, atomically.
+
+    ``quantity`` is the number of units added, removed or dispensed, or
+    the new stock level for 'set'. Added units go to the lot
+    ``lot_number``/``expiry_date`` (default: the medicine's expiry date).
+    Raises StockError rather than taking stock below zero. Returns the
+    StockMovements (one per lot touched) and refreshes
+    ``medicine.stock_quantity``.
+    """
+    from patients.cache import invalidate_for_model
+
+    if movement_type not in dict(StockMovement.MOVEMENT_TYPE_CHOICES):
+        raise StockError('Invalid adjustment type.')
+    if quantity < 0 or (quantity == 0 and movement_type != 'set'):
+        raise StockError('Please enter a valid quantity.')
+
+    def insufficient(available):
+        return StockError(f'Cannot {movement_type} {quantity} units. Only {available} units in stock.')
+
+    with transaction.atomic():
+        if movement_type == 'add':
+            changes = [(_receiving_lot(medicine, lot_number, expiry_date), quantity)]
+        else:
+            # Lots are always locked before the medicine row, in expiry order
+            lots = _locked_lots(medicine, dispense_cutoff() if movement_type == 'dispense' else None)
+            if movement_type == 'set':
+                current = Medicine.objects.select_for_update().filter(pk=medicine.pk).values_list(
+                    'stock_quantity', flat=True
+                ).get()
+                shortfall = current - quantity
+            else:
+                shortfall = quantity
+            if shortfall < 0:
+                changes = [(_receiving_lot(medicine, lot_number, expiry_date), -shortfall)]
+            else:
+                allocation = allocate_fefo(lots, shortfall)
+                if allocation is None:
+                    raise insufficient(sum(lot.quantity for lot in lots))
+                changes = [(lot, -units) for lot, units in allocation]
+
+        now = timezone.now()
+        change = sum(units for _, units in changes)
+        for lot, units in changes:
+            rows = MedicineLot.objects.filter(pk=lot.pk)
+            if units < 0:
+                rows = rows.filter(quantity__gte=-units)
+            if not rows.update(quantity=F('quantity') + units):
+                raise insufficient(_current_stock(medicine.pk))
+
+        rows = Medicine.objects.filter(pk=medicine.pk)
+        if change < 0:
+            rows = rows.filter(stock_quantity__gte=-change)
+        updated = rows.update(
+            stock_quantity=F('stock_quantity') + change,
+            expiry_date=Coalesce(_next_expiry(), F('expiry_date')),
+            updated_at=now,
+        )
+        if not updated:
+            raise insufficient(_current_stock(medicine.pk))
+
+        # The UPDATE keeps the row locked until commit, so this reads our own result
+        balance = _current_stock(medicine.pk)
+        running = balance - change
+        movements = []
+        for lot, units in changes or [(None, 0)]:
+            running += units
+            movements.append(StockMovement(
+                medicine=medicine, lot=lot, movement_type=movement_type, quantity=units, balance_after=running,
+                reason=reason, reference=reference, notes=notes, prescription=prescription, created_by=user,
+            ))
+        StockMovement.objects.bulk_create(movements)
+        # update() skips the Medicine save signals that drop the dashboard widgets
+        invalidate_for_model('pharmacy.Medicine')
+    medicine.stock_quantity = balance
+    return movements
+
+
+def record_opening_stock(medicine, user=None):
+    """Lot and ledger entry for the stock a medicine was created with"""
+    if not medicine.stock_quantity:
+        return None
+    lot = MedicineLot.objects.create(
+        medicine=medicine, expiry_date=medicine.expiry_date, quantity=medicine.stock_quantity,
+    )
+    return StockMovement.objects.create(
+        medicine=medicine, lot=lot, movement_type='add', quantity=medicine.stock_quantity,
+        balance_after=medicine.stock_quantity, reason='Opening balance', created_by=user,
+    )
+
+
+def dispense_prescription(prescription, quantity, user=None):
+    """
+    Dispense ``quantity`` units of a prescription: take them out of stock
+    and add them to the prescription, both with conditional UPDATEs in one
+    transaction. Returns the StockMovements.
+    """
+    if quantity <= 0:
+        raise StockError('Please enter a valid quantity to dispense.')
+
+    now = timezone.now()
+    with transaction.atomic():
+        updated = Prescription.objects.filter(
+            pk=prescription.pk, quantity_dispensed__lte=F('quantity_prescribed') - quantity,
+        ).update(
+            quantity_dispensed=F('quantity_dispensed') + quantity,
+            # SET expressions see the row as it was before the UPDATE
+            status=Case(
+                When(quantity_dispensed__gte=F('quantity_prescribed') - quantity, then=Value('dispensed')),
+                default=Value('partially_dispensed'),
+            ),
+            dispensed_by=user,
+            dispensed_date=now,
+            updated_at=now,
+        )
+        if not updated:
+            prescription.refresh_from_db(fields=['quantity_dispensed'])
+            raise StockError(
+                f'Cannot dispense {quantity} units. Only {prescription.remaining_quantity()} units remaining.'
+            )
+        movements = move_stock(
+            prescription.medicine, 'dispense', quantity,
+            reason='Prescription dispensed', user=user, prescription=prescription,
+        )
+    prescription.refresh_from_db(fields=['quantity_dispensed', 'status', 'dispensed_by', 'dispensed_date'])
+    return movements
+
+
+def low_stock_medicines(medicines=None, today=None):
+    """
+    Active medicines whose usable stock (units in unexpired lots, summed
+    in SQL as ``usable_quantity``) is at or below their minimum level
+    """
+    today = today or timezone.localdate()
+    medicines = Medicine.objects.all() if medicines is None else medicines
+    return medicines.filter(is_active=True).annotate(
+        usable_quantity=Coalesce(Sum('lots__quantity', filter=Q(lots__expiry_date__gt=today)), 0)
+    ).filter(usable_quantity__lte=F('minimum_stock_level'))
+
+
+def expiring_medicines(days=30, medicines=None, today=None):
+    """
+    Active medicines with stock in lots expiring within ``days``,
+    annotated in SQL with that stock (``expiring_quantity``), the first
+    of those expiries (``next_expiry``) and its lot (``batch_number``)
+    """
+    today = today or timezone.localdate()
+    until = today + timedelta(days=days)
+    medicines = Medicine.objects.all() if medicines is None else medicines
+    window = Q(lots__quantity__gt=0, lots__expiry_date__gt=today, lots__expiry_date__lte=until)
+    first_lot = MedicineLot.objects.filter(
+        medicine=OuterRef('pk'), quantity__gt=0, expiry_date__gt=today, expiry_date__lte=until,
+    ).order_by('expiry_date', 'id')
+    return medicines.filter(is_active=True).annotate(
+        expiring_quantity=Coalesce(Sum('lots__quantity', filter=window), 0),
+        next_expiry=Min('lots__expiry_date', filter=window),
+        batch_number=Subquery(first_lot.values('lot_number')[:1]),
+    ).filter(expiring_quantity__gt=0)
+
+
+def _medicine_total(model, field):
+    # A subquery per total: joining both tables would multiply the rows
+    totals = model.objects.filter(medicine=OuterRef('pk')).order_by().values('medicine').annotate(total=Sum(field))
+    return Coalesce(Subquery(totals.values('total')), 0)
+
+
+def ledger_drift():
+    """
+    ``[(medicine_id, stock_quantity, ledger_total, lot_total)]`` for
+    medicines whose ledger or lots do not add up to their stock
+    """
+    return list(
+        Medicine.objects.annotate(
+            ledger=_medicine_total(StockMovement, 'quantity'),
+            lot_total=_medicine_total(MedicineLot, 'quantity'),
+        ).filter(
+            ~Q(stock_quantity=F('ledger')) | ~Q(stock_quantity=F('lot_total'))
+        ).order_by('pk').values_list('pk', 'stock_quantity', 'ledger', 'lot_total')
+    )
+
+
+def _reconcile(medicine):
+    """Move the lots of ``medicine`` to its recorded stock and record the movements that balance the ledger"""
+    with transaction.atomic():
+        lots = _locked_lots(medicine)
+        stock = Medicine.objects.select_for_update().filter(pk=medicine.pk).values_list(
+            'stock_quantity', flat=True
+        ).get()
+        lot_total = sum(lot.quantity for lot in lots)
+        ledger = medicine.stock_movements.aggregate(total=Coalesce(Sum('quantity'), 0))['total']
+
+        if lot_total < stock:
+            changes = [(_receiving_lot(medicine, '', None), stock - lot_total)]
+        else:
+            changes = [(lot, -units) for lot, units in allocate_fefo(lots, lot_total - stock)]
+        for lot, units in changes:
+            MedicineLot.objects.filter(pk=lot.pk).update(quantity=F('quantity') + units)
+        Medicine.objects.filter(pk=medicine.pk).update(expiry_date=Coalesce(_next_expiry(), F('expiry_date')))
+
+        # Whatever the lot changes leave unexplained goes on a movement of its own
+        remainder = stock - ledger - sum(units for _, units in changes)
+        if remainder:
+            changes.append((None, remainder))
+        StockMovement.objects.bulk_create([
+            StockMovement(
+                medicine=medicine, lot=lot, movement_type='set', quantity=units,
+                balance_after=stock, reason='Ledger reconciliation',
+            )
+            for lot, units in changes
+        ])
+
+
+def reconcile_ledger():
+    """Bring the lots and ledger of every drifted medicine back in line with its stock; returns their number"""
+    from patients.cache import invalidate_for_model
+
+    drifted = [medicine_id for medicine_id, *_ in ledger_drift()]
+    for medicine in Medicine.objects.filter(pk__in=drifted):
+        _reconcile(medicine)
+    if drifted:
+        invalidate_for_model('pharmacy.Medicine')
+    return len(drifted)
@@ -1,9 +1,19 @@
-from django.test import TestCase, Client
+import threading
+from unittest import skipUnless
+
+from django.test import TestCase, TransactionTestCase, Client
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
-from datetime import timedelta
-from .models import Medicine
+from datetime import date, timedelta
+from .models import Medicine, MedicineLot, Prescription, StockMovement
+from .stock import (
+    StockError, dispense_prescription, expiring_medicines, ledger_drift, low_stock_medicines, move_stock,
+    reconcile_ledger,
+)
 
 User = get_user_model()
 
@@ -100,3 +110,202 @@ class MobilePharmacyViewTests(TestCase):
         response = self.client.get(url)
 
         self.assertTemplateUsed(response, 'pharmacy/list.html')
+
+
+def create_medicine(stock=20, **kwargs):
+    fields = dict(
+        name='Amoxicillin', manufacturer='Test Manufacturer', category='antibiotic', form='capsule',
+        strength='500mg', unit_price=10, cost_price=8, expiry_date=timezone.now().date() + timedelta(days=365),
+    )
+    fields.update(kwargs)
+    medicine = Medicine.objects.create(**fields)
+    if stock:
+        move_stock(medicine, 'add', stock, reason='Delivery')
+    return medicine
+
+
+def create_prescriptions(medicine, count, quantity=1):
+    from appointments.models import Appointment
+    from patients.tests import create_doctor, create_patient
+
+    appointment = Appointment.objects.create(
+        patient=create_patient(), doctor=create_doctor(), appointment_date=date(2030, 3, 4),
+        appointment_time='09:00', chief_complaint='Infection',
+    )
+    return [
+        Prescription.objects.create(
+            appointment=appointment, medicine=medicine, dosage='1 capsule', quantity_prescribed=quantity,
+            duration_days=5, instructions='After meals',
+        )
+        for _ in range(count)
+    ]
+
+
+class StockLedgerTests(TestCase):
+    """Test cases for the stock movement ledger"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='pharmacist', password='testpass123', role='pharmacist')
+        self.client.force_login(self.user)
+        self.medicine = create_medicine()
+
+    def test_movements_never_go_negative(self):
+        with self.assertRaisesMessage(StockError, 'Only 20 units in stock'):
+            move_stock(self.medicine, 'remove', 21)
+        move_stock(self.medicine, 'remove', 5, reason='Damaged')
+        [movement] = move_stock(self.medicine, 'set', 12, reason='Stock take')
+        self.assertEqual((movement.quantity, movement.balance_after), (-3, 12))
+        self.medicine.refresh_from_db()
+        self.assertEqual(self.medicine.stock_quantity, 12)
+        self.assertEqual(self.medicine.stock_movements.aggregate(total=Sum('quantity'))['total'], 12)
+        self.assertEqual(ledger_drift(), [])
+
+        Medicine.objects.filter(pk=self.medicine.pk).update(stock_quantity=30)
+        self.assertEqual(ledger_drift(), [(self.medicine.pk, 30, 12, 12)])
+        self.assertEqual(reconcile_ledger(), 1)
+        self.assertEqual(ledger_drift(), [])
+        self.assertEqual(self.medicine.lots.aggregate(total=Sum('quantity'))['total'], 30)
+
+        # Lots written around the helpers are moved back to the stock as well
+        self.medicine.lots.update(quantity=0)
+        self.assertEqual(ledger_drift(), [(self.medicine.pk, 30, 30, 0)])
+        self.assertEqual(reconcile_ledger(), 1)
+        self.assertEqual(ledger_drift(), [])
+
+    def test_edit_view_leaves_stock_and_expiry_to_the_lots(self):
+        """A form posted after a dispense cannot reset stock to the value it showed"""
+        expiry, stock = self.medicine.expiry_date, self.medicine.stock_quantity
+        self.client.post(reverse('pharmacy:medicine_edit', args=[self.medicine.pk]), {
+            'name': 'Amoxicillin', 'manufacturer': 'Test Manufacturer', 'category': 'antibiotic',
+            'form': 'capsule', 'strength': '500mg', 'stock_quantity': 25, 'minimum_stock_level': 10,
+            'unit_price': '10', 'cost_price': '8', 'expiry_date': '2020-01-01',
+        })
+        self.medicine.refresh_from_db()
+        self.assertEqual((self.medicine.stock_quantity, self.medicine.expiry_date), (stock, expiry))
+        self.assertEqual(self.medicine.name, 'Amoxicillin')
+        self.assertEqual(ledger_drift(), [])
+
+    def test_views_write_the_ledger(self):
+        prescription = create_prescriptions(self.medicine, 1, quantity=8)[0]
+        url = reverse('pharmacy:prescription_dispense', args=[prescription.pk])
+        self.client.post(url, {'quantity_dispensed': 5})
+        self.client.post(url, {'quantity_dispensed': 5})
+        prescription.refresh_from_db()
+        self.assertEqual((prescription.quantity_dispensed, prescription.status), (5, 'partially_dispensed'))
+        self.client.post(url, {'quantity_dispensed': 3})
+        prescription.refresh_from_db()
+        self.assertEqual((prescription.quantity_dispensed, prescription.status), (8, 'dispensed'))
+
+        self.client.post(reverse('pharmacy:stock_adjustment', args=[self.medicine.pk]), {
+            'adjustment_type': 'add', 'quantity': 10, 'reason': 'Delivery', 'reference_number': 'PO-7',
+        })
+        response = self.client.post(
+            reverse('pharmacy:stock_adjustment_ajax', args=[self.medicine.pk]),
+            {'adjustment_type': 'remove', 'quantity': 50}, content_type='application/json',
+        )
+        self.assertFalse(response.json()['success'])
+
+        self.assertEqual(
+            list(self.medicine.stock_movements.order_by('id').values_list('movement_type', 'quantity', 'balance_after')),
+            [('add', 20, 20), ('dispense', -5, 15), ('dispense', -3, 12), ('add', 10, 22)],
+        )
+        self.assertEqual(self.medicine.stock_movements.filter(prescription=prescription).count(), 2)
+        self.assertEqual(StockMovement.objects.get(reference='PO-7').created_by, self.user)
+
+
+
+class MedicineLotTests(TestCase):
+    """Test cases for lot-level stock and first-expiry-first-out dispensing"""
+
+    def setUp(self):
+        today = timezone.localdate()
+        self.medicine = create_medicine(stock=0, minimum_stock_level=10)
+        for lot_number, days, quantity in (('A', 5, 3), ('C', 200, 10), ('B', 60, 4)):
+            move_stock(self.medicine, 'add', quantity, lot_number=lot_number, expiry_date=today + timedelta(days=days))
+        self.lots = {lot.lot_number: lot for lot in self.medicine.lots.all()}
+
+    def lot_quantities(self):
+        return dict(self.medicine.lots.values_list('lot_number', 'quantity'))
+
+    def test_dispense_allocates_first_expiry_first_out(self):
+        self.medicine.refresh_from_db()
+        self.assertEqual((self.medicine.stock_quantity, self.medicine.expiry_date), (17, self.lots['A'].expiry_date))
+
+        prescription = create_prescriptions(self.medicine, 1, quantity=6)[0]
+        with CaptureQueriesContext(connection) as queries:
+            movements = dispense_prescription(prescription, 6)
+        lot_reads = [query for query in queries if query['sql'].startswith('SELECT') and 'pharmacy_medicinelot' in query['sql']]
+        self.assertEqual(len(lot_reads), 1)
+
+        # Lot A expires within the dispensing margin and is skipped
+        self.assertEqual([(movement.lot.lot_number, movement.quantity) for movement in movements], [('B', -4), ('C', -2)])
+        self.assertEqual(self.lot_quantities(), {'A': 3, 'B': 0, 'C': 8})
+        self.assertFalse(self.medicine.can_dispense(9))
+        self.assertTrue(self.medicine.can_dispense(8))
+
+        # Removals take the earliest lots first, expiring or not
+        move_stock(self.medicine, 'remove', 5, reason='Expired')
+        self.assertEqual(self.lot_quantities(), {'A': 0, 'B': 0, 'C': 6})
+        self.medicine.refresh_from_db()
+        self.assertEqual((self.medicine.stock_quantity, self.medicine.expiry_date), (6, self.lots['C'].expiry_date))
+        self.assertEqual(ledger_drift(), [])
+
+        with self.assertRaisesMessage(StockError, 'Only 6 units in stock'):
+            move_stock(self.medicine, 'dispense', 7)
+
+    def test_reports_aggregate_lots_in_sql(self):
+        with CaptureQueriesContext(connection) as queries:
+            low = list(low_stock_medicines())
+            expiring = list(expiring_medicines(30))
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(low, [])
+        self.assertEqual(
+            [(medicine.expiring_quantity, medicine.next_expiry, medicine.batch_number) for medicine in expiring],
+            [(3, self.lots['A'].expiry_date, 'A')],
+        )
+
+        # Expired lots do not count as usable stock
+        MedicineLot.objects.filter(lot_number='C').update(expiry_date=timezone.localdate() - timedelta(days=1))
+        [medicine] = low_stock_medicines()
+        self.assertEqual(medicine.usable_quantity, 7)
+
+        user = User.objects.create_user(username='pharmacist', password='testpass123', role='pharmacist')
+        self.client.force_login(user)
+        response = self.client.get(reverse('pharmacy:expiring_report'))
+        self.assertContains(response, self.medicine.name)
+        response = self.client.get(reverse('pharmacy:low_stock_report'))
+        self.assertEqual(response.context['total_count'], 1)
+
+
+@skipUnless(connection.features.has_select_for_update, 'Needs row-level locking')
+class ConcurrentDispenseTests(TransactionTestCase):
+    """32 pharmacists dispensing the same medicine at once"""
+
+    def test_concurrent_dispensers_do_not_lose_updates(self):
+        medicine = create_medicine(stock=20)
+        prescriptions = create_prescriptions(medicine, 32)
+        barrier = threading.Barrier(len(prescriptions))
+        results = []
+
+        def dispense(prescription):
+            try:
+                barrier.wait()
+                dispense_prescription(prescription, 1)
+                results.append(True)
+            except StockError:
+                results.append(False)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=dispense, args=(prescription,)) for prescription in prescriptions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        medicine.refresh_from_db()
+        self.assertEqual(results.count(True), 20)
+        self.assertEqual(medicine.stock_quantity, 0)
+        self.assertEqual(Prescription.objects.filter(status='dispensed').count(), 20)
+        self.assertEqual(ledger_drift(), [])
+
@@ -8,16 +8,14 @@ from django.http import JsonResponse, HttpResponse
 from django.utils import timezone
 from django.urls import reverse
 from .models import Medicine, Prescription
+from .stock import StockError, dispense_prescription, expiring_medicines, low_stock_medicines, move_stock
 from datetime import datetime, timedelta
 from decimal import Decimal
 
-@login_required
-def medicine_list_view(request):
-    """Medicine list view with search and filtering"""
-    medicines = Medicine.objects.all()
-
+def filter_medicines(medicines, params):
+    """Apply the medicine list search and filters in ``params`` (shared with the export)"""
     # Search functionality
-    search_query = request.GET.get('search', '')
+    search_query = params.get('search', '')
     if search_query:
         medicines = medicines.filter(
             Q(name__icontains=search_query) |
@@ -27,24 +25,35 @@ def medicine_list_view(request):
         )
 
     # Filter by category
-    category_filter = request.GET.get('category', '')
+    category_filter = params.get('category', '')
     if category_filter:
         medicines = medicines.filter(category=category_filter)
 
     # Filter by form
-    form_filter = request.GET.get('form', '')
+    form_filter = params.get('form', '')
     if form_filter:
         medicines = medicines.filter(form=form_filter)
 
     # Filter by stock status
-    stock_filter = request.GET.get('stock', '')
+    stock_filter = params.get('stock', '')
     if stock_filter == 'low':
-        medicines = medicines.filter(stock_quantity__lte=F('minimum_stock_level'))
+        medicines = low_stock_medicines(medicines)
     elif stock_filter == 'out':
         medicines = medicines.filter(stock_quantity=0)
     elif stock_filter == 'expired':
         medicines = medicines.filter(expiry_date__lt=datetime.now().date())
 
+    return medicines
+
+@login_required
+def medicine_list_view(request):
+    """Medicine list view with search and filtering"""
+    medicines = filter_medicines(Medicine.objects.all(), request.GET)
+    search_query = request.GET.get('search', '')
+    category_filter = request.GET.get('category', '')
+    form_filter = request.GET.get('form', '')
+    stock_filter = request.GET.get('stock', '')
+
     # Pagination
     paginator = Paginator(medicines, 12)
     page_number = request.GET.get('page')
@@ -59,19 +68,9 @@ def medicine_list_view(request):
     current_month = datetime.now().replace(day=1)
     new_medicines_count = Medicine.objects.filter(created_at__gte=current_month).count()
 
-    # Calculate low stock medicines
-    low_stock_count = Medicine.objects.filter(
-        is_active=True,
-        stock_quantity__lte=F('minimum_stock_level')
-    ).count()
-
-    # Calculate expiring soon medicines (within 30 days)
-    thirty_days_from_now = timezone.now().date() + timedelta(days=30)
-    expiring_soon_count = Medicine.objects.filter(
-        is_active=True,
-        expiry_date__lte=thirty_days_from_now,
-        expiry_date__gte=timezone.now().date()
-    ).count()
+    # Low stock and expiring soon (within 30 days), aggregated over the lots
+    low_stock_count = low_stock_medicines().count()
+    expiring_soon_count = expiring_medicines(30).count()
 
     context = {
         'page_obj': page_obj,
@@ -93,6 +92,27 @@ def medicine_list_view(request):
 
     return render(request, template_name, context)
 
+@login_required
+def medicine_export_view(request):
+    """Stream the (filtered) medicine list as CSV"""
+    from core.export import ExportColumn, choice_label, csv_export_response, date_format
+
+    columns = [
+        ExportColumn('Name', 'name'),
+        ExportColumn('Generic Name', 'generic_name'),
+        ExportColumn('Brand Name', 'brand_name'),
+        ExportColumn('Manufacturer', 'manufacturer'),
+        ExportColumn('Category', 'category', choice_label(Medicine.CATEGORY_CHOICES)),
+        ExportColumn('Form', 'form', choice_label(Medicine.FORM_CHOICES)),
+        ExportColumn('Strength', 'strength'),
+        ExportColumn('Stock', 'stock_quantity'),
+        ExportColumn('Minimum Stock', 'minimum_stock_level'),
+        ExportColumn('Unit Price', 'unit_price'),
+        ExportColumn('Expiry Date', 'expiry_date', date_format()),
+    ]
+    medicines = filter_medicines(Medicine.objects.all(), request.GET)
+    return csv_export_response(medicines, columns, 'medicines.csv')
+
 @login_required
 def medicine_add_view(request):
     """Add medicine view with form handling"""
@@ -106,7 +126,7 @@ def medicine_add_view(request):
                 category=request.POST.get('category'),
                 form=request.POST.get('form'),
                 strength=request.POST.get('strength'),
-                stock_quantity=request.POST.get('stock_quantity', 0),
+                stock_quantity=int(request.POST.get('stock_quantity') or 0),
                 minimum_stock_level=request.POST.get('minimum_stock_level', 10),
                 unit_price=Decimal(request.POST.get('unit_price', '0')),
                 cost_price=Decimal(request.POST.get('cost_price', '0')),
@@ -173,11 +193,9 @@ def medicine_edit_view(request, pk):
             medicine.category = request.POST.get('category')
             medicine.form = request.POST.get('form')
             medicine.strength = request.POST.get('strength')
-            medicine.stock_quantity = request.POST.get('stock_quantity', 0)
             medicine.minimum_stock_level = request.POST.get('minimum_stock_level', 10)
             medicine.unit_price = Decimal(request.POST.get('unit_price', '0'))
             medicine.cost_price = Decimal(request.POST.get('cost_price', '0'))
-            medicine.expiry_date = request.POST.get('expiry_date')
             medicine.description = request.POST.get('description', '')
             medicine.side_effects = request.POST.get('side_effects', '')
             medicine.contraindications = request.POST.get('contraindications', '')
@@ -186,7 +204,12 @@ def medicine_edit_view(request, pk):
             if request.POST.get('manufacture_date'):
                 medicine.manufacture_date = request.POST.get('manufacture_date')
 
-            medicine.save()
+            # Stock and expiry follow the lots and change only through stock
+            # movements, so a stale form cannot overwrite them
+            medicine.save(update_fields=[
+                field.name for field in Medicine._meta.concrete_fields
+                if field.name not in ('id', 'stock_quantity', 'expiry_date', 'created_at')
+            ])
 
             messages.success(request, f'Medicine {medicine.name} updated successfully!')
             # Redirect with mobile parameter if it was a mobile request
@@ -208,18 +231,15 @@ def medicine_edit_view(request, pk):
 
     return render(request, template_name, context)
 
-@login_required
-def prescription_list_view(request):
-    """Prescription list view with filtering"""
-    prescriptions = Prescription.objects.select_related('appointment__patient', 'medicine', 'dispensed_by').all()
-
+def filter_prescriptions(prescriptions, params):
+    """Apply the prescription list search and filters in ``params`` (shared with the export)"""
     # Filter by status
-    status_filter = request.GET.get('status', '')
+    status_filter = params.get('status', '')
     if status_filter:
         prescriptions = prescriptions.filter(status=status_filter)
 
     # Search functionality
-    search_query = request.GET.get('search', '')
+    search_query = params.get('search', '')
     if search_query:
         prescriptions = prescriptions.filter(
             Q(appointment__patient__first_name__icontains=search_query) |
@@ -227,6 +247,17 @@ def prescription_list_view(request):
             Q(medicine__name__icontains=search_query)
         )
 
+    return prescriptions
+
+@login_required
+def prescription_list_view(request):
+    """Prescription list view with filtering"""
+    prescriptions = filter_prescriptions(
+        Prescription.objects.select_related('appointment__patient', 'medicine', 'dispensed_by').all(), request.GET
+    )
+    status_filter = request.GET.get('status', '')
+    search_query = request.GET.get('search', '')
+
     # Pagination
     paginator = Paginator(prescriptions, 15)
     page_number = request.GET.get('page')
@@ -262,6 +293,26 @@ def prescription_list_view(request):
 
     return render(request, template_name, context)
 
+@login_required
+def prescription_export_view(request):
+    """Stream the (filtered) prescription list as CSV"""
+    from core.export import ExportColumn, choice_label, csv_export_response, date_format, full_name
+
+    columns = [
+        ExportColumn('Appointment ID', 'appointment__appointment_id'),
+        ExportColumn('Patient', ('appointment__patient__first_name', 'appointment__patient__last_name'), full_name),
+        ExportColumn('Medicine', 'medicine__name'),
+        ExportColumn('Dosage', 'dosage'),
+        ExportColumn('Quantity Prescribed', 'quantity_prescribed'),
+        ExportColumn('Quantity Dispensed', 'quantity_dispensed'),
+        ExportColumn('Duration (days)', 'duration_days'),
+        ExportColumn('Status', 'status', choice_label(Prescription.STATUS_CHOICES)),
+        ExportColumn('Prescribed Date', 'prescribed_date', date_format()),
+        ExportColumn('Dispensed Date', 'dispensed_date', date_format()),
+    ]
+    prescriptions = filter_prescriptions(Prescription.objects.all(), request.GET)
+    return csv_export_response(prescriptions, columns, 'prescriptions.csv')
+
 @login_required
 def prescription_dispense_view(request, pk):
     """Dispense prescription view"""
@@ -276,31 +327,13 @@ def prescription_dispense_view(request, pk):
                 messages.error(request, 'Please enter a valid quantity to dispense.')
                 return redirect('pharmacy:prescription_dispense', pk=pk)
 
-            remaining_quantity = prescription.remaining_quantity()
-            if quantity_to_dispense > remaining_quantity:
-                messages.error(request, f'Cannot dispense {quantity_to_dispense} units. Only {remaining_quantity} units remaining.')
-                return redirect('pharmacy:prescription_dispense', pk=pk)
-
-            # Check stock availability
-            if quantity_to_dispense > prescription.medicine.stock_quantity:
-                messages.error(request, f'Insufficient stock. Only {prescription.medicine.stock_quantity} units available.')
+            # Conditional UPDATEs of the prescription and the stock, recorded in the ledger
+            try:
+                dispense_prescription(prescription, quantity_to_dispense, user=request.user)
+            except StockError as e:
+                messages.error(request, str(e))
                 return redirect('pharmacy:prescription_dispense', pk=pk)
 
-            # Update prescription
-            prescription.quantity_dispensed += quantity_to_dispense
-            if prescription.quantity_dispensed >= prescription.quantity_prescribed:
-                prescription.status = 'dispensed'
-            else:
-                prescription.status = 'partially_dispensed'
-
-            prescription.dispensed_by = request.user
-            prescription.dispensed_date = timezone.now()
-            prescription.save()
-
-            # Update medicine stock
-            prescription.medicine.stock_quantity -= quantity_to_dispense
-            prescription.medicine.save()
-
             messages.success(request, f'Successfully dispensed {quantity_to_dispense} units of {prescription.medicine.name}.')
 
             # Create notification for successful dispensing
@@ -361,30 +394,29 @@ def stock_adjustment_view(request, pk):
                     return redirect(f"{reverse('pharmacy:stock_adjustment', kwargs={'pk': pk})}?mobile=1")
                 return redirect('pharmacy:stock_adjustment', pk=pk)
 
-            old_stock = medicine.stock_quantity
-
-            if adjustment_type == 'add':
-                medicine.stock_quantity += quantity
-                action = 'added'
-            elif adjustment_type == 'remove':
-                if quantity > medicine.stock_quantity:
-                    messages.error(request, f'Cannot remove {quantity} units. Only {medicine.stock_quantity} units in stock.')
-                    # Redirect with mobile parameter if it was a mobile request
-                    if request.GET.get('mobile') == '1' or request.POST.get('mobile') == '1':
-                        return redirect(f"{reverse('pharmacy:stock_adjustment', kwargs={'pk': pk})}?mobile=1")
-                    return redirect('pharmacy:stock_adjustment', pk=pk)
-                medicine.stock_quantity -= quantity
-                action = 'removed'
-            else:
+            if adjustment_type not in ('add', 'remove'):
                 messages.error(request, 'Invalid adjustment type.')
                 # Redirect with mobile parameter if it was a mobile request
                 if request.GET.get('mobile') == '1' or request.POST.get('mobile') == '1':
                     return redirect(f"{reverse('pharmacy:stock_adjustment', kwargs={'pk': pk})}?mobile=1")
                 return redirect('pharmacy:stock_adjustment', pk=pk)
 
-            medicine.save()
+            try:
+                movements = move_stock(
+                    medicine, adjustment_type, quantity, reason=reason,
+                    reference=request.POST.get('reference_number', ''), notes=request.POST.get('notes', ''),
+                    user=request.user, lot_number=request.POST.get('lot_number', ''),
+                    expiry_date=request.POST.get('lot_expiry_date') or None,
+                )
+            except StockError as e:
+                messages.error(request, str(e))
+                # Redirect with mobile parameter if it was a mobile request
+                if request.GET.get('mobile') == '1' or request.POST.get('mobile') == '1':
+                    return redirect(f"{reverse('pharmacy:stock_adjustment', kwargs={'pk': pk})}?mobile=1")
+                return redirect('pharmacy:stock_adjustment', pk=pk)
+            old_stock = medicine.stock_quantity - sum(movement.quantity for movement in movements)
+            action = 'added' if adjustment_type == 'add' else 'removed'
 
-            # Create stock movement record (we'll add this model later)
             messages.success(request, f'Successfully {action} {quantity} units. Stock updated from {old_stock} to {medicine.stock_quantity}.')
             # Redirect with mobile parameter if it was a mobile request
             if request.GET.get('mobile') == '1' or request.POST.get('mobile') == '1':
@@ -408,18 +440,16 @@ def stock_adjustment_view(request, pk):
 @login_required
 def low_stock_report(request):
     """View medicines with low stock"""
-    low_stock_medicines = Medicine.objects.filter(
-        stock_quantity__lte=F('minimum_stock_level'),
-        is_active=True
-    ).order_by('stock_quantity')
+    # Usable stock (unexpired lots) summed in SQL
+    medicines = low_stock_medicines().order_by('usable_quantity', 'name')
 
     # Handle mobile template routing
     is_mobile = request.GET.get('mobile') == '1'
     template_name = 'pharmacy/mobile_low_stock_report.html' if is_mobile else 'pharmacy/low_stock_report.html'
 
     context = {
-        'medicines': low_stock_medicines,
-        'total_count': low_stock_medicines.count(),
+        'medicines': medicines,
+        'total_count': len(medicines),
         'today': timezone.now().date(),
     }
     return render(request, template_name, context)
@@ -430,22 +460,17 @@ def expiring_medicines_report(request):
     """View medicines expiring soon"""
     from datetime import timedelta
 
-    # Medicines expiring in next 30 days
-    warning_date = timezone.now().date() + timedelta(days=30)
+    # Medicines with lots expiring in the next 30 days, aggregated in SQL
     next_week = timezone.now().date() + timedelta(days=7)
-    expiring_medicines = Medicine.objects.filter(
-        expiry_date__lte=warning_date,
-        expiry_date__gt=timezone.now().date(),
-        is_active=True
-    ).order_by('expiry_date')
+    medicines = expiring_medicines(30).order_by('next_expiry', 'name')
 
     # Handle mobile template routing
     is_mobile = request.GET.get('mobile') == '1'
     template_name = 'pharmacy/mobile_expiring_report.html' if is_mobile else 'pharmacy/expiring_report.html'
 
     context = {
-        'medicines': expiring_medicines,
-        'total_count': expiring_medicines.count(),
+        'medicines': medicines,
+        'total_count': len(medicines),
         'warning_days': 30,
         'today': timezone.now().date(),
         'next_week': next_week,
@@ -474,26 +499,19 @@ def stock_adjustment_ajax_view(request, pk):
         if quantity <= 0:
             return JsonResponse({'success': False, 'message': 'Please enter a valid quantity.'})
 
-        old_stock = medicine.stock_quantity
-
-        if adjustment_type == 'add':
-            medicine.stock_quantity += quantity
-            action = 'added'
-        elif adjustment_type == 'remove':
-            if quantity > medicine.stock_quantity:
-                return JsonResponse({
-                    'success': False,
-                    'message': f'Cannot remove {quantity} units. Only {medicine.stock_quantity} units in stock.'
-                })
-            medicine.stock_quantity -= quantity
-            action = 'removed'
-        elif adjustment_type == 'set':
-            medicine.stock_quantity = quantity
-            action = 'set to'
-        else:
+        if adjustment_type not in ('add', 'remove', 'set'):
             return JsonResponse({'success': False, 'message': 'Invalid adjustment type.'})
 
-        medicine.save()
+        try:
+            movements = move_stock(
+                medicine, adjustment_type, quantity, reason=reason,
+                reference=reference_number, notes=notes, user=request.user,
+                lot_number=data.get('lot_number', ''), expiry_date=data.get('lot_expiry_date') or None,
+            )
+        except StockError as e:
+            return JsonResponse({'success': False, 'message': str(e)})
+        old_stock = medicine.stock_quantity - sum(movement.quantity for movement in movements)
+        action = {'add': 'added', 'remove': 'removed', 'set': 'set to'}[adjustment_type]
 
         # Determine stock status
         status = 'low' if medicine.is_low_stock() else 'normal'